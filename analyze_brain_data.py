@@ -4,6 +4,13 @@ import matplotlib.pyplot as plt
 import seaborn as sns
 from pathlib import Path
 
+from clinical_cache import load_cached_dataframe
+
+# Chaînes traitées comme valeurs manquantes (comme pandas.read_excel)
+NA_STRINGS = ['', '#N/A', '#N/A N/A', '#NA', '-1.#IND', '-1.#QNAN', '-NaN', '-nan',
+              '1.#IND', '1.#QNAN', '<NA>', 'N/A', 'NA', 'NULL', 'NaN', 'None',
+              'n/a', 'nan', 'null']
+
 def analyze_brain_clinical_data():
     """
     Analyse les données cliniques du cerveau pour comprendre leur structure
@@ -14,7 +21,10 @@ def analyze_brain_clinical_data():
     file_path = Path('BrainClinicalData/MU-Glioma-Post_ClinicalData-July2025.xlsx')
     
     try:
-        df = pd.read_excel(file_path)
+        # Lire le cache colonnaire de la feuille des patients
+        df = load_cached_dataframe(file_path)
+        df = df.loc[:, df.columns.notna()]
+        df = df.replace(NA_STRINGS, np.nan).infer_objects().dropna(how='all')
         print("✅ Données chargées avec succès!")
         print(f"📊 Forme des données: {df.shape}")
         print(f"📋 Nombre de colonnes: {len(df.columns)}")
@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+"""
+Prédiction des gliomes en ligne de commande (exports nocturnes)
+
+Le fichier d'entrée (CSV ou XLSX) est lu en flux par blocs de taille fixe,
+chaque bloc est prédit par un pool de processus qui réutilise les modèles
+entraînés par `glioma_analysis_simple.py`, et les résultats sont écrits au
+fur et à mesure : la mémoire reste constante quelle que soit la taille du
+fichier.
+
+Usage:
+    python batch_score.py patients.csv predictions.csv [--chunk-size 5000] [--workers 4]
+"""
+
+import argparse
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+from clinical_data_loader import iter_records
+from glioma_inference import add_prediction_columns, encode_feature_frame, predict_matrix
+from model_bundle import BACKENDS, DEFAULT_BACKEND, get_model_bundle
+
+DEFAULT_CHUNK_SIZE = 5000
+
+# Modèles du processus de travail (chargés une fois par processus)
+_worker_bundle = None
+
+
+def iter_chunks(input_path, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Génère le fichier d'entrée par DataFrames de chunk_size lignes
+
+    Les lignes entièrement vides du classeur sont ignorées.
+    """
+    if not input_path.lower().endswith(('.xlsx', '.xlsm')):
+        yield from pd.read_csv(input_path, chunksize=chunk_size)
+        return
+
+    headers, records = iter_records(input_path)
+    buffer = []
+    for row in records:
+        if all(value is None for value in row):
+            continue
+        buffer.append(row)
+        if len(buffer) >= chunk_size:
+            yield pd.DataFrame(buffer, columns=headers)
+            buffer = []
+    if buffer:
+        yield pd.DataFrame(buffer, columns=headers)
+
+
+def _init_worker(model_dir, backend):
+    global _worker_bundle
+    _worker_bundle = get_model_bundle(model_dir, backend)
+
+
+def score_chunk(df, bundle=None):
+    """
+    Prédit toutes les cibles pour un bloc et le met au format CSV
+
+    Le formatage est fait ici pour être réparti sur les processus de travail.
+    Retourne (ligne d'en-tête, lignes CSV, nombre de lignes, {étape: secondes}).
+    """
+    models, scalers, feature_encoders, target_encoders, feature_names = bundle or _worker_bundle
+    timings = {}
+
+    start = time.perf_counter()
+    X = encode_feature_frame(df, feature_names, feature_encoders)
+    timings['encodage'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    results = predict_matrix(models, scalers, X, chunk_size=max(len(df), 1))
+    timings['prédiction'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    scored = add_prediction_columns(df, results, models, target_encoders)
+    header = scored.iloc[:0].to_csv(index=False)
+    body = scored.to_csv(index=False, header=False)
+    timings['mise en forme'] = time.perf_counter() - start
+    return header, body, len(scored), timings
+
+
+def score_file(input_path, output_path, chunk_size=DEFAULT_CHUNK_SIZE, workers=None, model_dir='.',
+               backend=DEFAULT_BACKEND):
+    """
+    Prédit un fichier complet et écrit les résultats en CSV
+
+    Au plus 2 blocs par processus sont en cours à la fois, et les blocs
+    sont écrits dans l'ordre du fichier d'entrée. Avec workers <= 1, tout
+    est fait dans le processus courant. Retourne (lignes, secondes, étapes).
+    """
+    if workers is None:
+        workers = os.cpu_count() or 1
+    stages = {'lecture': 0.0, 'encodage': 0.0, 'prédiction': 0.0, 'mise en forme': 0.0, 'écriture': 0.0}
+    n_rows = 0
+    start = time.perf_counter()
+
+    if workers > 1:
+        executor = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(model_dir, backend))
+        submit = lambda df: executor.submit(score_chunk, df)
+        max_pending = 2 * workers
+    else:
+        executor = None
+        bundle = get_model_bundle(model_dir, backend)
+        submit = lambda df: score_chunk(df, bundle)
+        max_pending = 0
+
+    def write(result):
+        nonlocal n_rows
+        header, body, n_chunk_rows, timings = result.result() if executor is not None else result
+        for stage, seconds in timings.items():
+            stages[stage] += seconds
+        write_start = time.perf_counter()
+        if n_rows == 0:
+            output.write(header)
+        output.write(body)
+        stages['écriture'] += time.perf_counter() - write_start
+        n_rows += n_chunk_rows
+
+    output = open(output_path, 'w', newline='', encoding='utf-8')
+    try:
+        pending = deque()
+        chunks = iter_chunks(input_path, chunk_size)
+        while True:
+            read_start = time.perf_counter()
+            df = next(chunks, None)
+            stages['lecture'] += time.perf_counter() - read_start
+            if df is None:
+                break
+            pending.append(submit(df))
+            while len(pending) > max_pending:
+                write(pending.popleft())
+        while pending:
+            write(pending.popleft())
+    finally:
+        output.close()
+        if executor is not None:
+            executor.shutdown()
+
+    return n_rows, time.perf_counter() - start, stages
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Prédiction des gliomes pour un fichier de patients")
+    parser.add_argument('input', help="Fichier de patients (CSV ou XLSX)")
+    parser.add_argument('output', help="Fichier CSV de résultats")
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE,
+                        help=f"Lignes par bloc (défaut: {DEFAULT_CHUNK_SIZE})")
+    parser.add_argument('--workers', type=int, default=None,
+                        help="Processus de prédiction (défaut: nombre de CPU, 1 = sans pool)")
+    parser.add_argument('--model-dir', default='.',
+                        help="Dossier des modèles entraînés (défaut: dossier courant)")
+    parser.add_argument('--backend', choices=BACKENDS, default=DEFAULT_BACKEND,
+                        help=f"Moteur de prédiction (défaut: {DEFAULT_BACKEND})")
+    args = parser.parse_args()
+
+    print(f"🔮 Prédiction de {args.input}...")
+    n_rows, elapsed, stages = score_file(args.input, args.output, args.chunk_size, args.workers,
+                                       args.model_dir, args.backend)
+
+    print(f"✅ {n_rows} patients écrits dans {args.output}")
+    print(f"⏱️ {elapsed:.2f} s - {n_rows / max(elapsed, 1e-9):,.0f} lignes/s")
+    print("📊 Temps par étape (cumulé sur tous les processus):")
+    for stage, seconds in stages.items():
+        print(f"  - {stage}: {seconds:.2f} s")
+
+
+if __name__ == "__main__":
+    main()
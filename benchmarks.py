@@ -0,0 +1,850 @@
+#!/usr/bin/env python3
+"""
+Mesures de performance du pipeline de prédiction des gliomes
+
+Usage:
+    python benchmarks.py loader --rows 100000 [--legacy]
+    python benchmarks.py cache [--rows 10000]
+    python benchmarks.py batch [--rows 5000]
+    python benchmarks.py engine [--rows 5000]
+    python benchmarks.py predict [--repeats 200]
+    python benchmarks.py encode [--rows 100000 1000000] [--legacy]
+    python benchmarks.py features [--rows 100000 1000000] [--legacy]
+    python benchmarks.py profile [--rows 100000] [--legacy]
+    python benchmarks.py service [--clients 32] [--requests 4000] [--windows 0 2 5]
+    python benchmarks.py lru [--submissions 2000]
+    python benchmarks.py timing [--repeats 500]
+    python benchmarks.py schema [--scale 100]
+    python benchmarks.py fold [--rows 5000] [--repeats 200]
+    python benchmarks.py explain [--repeats 200]
+    python benchmarks.py survival [--patients 1000000]
+    python benchmarks.py cube [--rows 1000000] [--append 10000]
+    python benchmarks.py neighbors [--patients 100000] [--queries 1000] [--k 5]
+"""
+
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import threading
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+import openpyxl
+import pandas as pd
+from sklearn.preprocessing import LabelEncoder
+
+from clinical_cache import build_cache, load_cached_frame, load_cached_rows, load_cached_dataframe
+from clinical_data_loader import CLINICAL_DATA_PATH, load_rows, iter_column_batches, iter_records
+from cohort_cube import CohortCube
+from cohort_schema import COHORT_SCHEMA, format_memory_report, frame_memory, label_text
+from column_profiler import profile_records
+import glioma_prediction
+from glioma_inference import (PredictionCache, encode_feature_frame, encode_features, predict_matrix,
+                              predict_patient, score_frame)
+from model_artifact import IdentityScaling, check_folded_equivalence, compile_forest
+from model_bundle import BACKENDS, get_model_bundle, model_version
+from patient_neighbors import NeighborIndex, get_neighbor_index
+import stage_timing
+from survival_analysis import SurvivalEngine, get_survival_engine
+
+
+def make_synthetic_workbook(path, n_rows, source_path=CLINICAL_DATA_PATH):
+    """
+    Crée un classeur synthétique de n_rows lignes en répétant les patients réels
+    """
+    data, headers = load_rows(source_path)
+    patients = [row for row in data if any(value is not None for value in row)]
+
+    workbook = openpyxl.Workbook(write_only=True)
+    sheet = workbook.create_sheet('MU Glioma Post')
+    sheet.append(headers)
+    for i in range(n_rows):
+        sheet.append(patients[i % len(patients)])
+    workbook.save(path)
+    return path
+
+
+def _legacy_load_rows(file_path):
+    """
+    Ancienne lecture cellule par cellule (référence pour la comparaison)
+    """
+    workbook = openpyxl.load_workbook(file_path)
+    sheet = workbook.active
+    headers = [sheet.cell(row=1, column=col).value for col in range(1, sheet.max_column + 1)]
+    data = []
+    for row in range(2, sheet.max_row + 1):
+        data.append([sheet.cell(row=row, column=col).value for col in range(1, sheet.max_column + 1)])
+    workbook.close()
+    return data, headers
+
+
+def _timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+
+def bench_loader(n_rows, legacy=False):
+    """
+    Débit (lignes/s) du chargeur en flux sur un classeur synthétique
+    """
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, 'synthetic.xlsx')
+        print(f"📝 Génération d'un classeur de {n_rows} lignes...")
+        make_synthetic_workbook(path, n_rows)
+
+        (data, headers), elapsed = _timed(load_rows, path)
+        print(f"⚡ load_rows (flux, tuples): {elapsed:.2f} s - {len(data) / elapsed:,.0f} lignes/s")
+
+        def consume_batches(file_path):
+            return sum(len(batch[0]) for _, batch in iter_column_batches(file_path))
+
+        n_batched, elapsed = _timed(consume_batches, path)
+        print(f"⚡ iter_column_batches (colonnes typées): {elapsed:.2f} s - {n_batched / elapsed:,.0f} lignes/s")
+
+        if legacy:
+            (legacy_data, _), elapsed = _timed(_legacy_load_rows, path)
+            print(f"🐢 Lecture cellule par cellule: {elapsed:.2f} s - {len(legacy_data) / elapsed:,.0f} lignes/s")
+
+
+def bench_cache(n_rows=None):
+    """
+    Chargement à froid (conversion du classeur) et à chaud (cache colonnaire)
+    """
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = CLINICAL_DATA_PATH
+        if n_rows:
+            path = os.path.join(tmp_dir, 'synthetic.xlsx')
+            print(f"📝 Génération d'un classeur de {n_rows} lignes...")
+            make_synthetic_workbook(path, n_rows)
+        cache_dir = os.path.join(tmp_dir, 'cache')
+
+        _, elapsed = _timed(load_rows, path)
+        print(f"🐢 Lecture du classeur: {elapsed * 1000:.1f} ms")
+
+        cache_path, elapsed = _timed(build_cache, path, cache_dir)
+        print(f"🧊 Construction du cache: {elapsed * 1000:.1f} ms ({os.path.getsize(cache_path) / 1024:.0f} Ko)")
+
+        for loader in (load_cached_rows, load_cached_dataframe):
+            timings = [_timed(loader, path, cache_dir)[1] for _ in range(5)]
+            print(f"⚡ {loader.__name__} (cache chaud): {min(timings) * 1000:.1f} ms")
+
+
+def _cohort_frame(n_rows):
+    """
+    Table de n_rows patients obtenue en répétant la cohorte réelle
+    """
+    df = load_cached_dataframe().dropna(how='all')
+    repeats = -(-n_rows // len(df))
+    return pd.concat([df] * repeats, ignore_index=True).iloc[:n_rows]
+
+
+def _legacy_score_rows(df, bundle):
+    """
+    Ancienne boucle de l'application: une ligne et une cible à la fois
+    """
+    models, scalers, feature_encoders, target_encoders, feature_names = bundle
+    for record in df.to_dict('records'):
+        for target_name, model in models.items():
+            input_features = encode_features(record, feature_names, feature_encoders)
+            input_scaled = scalers[target_name].transform([input_features])
+            model.predict(input_scaled)
+            model.predict_proba(input_scaled)
+
+
+def bench_batch(n_rows, legacy_rows=100):
+    """
+    Débit de la prédiction par lot comparé à la boucle ligne par ligne
+    """
+    bundle = get_model_bundle()
+    df = _cohort_frame(n_rows)
+
+    _, elapsed = _timed(_legacy_score_rows, df.iloc[:legacy_rows], bundle)
+    legacy_rate = legacy_rows / elapsed
+    print(f"🐢 Boucle ligne par ligne ({legacy_rows} lignes): {legacy_rate:,.0f} patients/s")
+
+    _, elapsed = _timed(score_frame, df, bundle)
+    batch_rate = n_rows / elapsed
+    print(f"⚡ score_frame ({n_rows} lignes): {elapsed * 1000:.0f} ms - {batch_rate:,.0f} patients/s")
+    print(f"📈 Accélération: x{batch_rate / legacy_rate:,.0f}")
+
+
+def bench_engine(n_rows, repeats=200):
+    """
+    Latence d'un patient et débit par lot de chaque moteur de prédiction
+    """
+    df = _cohort_frame(n_rows)
+    for backend in BACKENDS:
+        models, scalers, feature_encoders, _, feature_names = get_model_bundle(backend=backend)
+        X = encode_feature_frame(df, feature_names, feature_encoders)
+        X_scaled = {target: scalers[target].transform(X) for target in models}
+
+        def predict_all(n):
+            return [model.predict_proba(X_scaled[target][:n]) for target, model in models.items()]
+
+        predict_all(1)
+        _, elapsed = _timed(lambda: [predict_all(1) for _ in range(repeats)])
+        print(f"⚡ {backend} - 1 patient, {len(models)} cibles: {elapsed / repeats * 1000:.2f} ms")
+        _, elapsed = _timed(predict_all, n_rows)
+        print(f"⚡ {backend} - {n_rows} patients: {elapsed * 1000:.0f} ms - {n_rows / elapsed:,.0f} patients/s")
+
+
+def _legacy_predict_patient(input_data, bundle):
+    """
+    Ancienne prédiction des applications: encodage, `predict` puis
+    `predict_proba` pour chaque cible (deux parcours des forêts)
+    """
+    models, scalers, feature_encoders, target_encoders, feature_names = bundle
+    for target_name, model in models.items():
+        input_features = encode_features(input_data, feature_names, feature_encoders)
+        input_scaled = scalers[target_name].transform([input_features])
+        model.predict(input_scaled)[0]
+        model.predict_proba(input_scaled)[0]
+
+
+def bench_predict(repeats=200):
+    """
+    Latence d'une prédiction patient (toutes les cibles) avant / après l'API unifiée
+    """
+    record = _cohort_frame(1).to_dict('records')[0]
+    for backend in BACKENDS:
+        bundle = get_model_bundle(backend=backend)
+        timings = {}
+        for name, func in (('predict + predict_proba', _legacy_predict_patient),
+                           ('predict_patient', predict_patient)):
+            func(record, bundle)
+            _, elapsed = _timed(lambda: [func(record, bundle) for _ in range(repeats)])
+            timings[name] = elapsed / repeats
+            print(f"⚡ {backend} - {name}: {timings[name] * 1000:.2f} ms")
+        print(f"📈 {backend} - Accélération: x{timings['predict + predict_proba'] / timings['predict_patient']:.1f}")
+
+
+def _cohort_rows(n_rows):
+    """
+    n_rows lignes brutes (listes de valeurs) en répétant les patients réels
+    """
+    data, headers = load_cached_rows()
+    patients = [row for row in data if any(value is not None for value in row)]
+    return [patients[i % len(patients)] for i in range(n_rows)], headers
+
+
+def _legacy_encode_features(X_data, feature_names):
+    """
+    Ancien encodage des features de `encode_categorical_data` (valeur par
+    valeur, lignes construites par append) suivi de la conversion
+    `np.array` faite par `train_models`
+    """
+    X_encoded = []
+    for i, feature_name in enumerate(feature_names):
+        clean_values = []
+        for val in [row[i] for row in X_data]:
+            if val is None or str(val).strip() == '':
+                clean_values.append('Unknown')
+            else:
+                clean_values.append(str(val))
+        encoded_values = LabelEncoder().fit_transform(clean_values)
+        if len(X_encoded) == 0:
+            X_encoded = [[val] for val in encoded_values]
+        else:
+            for j, val in enumerate(encoded_values):
+                X_encoded[j].append(val)
+    return np.array(X_encoded)
+
+
+def bench_encode(row_counts, legacy=False):
+    """
+    Encodage des features de glioma_analysis_simple (colonnes entières,
+    features et cibles) comparé à l'ancien encodage des features seules
+    """
+    from glioma_analysis_simple import encode_categorical_data, prepare_features
+
+    for n_rows in row_counts:
+        data, headers = _cohort_rows(n_rows)
+        X_data, y_data, feature_names, target_names = prepare_features(data, headers)
+        _, elapsed = _timed(encode_categorical_data, X_data, y_data, feature_names, target_names)
+        print(f"⚡ encode_categorical_data ({len(X_data)} lignes): {elapsed:.2f} s - "
+              f"{len(X_data) / elapsed:,.0f} lignes/s")
+        if legacy:
+            _, elapsed = _timed(_legacy_encode_features, X_data, feature_names)
+            print(f"🐢 Encodage valeur par valeur ({len(X_data)} lignes): {elapsed:.2f} s - "
+                  f"{len(X_data) / elapsed:,.0f} lignes/s")
+
+
+def _legacy_prepare_features(data, headers, feature_columns, target_columns):
+    """
+    Ancien filtrage de `prepare_features` (boucle par ligne et par feature,
+    cibles ajoutées ligne par ligne)
+    """
+    feature_indices = [headers.index(col) for col in feature_columns if col in headers]
+    target_indices = [headers.index(col) for col in target_columns if col in headers]
+    X_data = []
+    y_data = {}
+    for row in data:
+        valid_features = 0
+        feature_values = []
+        for idx in feature_indices:
+            value = row[idx] if idx < len(row) else None
+            if value is not None and str(value).strip() != '':
+                valid_features += 1
+            feature_values.append(value)
+        if valid_features >= len(feature_indices) * 0.5:
+            X_data.append(feature_values)
+            for i, target_idx in enumerate(target_indices):
+                y_data.setdefault(target_columns[i], []).append(row[target_idx] if target_idx < len(row) else None)
+    return X_data, y_data
+
+
+def bench_features(row_counts, legacy=False):
+    """
+    Filtrage des lignes de prepare_features (masques sur colonnes entières)
+    comparé à l'ancienne boucle par ligne
+    """
+    from glioma_analysis_simple import prepare_features
+
+    for n_rows in row_counts:
+        data, headers = _cohort_rows(n_rows)
+        (X_data, y_data, feature_names, target_names), elapsed = _timed(prepare_features, data, headers)
+        print(f"⚡ prepare_features ({n_rows} lignes): {elapsed:.2f} s - {n_rows / elapsed:,.0f} lignes/s")
+        if legacy:
+            _, elapsed = _timed(_legacy_prepare_features, data, headers, feature_names, target_names)
+            print(f"🐢 Boucle par ligne ({n_rows} lignes): {elapsed:.2f} s - {n_rows / elapsed:,.0f} lignes/s")
+
+
+def _legacy_non_null_counts(file_path, n_columns=10):
+    """
+    Ancien comptage des valeurs non-nulles de simple_analysis (une relecture
+    de toutes les lignes par colonne via sheet.cell, 10 premières colonnes)
+    """
+    workbook = openpyxl.load_workbook(file_path)
+    sheet = workbook.active
+    counts = []
+    for col in range(1, min(n_columns + 1, sheet.max_column + 1)):
+        counts.append(sum(1 for row in range(2, sheet.max_row + 1)
+                          if sheet.cell(row=row, column=col).value is not None))
+    workbook.close()
+    return counts
+
+
+def bench_profile(n_rows, legacy=False):
+    """
+    Coût du profil de toutes les colonnes (column_profiler) par rapport à
+    la seule lecture du classeur
+    """
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, 'synthetic.xlsx')
+        print(f"📝 Génération d'un classeur de {n_rows} lignes...")
+        make_synthetic_workbook(path, n_rows)
+
+        def read_only(file_path):
+            headers, records = iter_records(file_path)
+            return sum(1 for _ in records)
+
+        def read_and_profile(file_path):
+            headers, records = iter_records(file_path)
+            return profile_records(headers, records)
+
+        _, elapsed = _timed(read_only, path)
+        print(f"📖 Lecture seule: {elapsed:.2f} s")
+        (_, profiles), elapsed = _timed(read_and_profile, path)
+        print(f"⚡ Lecture + profil de {len(profiles)} colonnes: {elapsed:.2f} s")
+
+        if legacy:
+            counts, elapsed = _timed(_legacy_non_null_counts, path)
+            print(f"🐢 Non-nulles de {len(counts)} colonnes (sheet.cell): {elapsed:.2f} s")
+
+
+async def _service_load(port, patients, n_clients, n_requests):
+    """
+    n_clients connexions persistantes envoient n_requests requêtes au total ;
+    retourne les latences (secondes) vues par les clients
+    """
+    latencies = []
+    per_client = n_requests // n_clients
+
+    async def client(offset):
+        reader, writer = await asyncio.open_connection('127.0.0.1', port)
+        for i in range(per_client):
+            body = json.dumps(patients[(offset + i) % len(patients)]).encode('utf-8')
+            start = time.perf_counter()
+            writer.write(f"POST /predict HTTP/1.1\r\nHost: localhost\r\nContent-Length: {len(body)}\r\n\r\n"
+                         .encode('latin-1') + body)
+            await writer.drain()
+            length = 0
+            while True:
+                line = await reader.readline()
+                if line in (b'\r\n', b''):
+                    break
+                if line.lower().startswith(b'content-length:'):
+                    length = int(line.split(b':')[1])
+            await reader.readexactly(length)
+            latencies.append(time.perf_counter() - start)
+        writer.close()
+
+    await asyncio.gather(*(client(k * per_client) for k in range(n_clients)))
+    return latencies
+
+
+def bench_service(n_clients=32, n_requests=4000, windows=(0.0, 2.0, 5.0)):
+    """
+    Débit et latence du service HTTP : sans regroupement (lots de 1 patient)
+    puis pour chaque fenêtre de regroupement
+    """
+    from prediction_service import DEFAULT_MAX_BATCH_SIZE, create_service
+
+    df = _cohort_frame(1000)
+    bundle = get_model_bundle()
+    columns = [name for name in bundle.feature_names if name in df.columns]
+    patients = [{name: (None if pd.isna(value) else value.item() if hasattr(value, 'item') else value)
+                 for name, value in zip(columns, row)} for row in df[columns].itertuples(index=False)]
+
+    configurations = [(0.0, 1)] + [(window, DEFAULT_MAX_BATCH_SIZE) for window in windows]
+    for window, max_batch_size in configurations:
+        service = create_service(batch_window_ms=window, max_batch_size=max_batch_size, cache_size=0)
+        loop = asyncio.new_event_loop()
+        started = threading.Event()
+        ports = []
+
+        def ready(port):
+            ports.append(port)
+            started.set()
+
+        serving = loop.create_task(service.serve('127.0.0.1', 0, ready))
+
+        def run_server():
+            try:
+                loop.run_until_complete(serving)
+            except asyncio.CancelledError:
+                pass
+
+        server = threading.Thread(target=run_server, daemon=True)
+        server.start()
+        started.wait()
+
+        start = time.perf_counter()
+        latencies = asyncio.run(_service_load(ports[0], patients, n_clients, n_requests))
+        elapsed = time.perf_counter() - start
+        loop.call_soon_threadsafe(serving.cancel)
+        server.join()
+
+        metrics = service.metrics()
+        latencies = np.array(latencies) * 1000
+        label = "Sans regroupement" if max_batch_size == 1 else f"Fenêtre {window:g} ms"
+        print(f"⚡ {label}, {n_clients} clients: {len(latencies) / elapsed:,.0f} requêtes/s - "
+              f"p50 {np.percentile(latencies, 50):.1f} ms, p99 {np.percentile(latencies, 99):.1f} ms - "
+              f"lots de {metrics['batch_size']['mean']:.1f} patients en moyenne")
+
+
+def bench_lru(n_submissions=2000, seed=0):
+    """
+    Soumissions du formulaire tirées de la cohorte réelle (les mêmes
+    patients reviennent) : latence de predict_patient avec et sans cache
+    """
+    df = load_cached_dataframe().dropna(how='all')
+    rng = np.random.default_rng(seed)
+    for backend in BACKENDS:
+        bundle = get_model_bundle(backend=backend)
+        columns = [name for name in bundle.feature_names if name in df.columns]
+        # Valeurs sous la forme vue à l'entraînement (57.0 -> '57'), comme le formulaire
+        patients = [{name: label_text(value) for name, value in zip(columns, row)}
+                    for row in df[columns].itertuples(index=False)]
+        submissions = [patients[i] for i in rng.integers(0, len(patients), n_submissions)]
+        version = model_version(backend=backend)
+
+        def run(cache):
+            for input_data in submissions:
+                predict_patient(input_data, bundle, cache, version)
+
+        _, uncached = _timed(run, None)
+        cache = PredictionCache()
+        _, cached = _timed(run, cache)
+        stats = cache.stats()
+        print(f"⚡ {backend}: sans cache {uncached / n_submissions * 1000:.2f} ms/patient, "
+              f"avec cache {cached / n_submissions * 1000:.3f} ms/patient "
+              f"(succès {stats['hit_rate']:.0%}, {stats['size']} vecteurs distincts)")
+
+
+def _enter_spans(n):
+    for _ in range(n):
+        with stage_timing.span('bench'):
+            pass
+
+
+def bench_timing(repeats=500):
+    """
+    Coût de la mesure des étapes sur predict_patient (désactivée / activée)
+    et coût unitaire d'un `with span(...)`
+    """
+    record = _cohort_frame(1).to_dict('records')[0]
+    enabled = stage_timing.is_enabled()
+    try:
+        for state in (False, True):
+            stage_timing.enable(state)
+            _, elapsed = _timed(_enter_spans, repeats * 100)
+            print(f"⏱️ span {'activé' if state else 'désactivé'}: {elapsed / (repeats * 100) * 1e9:.0f} ns")
+        for backend in BACKENDS:
+            bundle = get_model_bundle(backend=backend)
+            timings = {}
+            for state in (False, True):
+                stage_timing.enable(state)
+                predict_patient(record, bundle)
+                _, elapsed = _timed(lambda: [predict_patient(record, bundle) for _ in range(repeats)])
+                timings[state] = elapsed / repeats
+            print(f"⚡ {backend}: désactivée {timings[False] * 1e6:.1f} µs, activée {timings[True] * 1e6:.1f} µs "
+                  f"({(timings[True] / timings[False] - 1) * 100:+.1f}%)")
+    finally:
+        stage_timing.enable(enabled)
+        stage_timing.reset()
+
+
+def _traced(func, *args):
+    """
+    Résultat, durée et pic d'allocations (tracemalloc) d'un appel
+    """
+    tracemalloc.start()
+    try:
+        result, elapsed = _timed(func, *args)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return result, elapsed, peak
+
+
+def _legacy_cohort(path, cache_dir, columns, threshold):
+    """
+    Ancien chargement : toutes les colonnes (objets / float64), puis
+    sélection copiée et filtrage des lignes
+    """
+    df = load_cached_dataframe(path, cache_dir)
+    selected_df = df[columns].copy()
+    return df, selected_df.dropna(thresh=threshold)
+
+
+def _compact_cohort(path, cache_dir):
+    df = load_cached_frame(COHORT_SCHEMA, path, cache_dir)
+    with contextlib.redirect_stdout(io.StringIO()):
+        selected_df, features, _ = glioma_prediction.prepare_features(df)
+    return df, selected_df, features
+
+
+def bench_schema(scale=100):
+    """
+    Mémoire de la cohorte préparée pour glioma_prediction : DataFrame complet
+    + copie de la sélection, vs colonnes du schéma en types compacts
+    """
+    n_patients = len(load_cached_rows()[0])
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for n_rows in (None, n_patients * scale):
+            path = CLINICAL_DATA_PATH
+            if n_rows:
+                path = os.path.join(tmp_dir, 'synthetic.xlsx')
+                print(f"\n📝 Génération d'un classeur de {n_rows} lignes (x{scale})...")
+                make_synthetic_workbook(path, n_rows)
+            cache_dir = os.path.join(tmp_dir, 'cache')
+            build_cache(path, cache_dir)
+
+            (df, selected_df, features), compact_seconds, compact_peak = _traced(_compact_cohort, path, cache_dir)
+            compact_memory = frame_memory(df) + frame_memory(selected_df)
+            (legacy_df, legacy_selected), legacy_seconds, legacy_peak = _traced(
+                _legacy_cohort, path, cache_dir, list(selected_df.columns), len(features) * 0.5)
+            legacy_memory = frame_memory(legacy_df) + frame_memory(legacy_selected)
+            assert legacy_selected.index.equals(selected_df.index)
+
+            print(f"📊 {os.path.basename(path)}: {len(df)} lignes -> {len(selected_df)} lignes préparées")
+            print(f"🐢 Objets / float64 + copie: {legacy_memory / 1e6:.2f} Mo retenus, "
+                  f"pic {legacy_peak / 1e6:.2f} Mo, {legacy_seconds * 1000:.0f} ms")
+            print(f"⚡ Schéma compact: {compact_memory / 1e6:.2f} Mo retenus, "
+                  f"pic {compact_peak / 1e6:.2f} Mo, {compact_seconds * 1000:.0f} ms")
+            print(f"📉 Mémoire retenue x{legacy_memory / compact_memory:.1f}, pic x{legacy_peak / compact_peak:.1f}")
+            if n_rows is None:
+                # Types par colonne du schéma (classeur réel)
+                print(format_memory_report(legacy_df[list(df.columns)], df))
+
+
+def bench_fold(n_rows=5000, repeats=200):
+    """
+    Forêts compilées avec standardisation (scaler.transform puis seuils
+    standardisés) vs seuils repliés sur les features encodées
+    """
+    models, scalers, feature_encoders, _, feature_names = get_model_bundle(backend='sklearn')
+    cohort = encode_feature_frame(load_cached_dataframe().dropna(how='all'), feature_names, feature_encoders)
+    folded_models = {target: compile_forest(model, scalers[target]) for target, model in models.items()}
+    n_checked = check_folded_equivalence(models, scalers, folded_models, cohort)
+    print(f"✅ Probabilités identiques à scaler + predict_proba sur toute la cohorte ({n_checked} patients)")
+
+    engines = {
+        'standardisation + forêts': ({target: compile_forest(model) for target, model in models.items()}, scalers),
+        'seuils repliés': (folded_models, {target: IdentityScaling() for target in models}),
+    }
+    X = encode_feature_frame(_cohort_frame(n_rows), feature_names, feature_encoders)
+    for name, (engine_models, engine_scalers) in engines.items():
+        predict_matrix(engine_models, engine_scalers, X[:1])
+        _, elapsed = _timed(lambda: [predict_matrix(engine_models, engine_scalers, X[:1]) for _ in range(repeats)])
+        print(f"⚡ {name} - 1 patient, {len(models)} cibles: {elapsed / repeats * 1000:.3f} ms")
+        _, elapsed = _timed(predict_matrix, engine_models, engine_scalers, X)
+        print(f"⚡ {name} - {n_rows} patients: {elapsed * 1000:.0f} ms - {n_rows / elapsed:,.0f} patients/s")
+
+
+def bench_explain(repeats=200):
+    """
+    Latence d'une prédiction patient avec et sans contributions des features
+    """
+    record = _cohort_frame(1).to_dict('records')[0]
+    for backend in BACKENDS:
+        bundle = get_model_bundle(backend=backend)
+        for explain in (False, True):
+            predict_patient(record, bundle, explain=explain)
+            _, elapsed = _timed(lambda: [predict_patient(record, bundle, explain=explain) for _ in range(repeats)])
+            label = "avec contributions" if explain else "sans contributions"
+            print(f"⚡ {backend} - {label}: {elapsed / repeats * 1000:.2f} ms")
+
+
+def _scaled_survival_engine(n_patients, seed=0):
+    """
+    Moteur de survie de n_patients obtenu en répétant la cohorte réelle
+    (durées décalées de quelques jours pour multiplier les durées distinctes)
+    """
+    engine = get_survival_engine()
+    rng = np.random.default_rng(seed)
+    repeats = -(-n_patients // engine.n_patients)
+    endpoints = {}
+    for endpoint, (time_values, time_index, event) in engine.endpoints.items():
+        time = np.where(time_index >= 0, time_values[np.maximum(time_index, 0)], np.nan)
+        time = np.tile(time, repeats)[:n_patients] + rng.integers(0, 30, n_patients)
+        endpoints[endpoint] = (time, np.tile(event, repeats)[:n_patients])
+    covariates = {name: (categories, np.tile(codes, repeats)[:n_patients])
+                  for name, (categories, codes) in engine.covariates.items()}
+    return SurvivalEngine(endpoints, covariates)
+
+
+def bench_survival(n_patients=1000000):
+    """
+    Courbes de Kaplan-Meier et log-rank sur n_patients : premier calcul
+    (tri des durées, puis masques et comptages) et résultat mémorisé
+    """
+    engine, elapsed = _timed(_scaled_survival_engine, n_patients)
+    print(f"📦 Moteur de {n_patients:,} patients (tri des durées): {elapsed * 1000:.0f} ms")
+
+    filters = {'Sex at Birth': 'Male', 'Primary Diagnosis': 'GBM'}
+    by = ['IDH1 mutation', 'MGMT methylation']
+    for name, query in (('Courbe (sexe × diagnostic)', lambda: engine.curve('os', filters)),
+                        ('Log-rank IDH1 × MGMT', lambda: engine.compare('os', by)),
+                        ('Log-rank IDH1 × MGMT, filtré', lambda: engine.compare('pfs', by, filters))):
+        result, cold = _timed(query)
+        _, warm = _timed(query)
+        print(f"⚡ {name}: {cold * 1000:.1f} ms, mémorisé {warm * 1e6:.0f} µs")
+    print(f"📊 Log-rank IDH1 × MGMT filtré: chi²={result.statistic:.1f}, ddl={result.dof}")
+
+
+def _legacy_group_rates(df, group_by, filters):
+    """
+    Regroupement pandas sur les lignes brutes, recalculé à chaque requête
+    """
+    for name, value in filters.items():
+        df = df[df[name].astype(str).str.strip() == value]
+    return df.groupby(group_by, dropna=False).agg(
+        patients=('Progression', 'size'),
+        progression=('Progression', lambda values: (values == 1).mean()),
+        deces=('Overall Survival (Death)', lambda values: (values == 1).mean()),
+    )
+
+
+def bench_cube(n_rows=1000000, n_append=10000):
+    """
+    Requêtes d'exploration de la cohorte : regroupement pandas sur les
+    lignes vs cube d'agrégats, et ajout incrémental de lignes
+    """
+    df = _cohort_frame(n_rows)
+    cube = CohortCube()
+    _, elapsed = _timed(cube.append, df)
+    print(f"🧊 Construction du cube ({n_rows:,} lignes): {elapsed * 1000:.0f} ms - {len(cube.cells)} cellules")
+
+    queries = ((['Primary Diagnosis'], {}),
+               (['IDH1 mutation', 'MGMT methylation'], {'Sex at Birth': 'Male'}))
+    for group_by, filters in queries:
+        _, legacy = _timed(_legacy_group_rates, df, group_by, filters)
+        cube.query(group_by, filters)
+        _, elapsed = _timed(cube.query, group_by, filters)
+        print(f"⚡ {' × '.join(group_by)} {filters or ''}: pandas {legacy * 1000:.0f} ms, "
+              f"cube {elapsed * 1000:.2f} ms (x{legacy / elapsed:,.0f})")
+
+    _, elapsed = _timed(cube.append, _cohort_frame(n_append))
+    print(f"➕ Ajout de {n_append:,} lignes: {elapsed * 1000:.0f} ms ({cube.n_patients:,} patients)")
+
+
+def _scaled_neighbor_index(n_patients, seed=0):
+    """
+    Index de n_patients obtenu en répétant la cohorte réelle (âges décalés
+    de quelques années pour multiplier les valeurs distinctes)
+    """
+    index = get_neighbor_index()
+    rng = np.random.default_rng(seed)
+    rows = np.arange(n_patients) % len(index)
+    numeric = index.numeric[rows] + rng.integers(-3, 4, index.numeric[rows].shape)
+    outcomes = {target: labels[rows] for target, labels in index.outcomes.items()}
+    return NeighborIndex(index.feature_names, index.categories, index.codes[rows], numeric,
+                         np.char.add(index.case_ids[rows], [f"-{i}" for i in range(n_patients)]), outcomes)
+
+
+def _brute_force_neighbors(index, codes, numeric, k):
+    """
+    Distances de Gower requête par requête (comparaison directe des codes,
+    features manquantes d'un côté ou de l'autre ignorées)
+    """
+    distances = np.empty((len(codes), k))
+    for q in range(len(codes)):
+        present = (index.codes >= 0) & (codes[q] >= 0)
+        total = (present & (index.codes != codes[q])).sum(axis=1).astype(np.float64)
+        weights = present.sum(axis=1).astype(np.float64)
+        for j in range(len(index.numeric_features)):
+            gap = np.abs(index.numeric[:, j] - numeric[q, j]) / index.spans[j]
+            total += np.nan_to_num(gap)
+            weights += ~np.isnan(gap)
+        distances[q] = np.sort(np.where(weights > 0, total / np.maximum(weights, 1), 1.0))[:k]
+    return distances
+
+
+def bench_neighbors(n_patients=100000, n_queries=1000, k=5):
+    """
+    Recherche des patients similaires : une requête (formulaire) et un lot
+    de requêtes (prédiction par lot), comparées au calcul requête par requête
+    """
+    if get_neighbor_index() is None:
+        print("❌ Index des voisins absent : lancez d'abord model_artifact.py")
+        return
+    index, elapsed = _timed(_scaled_neighbor_index, n_patients)
+    print(f"👥 Index de {len(index):,} patients construit en {elapsed * 1000:.0f} ms")
+
+    rng = np.random.default_rng(1)
+    rows = rng.integers(0, len(index), n_queries)
+    codes, numeric = index.codes[rows], index.numeric[rows] + rng.integers(-5, 6, index.numeric[rows].shape)
+
+    index.search(codes[:1], numeric[:1], k)
+    timings = [_timed(index.search, codes[i:i + 1], numeric[i:i + 1], k)[1] for i in range(min(n_queries, 50))]
+    print(f"⚡ Une requête (k={k}): {np.median(timings) * 1000:.2f} ms (médiane)")
+
+    (_, distances), elapsed = _timed(index.search, codes, numeric, k)
+    n_check = min(n_queries, 50)
+    expected, legacy = _timed(_brute_force_neighbors, index, codes[:n_check], numeric[:n_check], k)
+    legacy *= n_queries / n_check
+    print(f"📦 Lot de {n_queries:,} requêtes: {elapsed * 1000:.0f} ms ({n_queries / elapsed:,.0f} requêtes/s), "
+          f"requête par requête ~{legacy * 1000:.0f} ms (x{legacy / elapsed:.1f})")
+    print(f"✅ Distances identiques au calcul direct: {np.allclose(distances[:n_check], expected)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mesures de performance")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    loader_parser = subparsers.add_parser('loader', help="Débit du chargement du classeur")
+    loader_parser.add_argument('--rows', type=int, default=100000)
+    loader_parser.add_argument('--legacy', action='store_true',
+                               help="Mesurer aussi l'ancienne lecture cellule par cellule")
+
+    cache_parser = subparsers.add_parser('cache', help="Chargement via le cache colonnaire")
+    cache_parser.add_argument('--rows', type=int, default=None,
+                              help="Classeur synthétique (par défaut: le fichier réel)")
+
+    batch_parser = subparsers.add_parser('batch', help="Prédiction par lot vs ligne par ligne")
+    batch_parser.add_argument('--rows', type=int, default=5000)
+
+    engine_parser = subparsers.add_parser('engine', help="Moteurs de prédiction compilé et scikit-learn")
+    engine_parser.add_argument('--rows', type=int, default=5000)
+
+    predict_parser = subparsers.add_parser('predict', help="Latence d'une prédiction patient")
+    predict_parser.add_argument('--repeats', type=int, default=200)
+
+    encode_parser = subparsers.add_parser('encode', help="Encodage des features (glioma_analysis_simple)")
+    encode_parser.add_argument('--rows', type=int, nargs='+', default=[100000, 1000000])
+    encode_parser.add_argument('--legacy', action='store_true',
+                               help="Mesurer aussi l'ancien encodage valeur par valeur")
+
+    features_parser = subparsers.add_parser('features', help="Filtrage des lignes (glioma_analysis_simple)")
+    features_parser.add_argument('--rows', type=int, nargs='+', default=[100000, 1000000])
+    features_parser.add_argument('--legacy', action='store_true',
+                                 help="Mesurer aussi l'ancienne boucle par ligne")
+
+    profile_parser = subparsers.add_parser('profile', help="Profil des colonnes (simple_analysis)")
+    profile_parser.add_argument('--rows', type=int, default=100000)
+    profile_parser.add_argument('--legacy', action='store_true',
+                                help="Mesurer aussi l'ancien comptage par relecture de colonnes")
+
+    service_parser = subparsers.add_parser('service', help="Service HTTP avec regroupement des requêtes")
+    service_parser.add_argument('--clients', type=int, default=32)
+    service_parser.add_argument('--requests', type=int, default=4000)
+    service_parser.add_argument('--windows', type=float, nargs='+', default=[0.0, 2.0, 5.0],
+                                help="Fenêtres de regroupement à comparer (ms)")
+
+    lru_parser = subparsers.add_parser('lru', help="Cache de prédictions du formulaire")
+    lru_parser.add_argument('--submissions', type=int, default=2000)
+
+    timing_parser = subparsers.add_parser('timing', help="Coût de la mesure des étapes")
+    timing_parser.add_argument('--repeats', type=int, default=500)
+
+    schema_parser = subparsers.add_parser('schema', help="Mémoire de la cohorte en types compacts")
+    schema_parser.add_argument('--scale', type=int, default=100,
+                               help="Facteur de répétition du classeur synthétique (défaut: 100)")
+
+    fold_parser = subparsers.add_parser('fold', help="Standardisation repliée dans les seuils des forêts")
+    fold_parser.add_argument('--rows', type=int, default=5000)
+    fold_parser.add_argument('--repeats', type=int, default=200)
+
+    explain_parser = subparsers.add_parser('explain', help="Coût des contributions des features")
+    explain_parser.add_argument('--repeats', type=int, default=200)
+
+    survival_parser = subparsers.add_parser('survival', help="Courbes de Kaplan-Meier et log-rank")
+    survival_parser.add_argument('--patients', type=int, default=1000000)
+
+    cube_parser = subparsers.add_parser('cube', help="Cube d'agrégats de la cohorte")
+    cube_parser.add_argument('--rows', type=int, default=1000000)
+    cube_parser.add_argument('--append', type=int, default=10000)
+
+    neighbors_parser = subparsers.add_parser('neighbors', help="Recherche des patients similaires")
+    neighbors_parser.add_argument('--patients', type=int, default=100000)
+    neighbors_parser.add_argument('--queries', type=int, default=1000)
+    neighbors_parser.add_argument('--k', type=int, default=5)
+
+    args = parser.parse_args()
+
+    if args.command == 'loader':
+        bench_loader(args.rows, args.legacy)
+    elif args.command == 'cache':
+        bench_cache(args.rows)
+    elif args.command == 'batch':
+        bench_batch(args.rows)
+    elif args.command == 'engine':
+        bench_engine(args.rows)
+    elif args.command == 'predict':
+        bench_predict(args.repeats)
+    elif args.command == 'encode':
+        bench_encode(args.rows, args.legacy)
+    elif args.command == 'features':
+        bench_features(args.rows, args.legacy)
+    elif args.command == 'profile':
+        bench_profile(args.rows, args.legacy)
+    elif args.command == 'service':
+        bench_service(args.clients, args.requests, args.windows)
+    elif args.command == 'lru':
+        bench_lru(args.submissions)
+    elif args.command == 'timing':
+        bench_timing(args.repeats)
+    elif args.command == 'schema':
+        bench_schema(args.scale)
+    elif args.command == 'fold':
+        bench_fold(args.rows, args.repeats)
+    elif args.command == 'explain':
+        bench_explain(args.repeats)
+    elif args.command == 'survival':
+        bench_survival(args.patients)
+    elif args.command == 'cube':
+        bench_cube(args.rows, args.append)
+    elif args.command == 'neighbors':
+        bench_neighbors(args.patients, args.queries, args.k)
+
+
+if __name__ == "__main__":
+    main()
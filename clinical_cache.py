@@ -0,0 +1,409 @@
+"""
+Cache colonnaire sur disque des données cliniques des gliomes
+
+Le classeur est converti une seule fois en un fichier binaire colonnaire
+(un tableau typé par colonne, colonnes catégorielles encodées par
+dictionnaire). Le cache est indexé par l'empreinte SHA-256 du classeur ;
+la taille et la date de modification servent de raccourci pour éviter de
+recalculer l'empreinte quand le fichier n'a pas changé. Toute modification
+du classeur déclenche une reconstruction transparente.
+"""
+
+import datetime
+import hashlib
+import json
+import os
+
+import numpy as np
+
+from clinical_data_loader import CLINICAL_DATA_PATH, iter_records, to_typed_column
+
+CACHE_DIR = '.clinical_cache'
+CACHE_FORMAT_VERSION = 1
+
+# Format du fichier: MAGIC, longueur de l'en-tête JSON (uint64), en-tête JSON,
+# puis les tableaux bruts les uns à la suite des autres (alignés sur 8 octets)
+_MAGIC = b'GLIOCOL1'
+
+_INDEX_FILE = 'index.json'
+
+# Types des catégories (pour restituer exactement les valeurs d'origine)
+_KIND_PARSERS = {
+    's': str,
+    'i': int,
+    'f': float,
+    'b': lambda text: text == 'True',
+    'D': datetime.date.fromisoformat,
+    'd': datetime.datetime.fromisoformat,
+    't': datetime.time.fromisoformat,
+}
+
+
+def _value_kind(value):
+    if isinstance(value, bool):
+        return 'b'
+    if isinstance(value, int):
+        return 'i'
+    if isinstance(value, float):
+        return 'f'
+    if isinstance(value, datetime.datetime):
+        return 'd'
+    if isinstance(value, datetime.date):
+        return 'D'
+    if isinstance(value, datetime.time):
+        return 't'
+    return 's'
+
+
+def _value_text(value):
+    if isinstance(value, (datetime.date, datetime.time)):
+        return value.isoformat()
+    if isinstance(value, float):
+        return repr(value)
+    return str(value)
+
+
+def _smallest_code_dtype(n_categories):
+    for dtype in (np.int8, np.int16, np.int32):
+        if n_categories < np.iinfo(dtype).max:
+            return dtype
+    return np.int64
+
+
+def file_sha256(file_path, chunk_size=1 << 20):
+    """
+    Calcule l'empreinte SHA-256 d'un fichier
+    """
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _read_index(cache_dir):
+    try:
+        with open(os.path.join(cache_dir, _INDEX_FILE), encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _write_index(cache_dir, index):
+    tmp_path = os.path.join(cache_dir, f"{_INDEX_FILE}.{os.getpid()}.tmp")
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(index, f, indent=2)
+    os.replace(tmp_path, os.path.join(cache_dir, _INDEX_FILE))
+
+
+def source_fingerprint(file_path, cache_dir=CACHE_DIR):
+    """
+    Retourne l'empreinte SHA-256 du classeur, sans relire le fichier si sa
+    taille et sa date de modification n'ont pas changé
+    """
+    stat = os.stat(file_path)
+    key = os.path.abspath(file_path)
+    entry = _read_index(cache_dir).get(key)
+    if entry and entry['size'] == stat.st_size and entry['mtime_ns'] == stat.st_mtime_ns:
+        return entry['sha256']
+
+    sha256 = file_sha256(file_path)
+    os.makedirs(cache_dir, exist_ok=True)
+    index = _read_index(cache_dir)
+    index[key] = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'sha256': sha256}
+    _write_index(cache_dir, index)
+    return sha256
+
+
+def cache_path_for(file_path, cache_dir=CACHE_DIR):
+    """
+    Chemin du fichier cache correspondant au contenu actuel du classeur
+    """
+    stem = os.path.splitext(os.path.basename(file_path))[0]
+    sha256 = source_fingerprint(file_path, cache_dir)
+    return os.path.join(cache_dir, f"{stem}-{sha256[:16]}-v{CACHE_FORMAT_VERSION}.col")
+
+
+def _encode_column(index, values, arrays):
+    """
+    Encode une colonne brute et ajoute ses tableaux à `arrays`
+
+    Retourne la description de la colonne pour l'en-tête du fichier
+    ('int', 'float' ou 'cat' avec son dictionnaire de catégories).
+    """
+    prefix = f"c{index}_"
+    kinds = {_value_kind(value) for value in values if value is not None}
+    missing = np.fromiter((value is None for value in values), dtype=bool, count=len(values))
+
+    if kinds == {'i'}:
+        column = {'kind': 'int', 'values': prefix + 'values'}
+        arrays[column['values']] = np.array([0 if value is None else value for value in values], dtype=np.int64)
+        if missing.any():
+            column['missing'] = prefix + 'missing'
+            arrays[column['missing']] = missing
+        return column
+
+    if kinds == {'f'}:
+        column = {'kind': 'float', 'values': prefix + 'values'}
+        arrays[column['values']] = np.array([np.nan if value is None else value for value in values], dtype=np.float64)
+        return column
+
+    # Encodage par dictionnaire: une entrée par couple (type, valeur)
+    categories = {}
+    codes = np.empty(len(values), dtype=np.int64)
+    for i, value in enumerate(values):
+        if value is None:
+            codes[i] = -1
+        else:
+            key = (_value_kind(value), _value_text(value))
+            codes[i] = categories.setdefault(key, len(categories))
+
+    column = {'kind': 'cat', 'codes': prefix + 'codes', 'categories': [list(key) for key in categories]}
+    arrays[column['codes']] = codes.astype(_smallest_code_dtype(len(categories)))
+    return column
+
+
+def _decode_column(column, arrays):
+    """
+    Restitue une colonne sous forme de tableau d'objets (valeurs d'origine)
+    """
+    if column['kind'] == 'int':
+        values = arrays[column['values']].astype(object)
+        if 'missing' in column:
+            values[arrays[column['missing']]] = None
+        return values
+
+    if column['kind'] == 'float':
+        values = arrays[column['values']]
+        decoded = values.astype(object)
+        decoded[np.isnan(values)] = None
+        return decoded
+
+    categories = column['categories']
+    lookup = np.empty(len(categories) + 1, dtype=object)
+    lookup[:-1] = [_KIND_PARSERS[kind](text) for kind, text in categories]
+    lookup[-1] = None  # le code -1 désigne une valeur manquante
+    return lookup[arrays[column['codes']]]
+
+
+def _write_columnar(path, meta, arrays):
+    """
+    Écrit l'en-tête et les tableaux dans un fichier temporaire puis le renomme
+    """
+    layout = {}
+    offset = 0
+    for name, array in arrays.items():
+        layout[name] = {'dtype': array.dtype.str, 'shape': list(array.shape), 'offset': offset}
+        offset += -(-array.nbytes // 8) * 8
+    header = json.dumps(dict(meta, arrays=layout)).encode('utf-8')
+    header += b' ' * (-(len(_MAGIC) + 8 + len(header)) % 8)
+
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(_MAGIC)
+        f.write(np.uint64(len(header)).tobytes())
+        f.write(header)
+        for array in arrays.values():
+            data = np.ascontiguousarray(array).tobytes()
+            f.write(data)
+            f.write(b'\0' * (-len(data) % 8))
+    os.replace(tmp_path, path)
+
+
+def _read_columnar(path):
+    """
+    Lit un fichier cache ; les tableaux sont des vues sur un unique tampon
+    """
+    buffer = bytearray(os.path.getsize(path))
+    with open(path, 'rb') as f:
+        f.readinto(buffer)
+    if buffer[:len(_MAGIC)] != _MAGIC:
+        raise ValueError(f"Fichier cache invalide: {path}")
+    header_size = int(np.frombuffer(buffer, dtype=np.uint64, count=1, offset=len(_MAGIC))[0])
+    data_start = len(_MAGIC) + 8 + header_size
+    meta = json.loads(bytes(buffer[len(_MAGIC) + 8:data_start]))
+
+    arrays = {}
+    for name, spec in meta.pop('arrays').items():
+        dtype = np.dtype(spec['dtype'])
+        count = int(np.prod(spec['shape']))
+        arrays[name] = np.frombuffer(
+            buffer, dtype=dtype, count=count, offset=data_start + spec['offset']
+        ).reshape(spec['shape'])
+    return meta, arrays
+
+
+def build_cache(file_path=CLINICAL_DATA_PATH, cache_dir=CACHE_DIR):
+    """
+    Convertit le classeur en fichier cache colonnaire et retourne son chemin
+    """
+    path = cache_path_for(file_path, cache_dir)
+    headers, records = iter_records(file_path)
+    raw_columns = list(zip(*records)) or [() for _ in headers]
+
+    arrays = {}
+    columns = [_encode_column(i, list(values), arrays) for i, values in enumerate(raw_columns)]
+    meta = {
+        'version': CACHE_FORMAT_VERSION,
+        'source': os.path.basename(file_path),
+        'headers': headers,
+        'columns': columns,
+        'n_rows': len(raw_columns[0]) if raw_columns else 0,
+    }
+
+    os.makedirs(cache_dir, exist_ok=True)
+    _write_columnar(path, meta, arrays)
+
+    # Supprimer les caches obsolètes du même classeur
+    stem = os.path.basename(path).rsplit('-', 2)[0]
+    for name in os.listdir(cache_dir):
+        if name.startswith(stem + '-') and name.endswith('.col') and name != os.path.basename(path):
+            os.remove(os.path.join(cache_dir, name))
+
+    return path
+
+
+def _load_arrays(file_path, cache_dir):
+    path = cache_path_for(file_path, cache_dir)
+    if not os.path.exists(path):
+        build_cache(file_path, cache_dir)
+    return _read_columnar(path)
+
+
+def load_cached_object_columns(file_path=CLINICAL_DATA_PATH, cache_dir=CACHE_DIR):
+    """
+    Charge les colonnes avec leurs valeurs d'origine (tableaux d'objets)
+
+    Retourne (columns, headers).
+    """
+    meta, arrays = _load_arrays(file_path, cache_dir)
+    columns = [_decode_column(column, arrays) for column in meta['columns']]
+    return columns, meta['headers']
+
+
+def load_cached_rows(file_path=CLINICAL_DATA_PATH, cache_dir=CACHE_DIR):
+    """
+    Charge les données sous forme de lignes, comme `clinical_data_loader.load_rows`
+
+    Retourne (data, headers).
+    """
+    columns, headers = load_cached_object_columns(file_path, cache_dir)
+    data = [list(row) for row in zip(*columns)]
+    return data, headers
+
+
+def load_cached_columns(file_path=CLINICAL_DATA_PATH, cache_dir=CACHE_DIR):
+    """
+    Charge les colonnes typées (`clinical_data_loader.to_typed_column`,
+    appliqué à chaque colonne complète)
+
+    Retourne (columns, headers).
+    """
+    meta, arrays = _load_arrays(file_path, cache_dir)
+    columns = []
+    for column in meta['columns']:
+        if column['kind'] == 'int' and 'missing' not in column:
+            columns.append(arrays[column['values']])
+        elif column['kind'] == 'int':
+            values = arrays[column['values']].astype(np.float64)
+            values[arrays[column['missing']]] = np.nan
+            columns.append(values)
+        elif column['kind'] == 'float':
+            columns.append(arrays[column['values']])
+        else:
+            columns.append(to_typed_column(list(_decode_column(column, arrays))))
+    return columns, meta['headers']
+
+
+def _numeric_values(column, arrays):
+    """
+    Valeurs numériques d'une colonne (float64, manquantes -> NaN), ou
+    None si la colonne contient du texte
+    """
+    if column['kind'] == 'int':
+        values = arrays[column['values']].astype(np.float64)
+        if 'missing' in column:
+            values[arrays[column['missing']]] = np.nan
+        return values
+    if column['kind'] == 'float':
+        return arrays[column['values']]
+    values = to_typed_column(list(_decode_column(column, arrays)))
+    return values.astype(np.float64) if values.dtype != object else None
+
+
+def _smallest_int_dtype(values):
+    """
+    Plus petit type entier qui contient exactement les valeurs (sans NaN),
+    ou None si elles ne sont pas entières
+    """
+    if len(values) and not np.array_equal(values, np.round(values)):
+        return None
+    low, high = (values.min(), values.max()) if len(values) else (0, 0)
+    for dtype in (np.int8, np.int16, np.int32, np.int64):
+        if np.iinfo(dtype).min <= low and high <= np.iinfo(dtype).max:
+            return dtype
+    return None
+
+
+def _compact_column(column, arrays, kind):
+    """
+    Colonne du cache dans le type compact demandé par le schéma
+
+    - 'category' : catégories du dictionnaire du cache et codes, sans
+      passer par des objets Python ligne par ligne ;
+    - 'int' : plus petit entier qui contient les valeurs (Int8... nullable
+      si des valeurs manquent), sinon comme 'float' ;
+    - 'float' : float32 si la conversion est exacte, sinon float64.
+    Une colonne numérique qui contient du texte devient catégorielle.
+    """
+    import pandas as pd
+
+    if kind != 'category':
+        values = _numeric_values(column, arrays)
+        if values is not None:
+            missing = np.isnan(values)
+            if kind == 'int':
+                dtype = _smallest_int_dtype(values[~missing])
+                if dtype is not None and not missing.any():
+                    return values.astype(dtype)
+                if dtype is not None:
+                    return pd.arrays.IntegerArray(np.where(missing, 0, values).astype(dtype), missing)
+            compact = values.astype(np.float32)
+            return compact if np.array_equal(compact, values, equal_nan=True) else values
+
+    if column['kind'] == 'cat':
+        categories = [_KIND_PARSERS[value_kind](text) for value_kind, text in column['categories']]
+        if len(set(categories)) == len(categories):
+            return pd.Categorical.from_codes(arrays[column['codes']].astype(np.int64), categories)
+    return pd.Categorical(_decode_column(column, arrays))
+
+
+def load_cached_frame(schema, file_path=CLINICAL_DATA_PATH, cache_dir=CACHE_DIR):
+    """
+    Charge uniquement les colonnes du schéma {en-tête: 'category' | 'int' |
+    'float'}, chacune dans son type compact, directement depuis les
+    tableaux du cache (colonnes absentes ignorées, première occurrence
+    d'un en-tête dupliqué)
+    """
+    import pandas as pd
+
+    meta, arrays = _load_arrays(file_path, cache_dir)
+    positions = {}
+    for i, header in enumerate(meta['headers']):
+        positions.setdefault(header, i)
+
+    data = {name: _compact_column(meta['columns'][positions[name]], arrays, kind)
+            for name, kind in schema.items() if name in positions}
+    return pd.DataFrame(data, index=pd.RangeIndex(meta['n_rows']))
+
+
+def load_cached_dataframe(file_path=CLINICAL_DATA_PATH, cache_dir=CACHE_DIR):
+    """
+    Charge les données dans un DataFrame pandas (une colonne par en-tête)
+    """
+    import pandas as pd
+
+    columns, headers = load_cached_columns(file_path, cache_dir)
+    df = pd.DataFrame({i: column for i, column in enumerate(columns)})
+    df.columns = headers
+    return df
@@ -0,0 +1,107 @@
+"""
+Chargement en flux des données cliniques des gliomes
+
+Le classeur est ouvert en mode lecture seule et parcouru ligne par ligne
+(tuples de valeurs), ce qui évite les accès cellule par cellule
+`sheet.cell(row, col)` et garde une mémoire constante pendant la lecture.
+"""
+
+import numpy as np
+
+CLINICAL_DATA_PATH = 'BrainClinicalData/MU-Glioma-Post_ClinicalData-July2025.xlsx'
+
+# Nombre de lignes par lot de colonnes typées
+DEFAULT_BATCH_SIZE = 4096
+
+
+def iter_sheet_rows(file_path=CLINICAL_DATA_PATH):
+    """
+    Génère les lignes de la feuille active sous forme de tuples
+    (la première ligne produite contient les en-têtes)
+    """
+    import openpyxl
+
+    workbook = openpyxl.load_workbook(file_path, read_only=True)
+    try:
+        sheet = workbook.active
+        for row in sheet.iter_rows(values_only=True):
+            yield row
+    finally:
+        workbook.close()
+
+
+def iter_records(file_path=CLINICAL_DATA_PATH):
+    """
+    Sépare les en-têtes des lignes de données
+
+    Retourne (headers, rows) où rows est un générateur de tuples ayant
+    tous la largeur des en-têtes.
+    """
+    rows = iter_sheet_rows(file_path)
+    headers = list(next(rows, ()))
+    width = len(headers)
+
+    def records():
+        for row in rows:
+            if len(row) < width:
+                row = row + (None,) * (width - len(row))
+            elif len(row) > width:
+                row = row[:width]
+            yield row
+
+    return headers, records()
+
+
+def load_rows(file_path=CLINICAL_DATA_PATH):
+    """
+    Charge toutes les lignes de données sous forme de listes
+
+    Retourne (data, headers), le format historique de `load_data`.
+    """
+    headers, records = iter_records(file_path)
+    data = [list(row) for row in records]
+    return data, headers
+
+
+def to_typed_column(values):
+    """
+    Convertit une liste de valeurs en tableau NumPy typé
+
+    - entiers sans valeur manquante -> int64
+    - nombres (avec éventuelles valeurs manquantes) -> float64, None -> NaN
+    - sinon (y compris colonne entièrement vide) -> object (valeurs d'origine conservées)
+    """
+    if all(value is None for value in values):
+        return np.array(values, dtype=object)
+
+    has_missing = False
+    all_int = True
+    for value in values:
+        if value is None:
+            has_missing = True
+        elif isinstance(value, bool) or not isinstance(value, (int, float)):
+            return np.array(values, dtype=object)
+        elif not isinstance(value, int):
+            all_int = False
+
+    if all_int and not has_missing:
+        return np.array(values, dtype=np.int64)
+    return np.array([np.nan if value is None else value for value in values], dtype=np.float64)
+
+
+def iter_column_batches(file_path=CLINICAL_DATA_PATH, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Génère les données par lots de colonnes typées
+
+    Chaque élément produit est (headers, batch) où batch est une liste de
+    tableaux NumPy, un par colonne, dans l'ordre des en-têtes.
+    """
+    headers, records = iter_records(file_path)
+    buffer = []
+    for row in records:
+        buffer.append(row)
+        if len(buffer) >= batch_size:
+            yield headers, [to_typed_column(list(column)) for column in zip(*buffer)]
+            buffer = []
+    if buffer:
+        yield headers, [to_typed_column(list(column)) for column in zip(*buffer)]
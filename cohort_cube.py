@@ -0,0 +1,331 @@
+#!/usr/bin/env python3
+"""
+Cube d'agrégats de la cohorte pour l'exploration interactive
+
+Le cube croise les dimensions cliniques catégorielles (sexe, diagnostic,
+grade, IDH1/2, MGMT, EGFR, traitements) et garde, pour chaque combinaison
+présente dans la cohorte (cellule), le nombre de patients, de progressions
+et de décès, et la somme des âges. Une requête (filtres et regroupement
+sur quelques dimensions) ne parcourt que les cellules, dont le nombre est
+borné par les combinaisons de catégories et non par le nombre de patients.
+
+Le cube est construit une seule fois par version du classeur et enregistré
+à côté du cache colonnaire (`.clinical_cache/<classeur>-<empreinte>.cube.npz`).
+`append` ajoute de nouvelles lignes sans reconstruire : seules les
+cellules touchées sont mises à jour (de nouvelles catégories étendent les
+dimensions). Le cube garde l'empreinte des lignes qu'il agrège : si une
+nouvelle version du classeur ne fait qu'ajouter des lignes (mêmes
+colonnes, lignes précédentes inchangées), le cube précédent est rechargé
+et seules les nouvelles lignes y sont ajoutées.
+
+Usage:
+    python cohort_cube.py [--by "IDH1 mutation" "MGMT methylation"]
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import threading
+
+import numpy as np
+
+from clinical_cache import CACHE_DIR, cache_path_for, load_cached_frame
+from clinical_data_loader import CLINICAL_DATA_PATH
+from cohort_schema import category_codes
+
+CUBE_DIMENSIONS = (
+    'Sex at Birth',
+    'Primary Diagnosis',
+    'Grade of Primary Brain Tumor',
+    'IDH1 mutation',
+    'IDH2 mutation',
+    'MGMT methylation',
+    'EGFR amplification',
+    'Initial Chemo Therapy',
+    'Radiation Therapy',
+)
+
+# Mesure -> colonne du classeur (événements comptés quand la valeur vaut 1)
+OUTCOME_COLUMNS = {
+    'progressions': 'Progression',
+    'deces': 'Overall Survival (Death)',
+}
+AGE_COLUMN = 'Age at diagnosis'
+
+CUBE_MEASURES = ('patients',) + tuple(OUTCOME_COLUMNS) + ('age_sum', 'age_count')
+
+CUBE_FORMAT_VERSION = 1
+
+MISSING_LABEL = 'Inconnu'
+
+
+class CohortCube:
+    """
+    Cellules non vides du croisement des dimensions et leurs mesures
+
+    `cells[i, j]` est le code de la catégorie de la dimension j dans la
+    cellule i (-1 : valeur manquante) ; `measures[nom][i]` la mesure de la
+    cellule ; `source` l'empreinte des lignes du classeur agrégées
+    (`rows_fingerprint`), None si elle n'est pas connue.
+    """
+
+    def __init__(self, dimensions=CUBE_DIMENSIONS, categories=None, cells=None, measures=None, source=None):
+        self.dimensions = list(dimensions)
+        self.categories = {dimension: list((categories or {}).get(dimension, [])) for dimension in self.dimensions}
+        self.cells = (np.asarray(cells, dtype=np.int32) if cells is not None
+                      else np.empty((0, len(self.dimensions)), dtype=np.int32))
+        self.measures = {name: np.asarray((measures or {}).get(name, np.zeros(len(self.cells))), dtype=np.float64)
+                         for name in CUBE_MEASURES}
+        self._cell_index = {cell: i for i, cell in enumerate(map(tuple, self.cells.tolist()))}
+        self.source = source
+        self._lock = threading.Lock()
+
+    @property
+    def n_patients(self):
+        return int(self.measures['patients'].sum())
+
+    def _encode(self, df):
+        """
+        Codes des dimensions (catégories du cube, étendues si besoin) et
+        mesures de chaque ligne
+        """
+        import pandas as pd
+
+        codes = np.full((len(df), len(self.dimensions)), -1, dtype=np.int32)
+        for j, dimension in enumerate(self.dimensions):
+            if dimension not in df.columns:
+                continue
+            labels, row_codes = category_codes(df[dimension])
+            known = self.categories[dimension]
+            positions = {label: k for k, label in enumerate(known)}
+            lookup = np.array([positions.setdefault(label, len(positions)) for label in labels] or [0],
+                              dtype=np.int32)
+            known.extend(label for label in list(positions)[len(known):])
+            codes[:, j] = np.where(row_codes >= 0, lookup[np.maximum(row_codes, 0)], -1)
+
+        def numeric(name):
+            if name not in df.columns:
+                return np.full(len(df), np.nan)
+            return pd.to_numeric(pd.Series(np.asarray(df[name], dtype=object)), errors='coerce').to_numpy(np.float64)
+
+        row_measures = {'patients': np.ones(len(df))}
+        for name, column in OUTCOME_COLUMNS.items():
+            row_measures[name] = (numeric(column) == 1).astype(np.float64)
+        age = numeric(AGE_COLUMN)
+        row_measures['age_sum'] = np.where(np.isnan(age), 0.0, age)
+        row_measures['age_count'] = (~np.isnan(age)).astype(np.float64)
+        return codes, row_measures
+
+    def append(self, df):
+        """
+        Ajoute des lignes (DataFrame avec les colonnes du classeur) : les
+        lignes sont regroupées par cellule, puis seules les cellules
+        touchées sont mises à jour. Retourne le nombre de lignes ajoutées.
+        """
+        with self._lock:
+            codes, row_measures = self._encode(df)
+            if not len(codes):
+                return 0
+            # Une clé entière par ligne (base mixte des dimensions) : un seul tri
+            radix = np.array([len(self.categories[d]) + 1 for d in self.dimensions], dtype=np.int64)
+            weights = np.concatenate([np.cumprod(radix[::-1])[::-1][1:], [1]])
+            keys, inverse = np.unique((codes.astype(np.int64) + 1) @ weights, return_inverse=True)
+            batch_cells = (keys[:, None] // weights % radix - 1).astype(np.int32)
+
+            positions = np.empty(len(keys), dtype=np.intp)
+            new_cells = []
+            for k, cell in enumerate(map(tuple, batch_cells.tolist())):
+                position = self._cell_index.get(cell)
+                if position is None:
+                    position = self._cell_index[cell] = len(self.cells) + len(new_cells)
+                    new_cells.append(k)
+                positions[k] = position
+
+            # Nouveaux tableaux, échangés sous le verrou : une requête garde
+            # les tableaux qu'elle a lus, jamais modifiés sur place
+            measures = {}
+            for name in CUBE_MEASURES:
+                updated = np.concatenate([self.measures[name], np.zeros(len(new_cells))])
+                updated[positions] += np.bincount(inverse, weights=row_measures[name], minlength=len(keys))
+                measures[name] = updated
+            if new_cells:
+                self.cells = np.vstack([self.cells, batch_cells[new_cells]])
+            self.measures = measures
+            return len(codes)
+
+    def query(self, group_by=(), filters=None):
+        """
+        Agrège les cellules du sous-groupe {dimension: catégorie}, regroupées
+        par les dimensions `group_by`
+
+        Retourne un DataFrame : une ligne par groupe non vide, avec patients,
+        taux de progression et de décès et âge moyen.
+        """
+        import pandas as pd
+
+        # Tableaux jamais modifiés sur place par `append`
+        with self._lock:
+            cells = self.cells
+            measures = self.measures
+            categories = {dimension: list(values) for dimension, values in self.categories.items()}
+
+        mask = np.ones(len(cells), dtype=bool)
+        for dimension, value in (filters or {}).items():
+            known = categories[dimension]
+            code = known.index(value) if value in known else (-1 if value == MISSING_LABEL else -2)
+            mask &= cells[:, self.dimensions.index(dimension)] == code
+
+        # Groupe de chaque cellule (le code -1 des valeurs manquantes devient 0)
+        group = np.zeros(int(mask.sum()), dtype=np.int64)
+        n_groups = 1
+        for dimension in group_by:
+            size = len(categories[dimension]) + 1
+            group = group * size + cells[mask, self.dimensions.index(dimension)] + 1
+            n_groups *= size
+        sums = {name: np.bincount(group, weights=values[mask], minlength=n_groups)
+                for name, values in measures.items()}
+        present = np.flatnonzero(sums['patients'])
+
+        table = {}
+        remaining = present.copy()
+        for dimension in reversed(group_by):
+            size = len(categories[dimension]) + 1
+            remaining, code = np.divmod(remaining, size)
+            labels = np.array([MISSING_LABEL] + categories[dimension], dtype=object)
+            table[dimension] = labels[code]
+        table = {dimension: table[dimension] for dimension in group_by}
+
+        patients = sums['patients'][present]
+        table['Patients'] = patients.astype(np.int64)
+        table['Progression (%)'] = np.round(100 * sums['progressions'][present] / patients, 1)
+        table['Décès (%)'] = np.round(100 * sums['deces'][present] / patients, 1)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            table['Âge moyen'] = np.round(sums['age_sum'][present] / sums['age_count'][present], 1)
+        return pd.DataFrame(table).sort_values('Patients', ascending=False, kind='stable').reset_index(drop=True)
+
+    def save(self, path):
+        """
+        Enregistre le cube (remplacement atomique)
+        """
+        meta = {'version': CUBE_FORMAT_VERSION, 'dimensions': self.dimensions, 'categories': self.categories,
+                'source': self.source}
+        tmp_path = f"{path}.{os.getpid()}.tmp.npz"
+        with self._lock:
+            np.savez(tmp_path, meta=np.array(json.dumps(meta)), cells=self.cells, **self.measures)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            meta = json.loads(str(data['meta']))
+            if meta['version'] != CUBE_FORMAT_VERSION:
+                raise ValueError(f"Version de cube non supportée: {meta['version']}")
+            return cls(meta['dimensions'], meta['categories'], data['cells'],
+                       {name: data[name] for name in CUBE_MEASURES}, meta.get('source'))
+
+
+def cube_path_for(file_path=CLINICAL_DATA_PATH, cache_dir=CACHE_DIR):
+    """
+    Chemin du cube correspondant au contenu actuel du classeur
+    """
+    return os.path.splitext(cache_path_for(file_path, cache_dir))[0] + '.cube.npz'
+
+
+def rows_fingerprint(df):
+    """
+    Empreinte des lignes agrégées : colonnes, nombre de lignes et SHA-256
+    des empreintes de lignes de pandas (stables d'un processus à l'autre)
+    """
+    import pandas as pd
+
+    hashes = pd.util.hash_pandas_object(df, index=False).to_numpy()
+    return {'columns': list(df.columns), 'n_rows': len(df), 'sha256': hashlib.sha256(hashes.tobytes()).hexdigest()}
+
+
+def _appended_rows(previous, df):
+    """
+    Lignes ajoutées à df depuis le cube `previous`, ou None si df n'est pas
+    une extension de ses lignes (colonnes ou lignes précédentes modifiées)
+    """
+    source = previous.source
+    if (source is None or previous.dimensions != list(CUBE_DIMENSIONS) or source['columns'] != list(df.columns)
+            or source['n_rows'] > len(df)):
+        return None
+    if rows_fingerprint(df.iloc[:source['n_rows']])['sha256'] != source['sha256']:
+        return None
+    return df.iloc[source['n_rows']:]
+
+
+def build_cube(file_path=CLINICAL_DATA_PATH, cache_dir=CACHE_DIR):
+    """
+    Construit le cube de la cohorte depuis le cache colonnaire et l'enregistre
+
+    Si le classeur ne fait qu'ajouter des lignes au cube précédent, ce cube
+    est rechargé et seules les nouvelles lignes sont ajoutées.
+    """
+    schema = dict.fromkeys(CUBE_DIMENSIONS, 'category')
+    schema.update(dict.fromkeys(list(OUTCOME_COLUMNS.values()) + [AGE_COLUMN], 'float'))
+    df = load_cached_frame(schema, file_path, cache_dir)
+
+    path = cube_path_for(file_path, cache_dir)
+    stem = os.path.basename(path).rsplit('-', 2)[0]
+    previous_paths = sorted((os.path.join(cache_dir, name) for name in os.listdir(cache_dir)
+                             if name.startswith(stem + '-') and name.endswith('.cube.npz')
+                             and name != os.path.basename(path)), key=os.path.getmtime, reverse=True)
+
+    cube, rows = None, df
+    if previous_paths:
+        previous = CohortCube.load(previous_paths[0])
+        appended = _appended_rows(previous, df)
+        if appended is not None:
+            cube, rows = previous, appended
+    cube = cube or CohortCube()
+    cube.append(rows[rows.notna().any(axis=1)])
+    cube.source = rows_fingerprint(df)
+
+    cube.save(path)
+    # Supprimer les cubes obsolètes du même classeur
+    for previous_path in previous_paths:
+        os.remove(previous_path)
+    return cube
+
+
+def load_cohort_cube(file_path=CLINICAL_DATA_PATH, cache_dir=CACHE_DIR):
+    """
+    Cube de la version actuelle du classeur (construit au premier appel)
+    """
+    path = cube_path_for(file_path, cache_dir)
+    if os.path.exists(path):
+        return CohortCube.load(path)
+    return build_cube(file_path, cache_dir)
+
+
+_cube = None
+_cube_lock = threading.Lock()
+
+
+def get_cohort_cube():
+    """
+    Cube de la cohorte partagé par le processus (chargé une seule fois)
+    """
+    global _cube
+    with _cube_lock:
+        if _cube is None:
+            _cube = load_cohort_cube()
+        return _cube
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cube d'agrégats de la cohorte")
+    parser.add_argument('--by', nargs='*', default=['IDH1 mutation', 'MGMT methylation'],
+                        help="Dimensions de regroupement")
+    args = parser.parse_args()
+
+    cube = load_cohort_cube()
+    print(f"🧊 Cube: {cube.n_patients} patients, {len(cube.cells)} cellules, {len(cube.dimensions)} dimensions")
+    print(cube.query(args.by).to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""
+Schéma des colonnes cliniques utilisées par l'entraînement
+
+Chaque colonne est chargée dans le plus petit type adapté
+(`clinical_cache.load_cached_frame`) :
+- 'category' : champs texte (sexe, diagnostic, traitements), stockés une
+  fois par catégorie avec des codes de 1 octet ;
+- 'int' : indicateurs 0/1 et mutations codées numériquement (Int8) ;
+- 'float' : âges et délais en jours (float32 si la conversion est exacte).
+Les valeurs utilisées par les modèles sont les mêmes qu'avec des colonnes
+`object` / float64 : seule la représentation en mémoire change.
+"""
+
+COHORT_SCHEMA = {
+    'Sex at Birth': 'category',
+    'Age at diagnosis': 'float',
+    'Primary Diagnosis': 'category',
+    'Grade of Primary Brain Tumor': 'category',
+    'Stereotactic Biopsy before Surgical Resection': 'int',
+    'Progression': 'int',
+    'Time to First Progression (Days)': 'float',
+    'Overall Survival (Death)': 'int',
+    'Number of days from Diagnosis to death (Days)': 'float',
+    'IDH1 mutation': 'int',
+    'IDH2 mutation': 'int',
+    '1p/19q': 'int',
+    'ATRX mutation': 'int',
+    'MGMT methylation': 'int',
+    'BRAF V600E mutation': 'int',
+    'TERT promoter mutation': 'int',
+    'Chromosome 7 gain and Chromosome 10 loss': 'int',
+    'H3-3A mutation': 'int',
+    'EGFR amplification': 'int',
+    'PTEN mutation': 'int',
+    'CDKN2A/B deletion': 'int',
+    'TP53 alteration': 'int',
+    'Previous Brain Tumor': 'category',
+    'Initial Chemo Therapy': 'category',
+    'Radiation Therapy': 'category',
+}
+
+
+def label_text(value):
+    """
+    Texte d'une valeur tel qu'il a été vu à l'entraînement
+    (les entiers lus comme flottants, ex. 57.0, redeviennent '57' ; une
+    valeur manquante devient 'Unknown')
+    """
+    import numpy as np
+    import pandas as pd
+
+    if value is None or (not isinstance(value, str) and pd.isna(value)):
+        return 'Unknown'
+    if isinstance(value, (float, np.floating)) and float(value).is_integer():
+        return str(int(value))
+    return str(value)
+
+
+def category_codes(values):
+    """
+    Catégories (libellés nettoyés, ex. 'Yes ' -> 'Yes', 2.0 -> '2') et
+    codes d'une colonne, -1 pour une valeur manquante
+
+    Retourne (catégories triées, codes numpy).
+    """
+    import numpy as np
+    import pandas as pd
+
+    values = pd.Series(values).astype('category')
+    labels = np.array([label_text(category).strip() for category in values.cat.categories], dtype=object)
+    codes = values.cat.codes.to_numpy()
+    categories, remap = np.unique(labels, return_inverse=True)
+    return list(categories), np.where(codes >= 0, remap[np.maximum(codes, 0)], -1)
+
+
+def frame_memory(df):
+    """
+    Mémoire d'un DataFrame en octets (contenu des objets compris)
+    """
+    return int(df.memory_usage(deep=True).sum())
+
+
+def format_memory_report(df_before, df_after):
+    """
+    Mémoire avant / après et types par colonne, sur une ligne par colonne
+    """
+    before, after = frame_memory(df_before), frame_memory(df_after)
+    lines = [f"📦 Mémoire: {before / 1e6:.2f} Mo -> {after / 1e6:.2f} Mo (x{before / max(after, 1):.1f})"]
+    for name in df_after.columns:
+        lines.append(f"  - {name}: {df_before[name].dtype} -> {df_after[name].dtype}")
+    return "\n".join(lines)
@@ -0,0 +1,224 @@
+"""
+Profil des colonnes du classeur en un seul parcours
+
+Les lignes sont accumulées par lots ; pour chaque lot et chaque colonne,
+les valeurs sont comptées une seule fois (`collections.Counter`), puis les
+statistiques sont calculées sur les valeurs distinctes du lot :
+- nombre de valeurs non-nulles ;
+- nombre de valeurs distinctes : exact tant que la colonne a moins de
+  `max_exact_distinct` valeurs distinctes, estimé ensuite par un sketch
+  KMV (les `sketch_size` plus petits hachages) de taille bornée ;
+- minimum / maximum des valeurs numériques ;
+- valeurs les plus fréquentes : comptage exact, puis résumé Misra-Gries
+  (`top_capacity` compteurs, comptes minorés) pour les colonnes à forte
+  cardinalité.
+La mémoire par colonne reste bornée quelle que soit la taille du fichier.
+"""
+
+import heapq
+from collections import Counter, namedtuple
+from itertools import islice
+
+import numpy as np
+
+from clinical_data_loader import DEFAULT_BATCH_SIZE
+
+MAX_EXACT_DISTINCT = 10000
+SKETCH_SIZE = 4096
+TOP_CAPACITY = 256
+TOP_K = 3
+
+_NUMBER_TYPES = {int, float}
+
+# Profil d'une colonne ; distinct_exact et top_exact indiquent si les
+# valeurs sont exactes ou estimées
+ColumnProfile = namedtuple('ColumnProfile', [
+    'name', 'non_null', 'distinct', 'distinct_exact', 'minimum', 'maximum', 'top_values', 'top_exact',
+])
+
+
+def _hash64(values):
+    """
+    Hachages 64 bits uniformes des valeurs, stables d'un processus à
+    l'autre (hash() des chaînes change avec PYTHONHASHSEED) : FNV-1a des
+    caractères de repr(), vectorisé sur le lot, puis mélange splitmix64
+    """
+    # Un flottant entier se hache comme l'entier égal (mêmes clés que Counter)
+    texts = np.array([repr(int(value)) if type(value) is float and value.is_integer() else repr(value)
+                      for value in values], dtype=str)
+    x = np.full(len(texts), 0xCBF29CE484222325, dtype=np.uint64)
+    if not len(texts):
+        return x
+    lengths = np.char.str_len(texts)
+    characters = texts.view(np.uint32).reshape(len(texts), -1)
+    for j in range(characters.shape[1]):
+        active = lengths > j
+        x[active] = (x[active] ^ characters[active, j]) * np.uint64(0x100000001B3)
+    x = (x ^ (x >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    x = (x ^ (x >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return x ^ (x >> np.uint64(31))
+
+
+def _numbers(values):
+    """
+    Valeurs numériques (hors booléens et NaN) d'une liste de valeurs distinctes
+    """
+    if set(map(type, values)) <= _NUMBER_TYPES:
+        numbers = values
+    else:
+        numbers = [value for value in values if type(value) in _NUMBER_TYPES]
+    return [value for value in numbers if value == value] if float in set(map(type, numbers)) else numbers
+
+
+class _ColumnState:
+    """
+    Statistiques d'une colonne mises à jour lot par lot
+    """
+
+    def __init__(self, max_exact_distinct, sketch_size, top_capacity):
+        self.max_exact_distinct = max_exact_distinct
+        self.sketch_size = sketch_size
+        self.top_capacity = top_capacity
+        self.non_null = 0
+        self.minimum = None
+        self.maximum = None
+        self.counts = Counter()     # exact, puis résumé Misra-Gries
+        self.sketch = None          # hachages KMV (tas max, valeurs négées)
+        self.sketch_members = None
+
+    def update(self, batch_counts):
+        self.non_null += sum(batch_counts.values())
+
+        numbers = _numbers(list(batch_counts))
+        if numbers:
+            low, high = min(numbers), max(numbers)
+            self.minimum = low if self.minimum is None else min(self.minimum, low)
+            self.maximum = high if self.maximum is None else max(self.maximum, high)
+
+        if self.sketch is not None:
+            self._add_to_sketch(batch_counts)
+        self.counts.update(batch_counts)
+
+        if self.sketch is None and len(self.counts) > self.max_exact_distinct:
+            # Passage en mode approché : sketch KMV des valeurs déjà vues
+            self.sketch = []
+            self.sketch_members = set()
+            self._add_to_sketch(self.counts)
+        if self.sketch is not None and len(self.counts) > self.top_capacity:
+            self._prune_counts()
+
+    def _add_to_sketch(self, values):
+        sketch, members, size = self.sketch, self.sketch_members, self.sketch_size
+        hashes = _hash64(list(values))
+        if len(sketch) >= size:
+            # Seuls les hachages plus petits que le k-ième peuvent entrer
+            hashes = hashes[hashes < np.uint64(-sketch[0])]
+        for h in hashes.tolist():
+            if h in members:
+                continue
+            if len(sketch) < size:
+                heapq.heappush(sketch, -h)
+                members.add(h)
+            elif h < -sketch[0]:
+                members.discard(-heapq.heappushpop(sketch, -h))
+                members.add(h)
+
+    def _prune_counts(self):
+        # Misra-Gries : retrancher le (capacité + 1)-ième compte à tous les compteurs
+        threshold = heapq.nlargest(self.top_capacity + 1, self.counts.values())[-1]
+        self.counts = Counter({value: count - threshold
+                               for value, count in self.counts.items() if count > threshold})
+
+    def distinct(self):
+        if self.sketch is None:
+            return len(self.counts), True
+        if len(self.sketch) < self.sketch_size:
+            return len(self.sketch), False
+        kth = -self.sketch[0] / 2.0 ** 64
+        return int(round((self.sketch_size - 1) / kth)), False
+
+
+class ColumnProfiler:
+    """
+    Profil de toutes les colonnes d'une table lue ligne par ligne
+
+    `add(row)` accumule les lignes, `profiles()` termine le dernier lot et
+    retourne un ColumnProfile par colonne, dans l'ordre des en-têtes.
+    """
+
+    def __init__(self, headers, batch_size=DEFAULT_BATCH_SIZE, max_exact_distinct=MAX_EXACT_DISTINCT,
+                 sketch_size=SKETCH_SIZE, top_capacity=TOP_CAPACITY):
+        self.headers = list(headers)
+        self.batch_size = batch_size
+        self.n_rows = 0
+        self._buffer = []
+        self._columns = [_ColumnState(max_exact_distinct, sketch_size, top_capacity) for _ in self.headers]
+
+    def add(self, row):
+        self._buffer.append(row)
+        self.n_rows += 1
+        if len(self._buffer) >= self.batch_size:
+            self._flush()
+
+    def update(self, rows):
+        rows = iter(rows)
+        while True:
+            chunk = list(islice(rows, self.batch_size - len(self._buffer)))
+            if not chunk:
+                return
+            self._buffer.extend(chunk)
+            self.n_rows += len(chunk)
+            if len(self._buffer) >= self.batch_size:
+                self._flush()
+
+    def _flush(self):
+        if not self._buffer:
+            return
+        for state, column in zip(self._columns, zip(*self._buffer)):
+            batch_counts = Counter(column)
+            batch_counts.pop(None, None)
+            state.update(batch_counts)
+        self._buffer = []
+
+    def profiles(self, top_k=TOP_K):
+        self._flush()
+        profiles = []
+        for name, state in zip(self.headers, self._columns):
+            distinct, distinct_exact = state.distinct()
+            profiles.append(ColumnProfile(
+                name=name,
+                non_null=state.non_null,
+                distinct=distinct,
+                distinct_exact=distinct_exact,
+                minimum=state.minimum,
+                maximum=state.maximum,
+                top_values=state.counts.most_common(top_k),
+                top_exact=state.sketch is None,
+            ))
+        return profiles
+
+
+def profile_records(headers, records, batch_size=DEFAULT_BATCH_SIZE, top_k=TOP_K):
+    """
+    Profil de toutes les colonnes en un seul parcours de records
+
+    Retourne (nombre de lignes, liste de ColumnProfile).
+    """
+    profiler = ColumnProfiler(headers, batch_size)
+    profiler.update(records)
+    return profiler.n_rows, profiler.profiles(top_k)
+
+
+def format_profile(profile, n_rows):
+    """
+    Résumé d'une colonne sur une ligne
+    """
+    approx = '' if profile.distinct_exact else '≈'
+    parts = [f"{profile.non_null}/{n_rows} non-nulles", f"{approx}{profile.distinct} distinctes"]
+    if profile.minimum is not None:
+        parts.append(f"min {profile.minimum} / max {profile.maximum}")
+    if profile.top_values:
+        approx = '' if profile.top_exact else '≥'
+        top = ', '.join(f"{str(value)[:30]} ({approx}{count})" for value, count in profile.top_values)
+        parts.append(f"top: {top}")
+    return f"{profile.name}: " + " | ".join(parts)
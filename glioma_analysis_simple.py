@@ -1,39 +1,31 @@
-import openpyxl
+import argparse
+import time
+from operator import itemgetter
+
 import numpy as np
+import pandas as pd
 from sklearn.model_selection import train_test_split
 from sklearn.preprocessing import StandardScaler, LabelEncoder
 from sklearn.ensemble import RandomForestClassifier
 from sklearn.metrics import accuracy_score
 import joblib
 
+from clinical_cache import load_cached_rows
+from clinical_data_loader import CLINICAL_DATA_PATH
+from model_artifact import export_artifact
+from patient_neighbors import NeighborIndex
+import stage_profiler
+import stage_timing
+from training_scheduler import plan_jobs, print_training_times, train_targets
+
 def load_data():
     """
     Charge les données cliniques des gliomes
     """
     
-    file_path = 'BrainClinicalData/MU-Glioma-Post_ClinicalData-July2025.xlsx'
-    
     try:
-        # Charger le workbook
-        workbook = openpyxl.load_workbook(file_path)
-        sheet = workbook.active
-        
-        # Lire les en-têtes
-        headers = []
-        for col in range(1, sheet.max_column + 1):
-            cell_value = sheet.cell(row=1, column=col).value
-            headers.append(cell_value)
-        
-        # Lire les données
-        data = []
-        for row in range(2, sheet.max_row + 1):
-            row_data = []
-            for col in range(1, sheet.max_column + 1):
-                cell_value = sheet.cell(row=row, column=col).value
-                row_data.append(cell_value)
-            data.append(row_data)
-        
-        workbook.close()
+        # Lire le cache colonnaire (reconstruit si le classeur a changé)
+        data, headers = load_cached_rows(CLINICAL_DATA_PATH)
         
         print(f"✅ Données chargées: {len(data)} patients, {len(headers)} variables")
         return data, headers
@@ -42,9 +34,14 @@ def load_data():
         print(f"❌ Erreur lors du chargement: {e}")
         return None, None
 
-def prepare_features(data, headers):
+def prepare_features(data, headers, return_ids=False):
     """
     Prépare les features pour la prédiction
+
+    Les lignes sont filtrées par masques sur des colonnes entières.
+    Retourne X_data (tableau objet, une colonne par feature), y_data
+    ({cible: tableau}), et les noms des features et des cibles ; avec
+    `return_ids`, aussi les identifiants des patients retenus.
     """
     
     # Variables d'intérêt pour la prédiction
@@ -84,79 +81,113 @@ def prepare_features(data, headers):
     print(f"📊 Features trouvées: {len(feature_indices)}")
     print(f"🎯 Variables cibles trouvées: {len(target_indices)}")
     
-    # Extraire les données pertinentes
-    X_data = []
-    y_data = {}
+    # Extraire les colonnes utiles (une passe par colonne)
+    feature_values = [column_values(data, idx) for idx in feature_indices]
     
-    for row in data:
-        # Vérifier si la ligne a suffisamment de données
-        valid_features = 0
-        feature_values = []
-        
-        for idx in feature_indices:
-            value = row[idx] if idx < len(row) else None
-            if value is not None and str(value).strip() != '':
-                valid_features += 1
-            feature_values.append(value)
-        
-        # Si au moins 50% des features sont présentes
-        if valid_features >= len(feature_indices) * 0.5:
-            X_data.append(feature_values)
-            
-            # Extraire les variables cibles
-            for i, target_idx in enumerate(target_indices):
-                target_name = target_columns[i]
-                if target_name not in y_data:
-                    y_data[target_name] = []
-                
-                target_value = row[target_idx] if target_idx < len(row) else None
-                y_data[target_name].append(target_value)
+    # Nombre de features renseignées par ligne
+    present_counts = np.zeros(len(data), dtype=np.int64)
+    for values in feature_values:
+        present_counts += is_present(values)
+    
+    # Garder les lignes où au moins 50% des features sont présentes
+    valid_rows = present_counts >= len(feature_indices) * 0.5
+    
+    X_data = np.empty((int(valid_rows.sum()), len(feature_indices)), dtype=object)
+    for j, values in enumerate(feature_values):
+        X_data[:, j] = values[valid_rows]
+    
+    # Extraire les variables cibles
+    y_data = {}
+    for i, target_idx in enumerate(target_indices):
+        y_data[target_columns[i]] = column_values(data, target_idx)[valid_rows]
     
     print(f"📈 Données valides: {len(X_data)} patients")
     
+    if return_ids:
+        if 'Patient_ID' in headers:
+            patient_ids = column_values(data, headers.index('Patient_ID'))[valid_rows]
+        else:
+            patient_ids = np.flatnonzero(valid_rows).astype(object)
+        return (X_data, y_data, feature_columns[:len(feature_indices)], target_columns[:len(target_indices)],
+                patient_ids)
     return X_data, y_data, feature_columns[:len(feature_indices)], target_columns[:len(target_indices)]
 
+def column_values(data, idx):
+    """
+    Extrait une colonne des lignes de données (None si la ligne est trop courte)
+    """
+    try:
+        return np.fromiter(map(itemgetter(idx), data), dtype=object, count=len(data))
+    except IndexError:
+        return np.array([row[idx] if idx < len(row) else None for row in data], dtype=object)
+
+def is_present(values):
+    """
+    Masque des valeurs renseignées (ni None, ni chaîne vide ou blanche)
+    """
+    present = ~np.equal(values, None)
+    # Les chaînes blanches sont cherchées parmi les valeurs distinctes
+    blanks = [value for value in pd.unique(values) if isinstance(value, str) and value.strip() == '']
+    if blanks:
+        present &= ~pd.Series(values, dtype=object).isin(blanks).to_numpy()
+    return present
+
+def encode_labels(values):
+    """
+    Encode une colonne entière comme `LabelEncoder().fit_transform`
+
+    Valeurs vides (None ou chaîne blanche) -> 'Unknown', autres valeurs ->
+    str(valeur). La colonne est d'abord encodée par dictionnaire
+    (`pd.factorize`) ; seules les valeurs distinctes sont converties en
+    texte, puis les codes sont redistribués sur toutes les lignes.
+    Retourne (codes int64, encodeur ajusté).
+    """
+    values = np.ascontiguousarray(values, dtype=object)
+    codes, uniques = pd.factorize(values, use_na_sentinel=False)
+    
+    # 1, 1.0 et True (ou None et NaN) sont confondus par factorize mais
+    # n'ont pas le même texte : si la colonne mélange ces types, les
+    # valeurs distinctes sont séparées par (valeur, type)
+    homogeneous = pd.api.types.infer_dtype(values, skipna=True) in ('string', 'integer', 'empty')
+    for na_code in np.flatnonzero(pd.isna(uniques)):
+        na_rows = values[codes == na_code]
+        homogeneous &= np.equal(na_rows, None).sum() in (0, len(na_rows))
+    if not homogeneous:
+        type_codes, types = pd.factorize(np.frompyfunc(type, 1, 1)(values))
+        codes, _ = pd.factorize(codes.astype(np.int64) * len(types) + type_codes)
+    
+    # Première ligne de chaque valeur distincte (factorize numérote les
+    # valeurs dans leur ordre d'apparition)
+    first_rows = np.flatnonzero(np.diff(np.maximum.accumulate(codes), prepend=-1) > 0)
+    
+    labels = []
+    for value in values[first_rows]:
+        if value is None or str(value).strip() == '':
+            labels.append('Unknown')
+        else:
+            labels.append(str(value))
+    labels = np.array(labels, dtype=str)
+    
+    le = LabelEncoder()
+    le.classes_ = np.unique(labels)
+    return np.searchsorted(le.classes_, labels)[codes].astype(np.int64), le
+
 def encode_categorical_data(X_data, y_data, feature_names, target_names):
     """
     Encode les données catégorielles
+
+    Retourne une matrice d'entiers contiguë (une colonne par feature), les
+    cibles encodées et les encodeurs (`LabelEncoder`, mêmes classes et
+    mêmes codes qu'un encodage valeur par valeur).
     """
     
-    # Encoder les features
-    X_encoded = []
+    # Encoder les features, colonne par colonne
+    X_data = np.asarray(X_data, dtype=object)
+    X_encoded = np.empty((len(X_data), len(feature_names)), dtype=np.int64)
     feature_encoders = {}
     
     for i, feature_name in enumerate(feature_names):
-        # Extraire les valeurs pour cette feature
-        feature_values = [row[i] for row in X_data]
-        
-        # Créer un encodeur
-        le = LabelEncoder()
-        
-        # Remplacer les valeurs manquantes
-        clean_values = []
-        for val in feature_values:
-            if val is None or str(val).strip() == '':
-                clean_values.append('Unknown')
-            else:
-                clean_values.append(str(val))
-        
-        # Encoder
-        try:
-            encoded_values = le.fit_transform(clean_values)
-            feature_encoders[feature_name] = le
-        except:
-            # Si l'encodage échoue, utiliser des valeurs numériques simples
-            unique_values = list(set(clean_values))
-            value_map = {val: idx for idx, val in enumerate(unique_values)}
-            encoded_values = [value_map[val] for val in clean_values]
-            feature_encoders[feature_name] = value_map
-        
-        # Ajouter à X_encoded
-        if len(X_encoded) == 0:
-            X_encoded = [[val] for val in encoded_values]
-        else:
-            for j, val in enumerate(encoded_values):
-                X_encoded[j].append(val)
+        X_encoded[:, i], feature_encoders[feature_name] = encode_labels(X_data[:, i])
     
     # Encoder les variables cibles
     y_encoded = {}
@@ -164,79 +195,83 @@ def encode_categorical_data(X_data, y_data, feature_names, target_names):
     
     for target_name in target_names:
         if target_name in y_data:
-            target_values = y_data[target_name]
-            
-            # Nettoyer les valeurs
-            clean_target_values = []
-            for val in target_values:
-                if val is None or str(val).strip() == '':
-                    clean_target_values.append('Unknown')
-                else:
-                    clean_target_values.append(str(val))
-            
-            # Encoder
-            le = LabelEncoder()
-            try:
-                encoded_target_values = le.fit_transform(clean_target_values)
-                target_encoders[target_name] = le
-            except:
-                unique_values = list(set(clean_target_values))
-                value_map = {val: idx for idx, val in enumerate(unique_values)}
-                encoded_target_values = [value_map[val] for val in clean_target_values]
-                target_encoders[target_name] = value_map
-            
-            y_encoded[target_name] = encoded_target_values
+            y_encoded[target_name], target_encoders[target_name] = encode_labels(y_data[target_name])
     
     return X_encoded, y_encoded, feature_encoders, target_encoders
 
-def train_models(X_encoded, y_encoded, feature_names, target_names):
+def train_models(X_encoded, y_encoded, feature_names, target_names, jobs=1):
     """
     Entraîne les modèles de prédiction
+
+    Les cibles sont entraînées en parallèle sur `jobs` cœurs (-1 = tous) ;
+    les modèles ne dépendent pas du nombre de cœurs.
     """
     
+    X = np.asarray(X_encoded)
+    
+    def fit_target(target_name, n_jobs):
+        # Préparer les données
+        y = np.array(y_encoded[target_name])
+        
+        # Supprimer les lignes avec des valeurs manquantes dans la cible
+        valid_indices = ~np.isnan(y)
+        X_valid = X[valid_indices]
+        y_valid = y[valid_indices]
+        
+        if len(X_valid) < 10:
+            return None
+        
+        # Diviser en train/test
+        X_train, X_test, y_train, y_test = train_test_split(
+            X_valid, y_valid, test_size=0.2, random_state=42
+        )
+        
+        # Standardiser
+        scaler = StandardScaler()
+        X_train_scaled = scaler.fit_transform(X_train)
+        X_test_scaled = scaler.transform(X_test)
+        
+        # Entraîner Random Forest
+        rf_model = RandomForestClassifier(n_estimators=100, random_state=42, n_jobs=n_jobs)
+        rf_model.fit(X_train_scaled, y_train)
+        # Prédiction mono-thread une fois publié (une ligne à la fois dans les applications)
+        rf_model.n_jobs = None
+        
+        # Évaluer
+        y_pred = rf_model.predict(X_test_scaled)
+        accuracy = accuracy_score(y_test, y_pred)
+        
+        return rf_model, scaler, accuracy
+    
+    trained_targets = [target_name for target_name in target_names if target_name in y_encoded]
+    concurrent_targets, forest_jobs = plan_jobs(len(trained_targets), jobs)
+    print(f"\n🚀 Entraînement de {len(trained_targets)} cibles "
+          f"({concurrent_targets} en parallèle, {forest_jobs} cœur(s) par forêt)")
+    
+    start = time.perf_counter()
+    results = train_targets(fit_target, trained_targets, jobs)
+    elapsed = time.perf_counter() - start
+    
     models = {}
     scalers = {}
+    timings = {}
     
-    for target_name in target_names:
-        if target_name in y_encoded:
-            print(f"\n🎯 Entraînement du modèle pour: {target_name}")
-            
-            # Préparer les données
-            X = np.array(X_encoded)
-            y = np.array(y_encoded[target_name])
-            
-            # Supprimer les lignes avec des valeurs manquantes dans la cible
-            valid_indices = ~np.isnan(y)
-            X_valid = X[valid_indices]
-            y_valid = y[valid_indices]
-            
-            if len(X_valid) < 10:
-                print(f"⚠️ Pas assez de données pour {target_name}")
-                continue
-            
-            # Diviser en train/test
-            X_train, X_test, y_train, y_test = train_test_split(
-                X_valid, y_valid, test_size=0.2, random_state=42
-            )
-            
-            # Standardiser
-            scaler = StandardScaler()
-            X_train_scaled = scaler.fit_transform(X_train)
-            X_test_scaled = scaler.transform(X_test)
-            
-            # Entraîner Random Forest
-            rf_model = RandomForestClassifier(n_estimators=100, random_state=42)
-            rf_model.fit(X_train_scaled, y_train)
-            
-            # Évaluer
-            y_pred = rf_model.predict(X_test_scaled)
-            accuracy = accuracy_score(y_test, y_pred)
-            
-            print(f"📊 Précision pour {target_name}: {accuracy:.3f}")
-            
-            # Sauvegarder
-            models[target_name] = rf_model
-            scalers[target_name] = scaler
+    for target_name, (result, seconds) in results.items():
+        print(f"\n🎯 Entraînement du modèle pour: {target_name}")
+        
+        if result is None:
+            print(f"⚠️ Pas assez de données pour {target_name}")
+            continue
+        
+        rf_model, scaler, accuracy = result
+        print(f"📊 Précision pour {target_name}: {accuracy:.3f}")
+        
+        # Sauvegarder
+        models[target_name] = rf_model
+        scalers[target_name] = scaler
+        timings[target_name] = seconds
+    
+    print_training_times(timings, elapsed)
     
     return models, scalers
 
@@ -245,35 +280,62 @@ def main():
     Fonction principale
     """
     
+    parser = argparse.ArgumentParser(description="Entraînement des modèles de prédiction des gliomes")
+    parser.add_argument('--jobs', type=int, default=-1,
+                        help="Cœurs utilisés pour l'entraînement (-1 = tous, défaut)")
+    parser.add_argument('--timing', action='store_true',
+                        help="Mesure la durée de chaque étape (aussi activé par GLIOMA_TIMING=1)")
+    parser.add_argument('--profile-dir', default=None,
+                        help="Profile chaque étape (cProfile, tracemalloc) et écrit les rapports dans ce dossier "
+                             "(aussi activé par GLIOMA_PROFILE_DIR)")
+    args = parser.parse_args()
+    if args.timing:
+        stage_timing.enable()
+    if args.profile_dir:
+        stage_profiler.configure(args.profile_dir)
+    
     print("🧠 Analyse des données cliniques des gliomes")
     print("=" * 50)
     
     # Charger les données
-    data, headers = load_data()
+    with stage_profiler.stage('chargement_donnees'):
+        data, headers = load_data()
     if data is None:
         return
     
     # Préparer les features
-    X_data, y_data, feature_names, target_names = prepare_features(data, headers)
+    with stage_profiler.stage('preparation'):
+        X_data, y_data, feature_names, target_names, patient_ids = prepare_features(data, headers, return_ids=True)
     
     if len(X_data) == 0:
         print("❌ Aucune donnée valide trouvée")
         return
     
     # Encoder les données
-    X_encoded, y_encoded, feature_encoders, target_encoders = encode_categorical_data(
-        X_data, y_data, feature_names, target_names
-    )
+    with stage_profiler.stage('encodage_donnees'):
+        X_encoded, y_encoded, feature_encoders, target_encoders = encode_categorical_data(
+            X_data, y_data, feature_names, target_names
+        )
     
     # Entraîner les modèles
-    models, scalers = train_models(X_encoded, y_encoded, feature_names, target_names)
+    with stage_profiler.stage('entrainement'):
+        models, scalers = train_models(X_encoded, y_encoded, feature_names, target_names, args.jobs)
     
     # Sauvegarder les modèles
-    joblib.dump(models, 'glioma_models.pkl')
-    joblib.dump(scalers, 'glioma_scalers.pkl')
-    joblib.dump(feature_encoders, 'glioma_feature_encoders.pkl')
-    joblib.dump(target_encoders, 'glioma_target_encoders.pkl')
-    joblib.dump(feature_names, 'glioma_feature_names.pkl')
+    with stage_profiler.stage('sauvegarde'):
+        joblib.dump(models, 'glioma_models.pkl')
+        joblib.dump(scalers, 'glioma_scalers.pkl')
+        joblib.dump(feature_encoders, 'glioma_feature_encoders.pkl')
+        joblib.dump(target_encoders, 'glioma_target_encoders.pkl')
+        joblib.dump(feature_names, 'glioma_feature_names.pkl')
+    
+    # Artefact unique (tableaux en mémoire partagée) utilisé par les applications
+    # avec l'index des patients similaires (mêmes lignes et mêmes encodeurs)
+    with stage_profiler.stage('export_artefact'):
+        neighbor_index = NeighborIndex.build(X_data, X_encoded, feature_names, feature_encoders, y_encoded,
+                                             target_encoders, patient_ids)
+        version_dir = export_artifact(models, scalers, feature_encoders, target_encoders, feature_names,
+                                      neighbor_index=neighbor_index)
     
     print("\n✅ Modèles entraînés et sauvegardés!")
     print("📁 Fichiers créés:")
@@ -282,6 +344,14 @@ def main():
     print("  - glioma_feature_encoders.pkl")
     print("  - glioma_target_encoders.pkl")
     print("  - glioma_feature_names.pkl")
+    print(f"  - {version_dir}/ (artefact unique, patients similaires inclus)")
+    
+    # Durée des étapes (ligne de log, fichier Prometheus si GLIOMA_TIMING_FILE est défini)
+    if stage_timing.is_enabled():
+        print(f"⏱️ {stage_timing.log_line()}")
+        stage_timing.flush()
+    if stage_profiler.is_enabled():
+        print(f"🔬 Rapports de profilage: {stage_profiler.report_dir()}/")
 
 if __name__ == "__main__":
     main()
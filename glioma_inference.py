@@ -0,0 +1,375 @@
+"""
+Encodage des données patient et prédiction par lots
+
+Les mêmes règles d'encodage que le formulaire de l'application sont
+appliquées à une table entière : chaque colonne est encodée par
+dictionnaire (valeurs distinctes encodées une seule fois), puis la
+standardisation et `predict_proba` sont évaluées sur la matrice complète,
+pour toutes les cibles.
+
+Pour un patient, `predict_patient` retourne classe, probabilités et
+confiance de toutes les cibles avec un seul parcours des forêts par cible
+(la classe est déduite des probabilités, comme le fait `model.predict`).
+
+pandas n'est importé que par les fonctions qui traitent des tables : la
+prédiction d'un patient n'en a pas besoin.
+
+Avec `explain=True`, chaque prédiction porte aussi la contribution de
+chaque feature aux probabilités, tirée des chemins de décision qui mènent
+aux feuilles atteintes (`predict_explain_matrix` : un seul parcours des
+forêts donne les probabilités et les contributions), gardée en cache avec
+le résultat.
+
+Le formulaire ne propose que des listes de choix et l'âge : les mêmes
+vecteurs encodés reviennent souvent. `prediction_cache` garde, pour tout le
+processus serveur, les derniers résultats de `predict_patient` par
+(version des modèles, vecteur encodé, avec ou sans explication).
+"""
+
+import threading
+from collections import OrderedDict, namedtuple
+
+import numpy as np
+
+from cohort_schema import label_text
+from model_artifact import explainable_forest
+from stage_timing import span
+
+# Nombre de lignes traitées entre deux mises à jour de la progression
+DEFAULT_CHUNK_SIZE = 1000
+
+# Nombre de vecteurs patients gardés par le cache de prédictions
+DEFAULT_CACHE_SIZE = 4096
+
+# Résultat d'une cible pour un patient : classe du modèle (comme
+# `model.predict`), libellé d'origine, probabilités par classe et confiance
+Prediction = namedtuple('Prediction', ['value', 'label', 'probabilities', 'confidence', 'class_labels', 'explanation'],
+                        defaults=(None,))
+
+# Attribution d'une prédiction : probabilités de base (moyenne des racines),
+# contributions de forme (n_features, n_classes) et noms des features
+Explanation = namedtuple('Explanation', ['baseline', 'contributions', 'feature_names'])
+
+
+def encode_value(value, encoder):
+    """
+    Encode une valeur unique comme le formulaire de l'application
+    (valeur inconnue -> 0)
+    """
+    if hasattr(encoder, 'classes_'):
+        # Même résultat que encoder.transform (classes triées), sans sa validation
+        classes = encoder.classes_
+        label = str(value)
+        position = int(np.searchsorted(classes, label))
+        return position if position < len(classes) and classes[position] == label else 0
+    if hasattr(encoder, 'transform'):
+        try:
+            return encoder.transform([str(value)])[0]
+        except:
+            return 0
+    # C'est un dictionnaire de mapping
+    return encoder.get(str(value), 0)
+
+
+def encode_features(input_data, feature_names, feature_encoders):
+    """
+    Construit le vecteur de features d'un patient (dictionnaire de saisie)
+    """
+    input_features = []
+    for feature_name in feature_names:
+        if feature_name in input_data:
+            value = input_data[feature_name]
+            if feature_name in feature_encoders:
+                encoded_value = encode_value(value, feature_encoders[feature_name])
+            else:
+                encoded_value = value if isinstance(value, (int, float)) else 0
+            input_features.append(encoded_value)
+        else:
+            input_features.append(0)
+    return input_features
+
+
+def encode_column(values, encoder, unknown=0):
+    """
+    Encode une colonne entière
+
+    Les valeurs distinctes sont encodées une seule fois puis redistribuées
+    sur toutes les lignes (valeur inconnue -> `unknown`). Une colonne catégorielle
+    est encodée directement par catégorie.
+    """
+    import pandas as pd
+
+    if isinstance(getattr(values, 'dtype', None), pd.CategoricalDtype):
+        # Le code -1 (valeur manquante) désigne la dernière entrée : None
+        codes = np.asarray(values.cat.codes if isinstance(values, pd.Series) else values.codes)
+        uniques = list(values.dtype.categories) + [None]
+    else:
+        codes, uniques = pd.factorize(pd.Series(values, dtype=object), use_na_sentinel=False)
+    labels = [label_text(value) for value in uniques]
+
+    if hasattr(encoder, 'transform'):
+        classes = np.asarray(encoder.classes_)
+        labels = np.array(labels, dtype=str)
+        positions = np.minimum(np.searchsorted(classes, labels), max(len(classes) - 1, 0))
+        known = (classes[positions] == labels) if len(classes) else np.zeros(len(labels), dtype=bool)
+        encoded_uniques = np.where(known, positions, unknown)
+    else:
+        encoded_uniques = np.array([encoder.get(label, unknown) for label in labels])
+
+    return encoded_uniques[codes].astype(np.float64)
+
+
+def encode_feature_frame(df, feature_names, feature_encoders):
+    """
+    Construit la matrice de features (n_patients x n_features) d'une table
+
+    Les valeurs manquantes sont encodées comme la valeur 'Unknown' utilisée
+    à l'entraînement.
+    """
+    import pandas as pd
+
+    X = np.zeros((len(df), len(feature_names)), dtype=np.float64)
+    for j, feature_name in enumerate(feature_names):
+        if feature_name in feature_encoders:
+            # Colonne absente ou cellule vide -> 'Unknown', comme à l'entraînement
+            if feature_name not in df.columns:
+                values = [None] * len(df)
+            elif isinstance(df[feature_name].dtype, pd.CategoricalDtype):
+                values = df[feature_name]
+            else:
+                values = df[feature_name].to_numpy(dtype=object)
+            X[:, j] = encode_column(values, feature_encoders[feature_name])
+        elif feature_name in df.columns:
+            X[:, j] = pd.to_numeric(df[feature_name], errors='coerce').fillna(0).to_numpy()
+    return X
+
+
+def target_class_labels(target_name, model, target_encoders):
+    """
+    Libellés des classes d'un modèle (classes d'origine si l'encodeur est connu)
+    """
+    encoder = target_encoders.get(target_name)
+    if encoder is None:
+        return [str(c) for c in model.classes_]
+    if hasattr(encoder, 'classes_'):
+        classes = list(encoder.classes_)
+    else:
+        classes = [label for label, _ in sorted(encoder.items(), key=lambda item: item[1])]
+    return [str(classes[c]) if 0 <= int(c) < len(classes) else str(c) for c in model.classes_]
+
+
+def predict_matrix(models, scalers, X, progress=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Prédit toutes les cibles pour une matrice de features
+
+    Une seule évaluation des forêts par cible (la classe est dérivée des
+    probabilités). `progress(fraction)` est appelé après chaque bloc.
+    Retourne {cible: (indices des classes prédites, probabilités)}.
+    """
+    targets = [target for target in models if target in scalers]
+    n_rows = X.shape[0]
+    n_steps = max(len(targets) * -(-n_rows // chunk_size), 1)
+    step = 0
+
+    results = {}
+    for target in targets:
+        model = models[target]
+        probabilities = np.empty((n_rows, len(model.classes_)), dtype=np.float64)
+        for start in range(0, n_rows, chunk_size):
+            with span('standardisation'):
+                X_scaled = scalers[target].transform(X[start:start + chunk_size])
+            with span('forets'):
+                probabilities[start:start + chunk_size] = model.predict_proba(X_scaled)
+            step += 1
+            if progress is not None:
+                progress(step / n_steps)
+        results[target] = (np.argmax(probabilities, axis=1), probabilities)
+    return results
+
+
+def predict_explain_matrix(models, scalers, X):
+    """
+    Prédit toutes les cibles et explique chaque prédiction
+
+    Les forêts ne sont parcourues qu'une fois par cible (`apply`) :
+    probabilités et contributions des features sont tirées des mêmes
+    feuilles. Retourne (résultats comme `predict_matrix`,
+    {cible: (probabilités de base, contributions)}).
+    """
+    results, explanations = {}, {}
+    for target in models:
+        if target not in scalers:
+            continue
+        forest = explainable_forest(models[target])
+        with span('standardisation'):
+            X_scaled = scalers[target].transform(X)
+        with span('forets'):
+            leaves = forest.apply(X_scaled)
+            probabilities = forest.leaf_proba(leaves)
+        with span('explication'):
+            explanations[target] = forest.leaf_contributions(leaves, X_scaled.shape[1])
+        results[target] = (np.argmax(probabilities, axis=1), probabilities)
+    return results, explanations
+
+
+def top_contributions(prediction, n=5):
+    """
+    Features qui ont le plus pesé sur la classe prédite, par valeur absolue
+
+    Retourne (probabilité de base de la classe prédite,
+    [(feature, contribution à cette probabilité)]), ou (None, []) sans
+    explication.
+    """
+    explanation = prediction.explanation
+    if explanation is None:
+        return None, []
+    index = int(np.argmax(prediction.probabilities))
+    column = explanation.contributions[:, index]
+    order = np.argsort(-np.abs(column), kind='stable')[:n]
+    return float(explanation.baseline[index]), [(explanation.feature_names[j], float(column[j])) for j in order]
+
+
+def score_frame(df, bundle, progress=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Ajoute à une table de patients les prédictions de toutes les cibles
+
+    Pour chaque cible : classe prédite, confiance et probabilité de chaque classe.
+    """
+    models, scalers, feature_encoders, target_encoders, feature_names = bundle
+    with span('encodage'):
+        X = encode_feature_frame(df, feature_names, feature_encoders)
+    results = predict_matrix(models, scalers, X, progress, chunk_size)
+    return add_prediction_columns(df, results, models, target_encoders)
+
+
+def add_prediction_columns(df, results, models, target_encoders):
+    """
+    Copie de la table avec les colonnes de résultats de `predict_matrix`
+    """
+    scored = df.copy()
+    for target, (predicted, probabilities) in results.items():
+        labels = np.array(target_class_labels(target, models[target], target_encoders), dtype=object)
+        scored[f'{target} - prédiction'] = labels[predicted]
+        scored[f'{target} - confiance'] = probabilities.max(axis=1)
+        for k, label in enumerate(labels):
+            scored[f'{target} - P({label})'] = probabilities[:, k]
+    return scored
+
+
+def predictions_from_results(results, models, target_encoders, row=0, explanations=None, feature_names=None):
+    """
+    Convertit une ligne des résultats de `predict_matrix` (ou de
+    `predict_explain_matrix`, avec ses explications) en {cible: Prediction}
+    """
+    predictions = {}
+    for target, (predicted, probabilities) in results.items():
+        model = models[target]
+        class_labels = target_class_labels(target, model, target_encoders)
+        index = predicted[row]
+        predictions[target] = Prediction(
+            value=model.classes_[index],
+            label=class_labels[index],
+            probabilities=probabilities[row],
+            confidence=probabilities[row, index],
+            class_labels=class_labels,
+            explanation=Explanation(explanations[target][0], explanations[target][1][row], list(feature_names))
+            if explanations else None,
+        )
+    return predictions
+
+
+class PredictionCache:
+    """
+    Cache LRU borné des prédictions, partagé entre les threads (sessions)
+
+    Les clés sont (version des modèles, vecteur encodé, avec ou sans
+    explication) : un nouveau modèle ne réutilise jamais les résultats de
+    l'ancien.
+    """
+
+    def __init__(self, max_size=DEFAULT_CACHE_SIZE):
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def key(model_version, features, explain=False):
+        return model_version, tuple(float(value) for value in features), bool(explain)
+
+    def get(self, key):
+        with self._lock:
+            value = self._entries.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """
+        Compteurs du cache (taux de succès entre 0 et 1, None si inutilisé)
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'max_size': self.max_size,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': self.hits / lookups if lookups else None,
+            }
+
+
+# Cache du processus, commun à toutes les sessions Streamlit
+prediction_cache = PredictionCache()
+
+
+def predict_patient(input_data, bundle, cache=None, model_version=None, explain=False):
+    """
+    Prédit toutes les cibles pour un patient (dictionnaire de saisie)
+
+    Le vecteur de features est encodé une seule fois et chaque forêt n'est
+    parcourue qu'une fois (`predict_proba`, ou `apply` avec `explain` : les
+    contributions des features sont tirées des mêmes feuilles). Avec
+    `cache` et `model_version`, un vecteur déjà vu pour cette version est
+    servi depuis le cache.
+    Retourne {cible: Prediction}.
+    """
+    models, scalers, feature_encoders, target_encoders, feature_names = bundle
+    with span('encodage'):
+        features = encode_features(input_data, feature_names, feature_encoders)
+
+    use_cache = cache is not None and model_version is not None
+    if use_cache:
+        key = cache.key(model_version, features, explain)
+        cached = cache.get(key)
+        if cached is not None:
+            return cached
+
+    X = np.array([features], dtype=np.float64)
+    if explain:
+        results, explanations = predict_explain_matrix(models, scalers, X)
+    else:
+        results, explanations = predict_matrix(models, scalers, X), None
+    predictions = predictions_from_results(results, models, target_encoders,
+                                           explanations=explanations, feature_names=feature_names)
+    if use_cache:
+        cache.put(key, predictions)
+    return predictions
@@ -1,4 +1,7 @@
-import openpyxl
+import argparse
+import threading
+import time
+
 import numpy as np
 from sklearn.model_selection import train_test_split
 from sklearn.preprocessing import StandardScaler, LabelEncoder
@@ -6,42 +9,27 @@ from sklearn.ensemble import RandomForestClassifier
 from sklearn.linear_model import LogisticRegression
 from sklearn.metrics import accuracy_score, classification_report, confusion_matrix
 import joblib
-import streamlit as st
 import pandas as pd
 
+from clinical_cache import load_cached_frame
+from clinical_data_loader import CLINICAL_DATA_PATH
+from cohort_schema import COHORT_SCHEMA, frame_memory
+from glioma_inference import predict_patient
+import stage_profiler
+import stage_timing
+from training_scheduler import plan_jobs, print_training_times, train_targets
+
 def load_and_preprocess_data():
     """
     Charge et prétraite les données cliniques des gliomes
     """
     
-    file_path = 'BrainClinicalData/MU-Glioma-Post_ClinicalData-July2025.xlsx'
-    
     try:
-        # Charger le workbook
-        workbook = openpyxl.load_workbook(file_path)
-        sheet = workbook.active
-        
-        # Lire les en-têtes
-        headers = []
-        for col in range(1, sheet.max_column + 1):
-            cell_value = sheet.cell(row=1, column=col).value
-            headers.append(cell_value)
-        
-        # Lire les données
-        data = []
-        for row in range(2, sheet.max_row + 1):
-            row_data = []
-            for col in range(1, sheet.max_column + 1):
-                cell_value = sheet.cell(row=row, column=col).value
-                row_data.append(cell_value)
-            data.append(row_data)
-        
-        # Créer un DataFrame
-        df = pd.DataFrame(data, columns=headers)
-        
-        workbook.close()
+        # Colonnes du schéma seulement, en types compacts, depuis le cache
+        # colonnaire (reconstruit si le classeur a changé)
+        df = load_cached_frame(COHORT_SCHEMA, CLINICAL_DATA_PATH)
         
-        print(f"✅ Données chargées: {df.shape}")
+        print(f"✅ Données chargées: {df.shape} ({frame_memory(df) / 1e6:.2f} Mo)")
         return df
         
     except Exception as e:
@@ -92,102 +80,171 @@ def prepare_features(df):
     print(f"📊 Features disponibles: {len(available_features)}")
     print(f"🎯 Variables cibles disponibles: {len(available_targets)}")
     
-    # Créer un sous-ensemble avec les colonnes disponibles
-    selected_df = df[available_features + available_targets].copy()
-    
-    # Supprimer les lignes avec trop de valeurs manquantes
+    # Sous-ensemble des colonnes disponibles, sans les lignes avec trop de
+    # valeurs manquantes (une seule sélection, pas de copie intermédiaire)
+    selected_columns = list(dict.fromkeys(available_features + available_targets))
     threshold = len(available_features) * 0.5  # Au moins 50% des features doivent être présentes
-    selected_df = selected_df.dropna(thresh=threshold)
+    keep = df[selected_columns].notna().sum(axis=1) >= threshold
+    selected_df = df.loc[keep, selected_columns]
     
     print(f"📈 Données après nettoyage: {selected_df.shape}")
     
     return selected_df, available_features, available_targets
 
-def encode_categorical_features(df, feature_columns):
+def encode_categorical(values):
+    """
+    Encode une colonne catégorielle comme LabelEncoder sur ses valeurs texte
+    (manquantes -> 'Unknown'), en encodant chaque catégorie une seule fois
+
+    Retourne (codes float64, encodeur ajusté).
     """
-    Encode les variables catégorielles
+    codes = values.cat.codes.to_numpy()
+    # Texte de chaque code ; le code -1 (valeur manquante) devient 'Unknown'
+    labels = np.array([str(category) for category in values.cat.categories] + ['Unknown'], dtype=object)
+    used = np.unique(codes)
+    
+    le = LabelEncoder()
+    le.fit(labels[used])
+    encoded = np.searchsorted(le.classes_, labels[used])
+    lookup = np.zeros(len(labels), dtype=np.float64)
+    lookup[used] = encoded
+    return lookup[codes], le
+
+def encode_feature_matrix(df, feature_columns):
+    """
+    Encode toutes les features une seule fois dans une matrice float64
+
+    Retourne (X, encoders, complete) : X contient une colonne par feature
+    (variables catégorielles encodées, valeurs manquantes -> 'Unknown'),
+    `complete` indique les lignes sans aucune feature manquante.
     """
     
-    df_encoded = df.copy()
+    X = np.empty((len(df), len(feature_columns)), dtype=np.float64)
     encoders = {}
     
-    for col in feature_columns:
-        if df_encoded[col].dtype == 'object':
-            # Créer un encodeur pour cette colonne
+    for j, col in enumerate(feature_columns):
+        values = df[col]
+        if isinstance(values.dtype, pd.CategoricalDtype):
+            X[:, j], encoders[col] = encode_categorical(values)
+        elif not pd.api.types.is_numeric_dtype(values):
+            # Remplacer les valeurs manquantes par une valeur spéciale, puis encoder
             le = LabelEncoder()
-            
-            # Remplacer les valeurs manquantes par une valeur spéciale
-            df_encoded[col] = df_encoded[col].fillna('Unknown')
-            
-            # Encoder les valeurs
-            df_encoded[col] = le.fit_transform(df_encoded[col].astype(str))
+            X[:, j] = le.fit_transform(values.fillna('Unknown').astype(str))
             encoders[col] = le
+        else:
+            X[:, j] = values.to_numpy(dtype=np.float64, na_value=np.nan)
     
-    return df_encoded, encoders
+    complete = df[feature_columns].notna().all(axis=1).to_numpy()
+    return X, encoders, complete
 
-def train_models(df, feature_columns, target_columns):
+def train_models(df, feature_columns, target_columns, jobs=1):
     """
     Entraîne les modèles de prédiction
+
+    Les features sont encodées une seule fois ; chaque cible n'utilise que
+    les lignes complètes où elle est renseignée (masque de lignes sur la
+    matrice partagée). Le scaler est ajusté sur les lignes d'entraînement
+    seulement, une fois par découpage train/test distinct (les cibles
+    renseignées sur les mêmes lignes partagent le même scaler).
+    Retourne (models, scalers, feature_encoders, target_encoders).
+    Les cibles sont entraînées en parallèle sur `jobs` cœurs (-1 = tous) ;
+    les modèles ne dépendent pas du nombre de cœurs.
     """
     
+    # Prétraitement commun à toutes les cibles
+    start = time.perf_counter()
+    X, feature_encoders, complete = encode_feature_matrix(df, feature_columns)
+    print(f"🧮 Prétraitement commun: {len(df)} lignes x {len(feature_columns)} features "
+          f"en {(time.perf_counter() - start) * 1000:.1f} ms")
+    
+    # Scaler ajusté sur les lignes d'entraînement, par découpage distinct
+    split_scalers = {}
+    split_lock = threading.Lock()
+    
+    def scaled_split(train_idx, test_idx):
+        key = (train_idx.tobytes(), test_idx.tobytes())
+        with split_lock:
+            if key not in split_scalers:
+                scaler = StandardScaler().fit(X[train_idx])
+                split_scalers[key] = (scaler, scaler.transform(X[train_idx]), scaler.transform(X[test_idx]))
+            return split_scalers[key]
+    
+    def fit_target(target, n_jobs):
+        # Lignes complètes où la cible est renseignée
+        rows = np.flatnonzero(complete & df[target].notna().to_numpy())
+        
+        if len(rows) < 10:  # Trop peu de données
+            return None
+        
+        # Encoder la variable cible si elle est catégorielle
+        y = df[target].iloc[rows]
+        if not pd.api.types.is_numeric_dtype(y):
+            target_encoder = LabelEncoder()
+            y = target_encoder.fit_transform(y.astype(str))
+        else:
+            # Classes en float64, comme avant les types compacts (Int8)
+            target_encoder = None
+            y = y.to_numpy(dtype=np.float64)
+        
+        # Diviser en train/test (indices de lignes de la matrice partagée)
+        train_idx, test_idx, y_train, y_test = train_test_split(rows, y, test_size=0.2, random_state=42)
+        
+        # Standardiser les features (statistiques des lignes d'entraînement)
+        scaler, X_train_scaled, X_test_scaled = scaled_split(train_idx, test_idx)
+        
+        # Entraîner Random Forest
+        rf_model = RandomForestClassifier(n_estimators=100, random_state=42, n_jobs=n_jobs)
+        rf_model.fit(X_train_scaled, y_train)
+        # Prédiction mono-thread une fois publié (une ligne à la fois dans l'application)
+        rf_model.n_jobs = None
+        
+        # Évaluer le modèle
+        y_pred = rf_model.predict(X_test_scaled)
+        accuracy = accuracy_score(y_test, y_pred)
+        
+        return rf_model, scaler, target_encoder, accuracy
+    
+    trained_targets = [target for target in target_columns if target in df.columns]
+    concurrent_targets, forest_jobs = plan_jobs(len(trained_targets), jobs)
+    print(f"\n🚀 Entraînement de {len(trained_targets)} cibles "
+          f"({concurrent_targets} en parallèle, {forest_jobs} cœur(s) par forêt)")
+    
+    start = time.perf_counter()
+    results = train_targets(fit_target, trained_targets, jobs)
+    elapsed = time.perf_counter() - start
+    
     models = {}
     scalers = {}
-    encoders = {}
+    target_encoders = {}
+    timings = {}
     
-    for target in target_columns:
-        if target in df.columns:
-            print(f"\n🎯 Entraînement du modèle pour: {target}")
-            
-            # Préparer les données pour cette cible
-            target_df = df[feature_columns + [target]].dropna()
-            
-            if len(target_df) < 10:  # Trop peu de données
-                print(f"⚠️ Pas assez de données pour {target}")
-                continue
-            
-            # Encoder les features catégorielles
-            target_df_encoded, feature_encoders = encode_categorical_features(target_df, feature_columns)
-            
-            # Encoder la variable cible si elle est catégorielle
-            if target_df_encoded[target].dtype == 'object':
-                target_encoder = LabelEncoder()
-                target_df_encoded[target] = target_encoder.fit_transform(target_df_encoded[target].astype(str))
-                encoders[target] = target_encoder
-            else:
-                encoders[target] = None
-            
-            # Séparer features et cible
-            X = target_df_encoded[feature_columns]
-            y = target_df_encoded[target]
-            
-            # Diviser en train/test
-            X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
-            
-            # Standardiser les features
-            scaler = StandardScaler()
-            X_train_scaled = scaler.fit_transform(X_train)
-            X_test_scaled = scaler.transform(X_test)
-            
-            # Entraîner Random Forest
-            rf_model = RandomForestClassifier(n_estimators=100, random_state=42)
-            rf_model.fit(X_train_scaled, y_train)
-            
-            # Évaluer le modèle
-            y_pred = rf_model.predict(X_test_scaled)
-            accuracy = accuracy_score(y_test, y_pred)
-            
-            print(f"📊 Précision pour {target}: {accuracy:.3f}")
-            
-            # Sauvegarder le modèle
-            models[target] = rf_model
-            scalers[target] = scaler
+    for target, (result, seconds) in results.items():
+        print(f"\n🎯 Entraînement du modèle pour: {target}")
+        
+        if result is None:
+            print(f"⚠️ Pas assez de données pour {target}")
+            continue
+        
+        rf_model, scaler, target_encoder, accuracy = result
+        print(f"📊 Précision pour {target}: {accuracy:.3f}")
+        
+        # Sauvegarder le modèle
+        models[target] = rf_model
+        scalers[target] = scaler
+        if target_encoder is not None:
+            target_encoders[target] = target_encoder
+        timings[target] = seconds
+    
+    print_training_times(timings, elapsed)
     
-    return models, scalers, encoders
+    return models, scalers, feature_encoders, target_encoders
 
-def create_prediction_app(models, scalers, encoders, feature_columns):
+def create_prediction_app(models, scalers, feature_encoders, target_encoders, feature_columns):
     """
     Crée l'application Streamlit pour les prédictions
     """
+    # Importé ici : l'entraînement seul n'a pas besoin de Streamlit
+    import streamlit as st
     
     st.title('🧠 Prédiction des Gliomes - Analyse Clinique')
     
@@ -259,84 +316,89 @@ def create_prediction_app(models, scalers, encoders, feature_columns):
             'Radiation Therapy': radiation
         }
         
-        # Faire les prédictions pour chaque modèle
-        for target, model in models.items():
-            if target in scalers and target in encoders:
-                st.subheader(f'📊 Prédiction: {target}')
-                
-                # Préparer les données d'entrée
-                input_features = []
-                for col in feature_columns:
-                    if col in input_data:
-                        value = input_data[col]
-                        # Encoder si nécessaire
-                        if col in encoders[target]:
-                            try:
-                                encoded_value = encoders[target][col].transform([str(value)])[0]
-                            except:
-                                encoded_value = 0  # Valeur par défaut
-                        else:
-                            encoded_value = value if isinstance(value, (int, float)) else 0
-                        input_features.append(encoded_value)
-                    else:
-                        input_features.append(0)
-                
-                # Standardiser et prédire
-                input_scaled = scalers[target].transform([input_features])
-                prediction = model.predict(input_scaled)[0]
-                probabilities = model.predict_proba(input_scaled)[0]
-                
-                # Afficher les résultats
-                if target == 'Progression':
-                    if prediction == 1:
-                        st.warning("⚠️ Risque de progression détecté")
-                    else:
-                        st.success("✅ Faible risque de progression")
-                
-                elif target == 'Overall Survival (Death)':
-                    if prediction == 1:
-                        st.error("💀 Risque de mortalité élevé")
-                    else:
-                        st.success("✅ Bon pronostic de survie")
-                
-                elif target == 'Grade of Primary Brain Tumor':
-                    grade_labels = ['Grade I', 'Grade II', 'Grade III', 'Grade IV']
-                    if prediction < len(grade_labels):
-                        predicted_grade = grade_labels[prediction]
-                        st.info(f"📋 Grade prédit: {predicted_grade}")
-                
-                # Afficher la confiance
-                max_prob = max(probabilities)
-                st.metric("Confiance du modèle", f"{max_prob:.1%}")
+        # Toutes les cibles en un seul parcours des forêts
+        predictions = predict_patient(input_data, (models, scalers, feature_encoders, target_encoders, feature_columns))
+        
+        # Afficher les prédictions pour chaque modèle
+        for target, prediction in predictions.items():
+            st.subheader(f'📊 Prédiction: {target}')
+            
+            # Afficher les résultats
+            if target == 'Progression':
+                if prediction.value == 1:
+                    st.warning("⚠️ Risque de progression détecté")
+                else:
+                    st.success("✅ Faible risque de progression")
+            
+            elif target == 'Overall Survival (Death)':
+                if prediction.value == 1:
+                    st.error("💀 Risque de mortalité élevé")
+                else:
+                    st.success("✅ Bon pronostic de survie")
+            
+            elif target == 'Grade of Primary Brain Tumor':
+                grade_labels = ['Grade I', 'Grade II', 'Grade III', 'Grade IV']
+                if prediction.value < len(grade_labels):
+                    predicted_grade = grade_labels[int(prediction.value)]
+                    st.info(f"📋 Grade prédit: {predicted_grade}")
+            
+            # Afficher la confiance
+            st.metric("Confiance du modèle", f"{prediction.confidence:.1%}")
 
 def main():
     """
     Fonction principale
     """
     
+    parser = argparse.ArgumentParser(description="Entraînement et application de prédiction des gliomes")
+    parser.add_argument('--jobs', type=int, default=-1,
+                        help="Cœurs utilisés pour l'entraînement (-1 = tous, défaut)")
+    parser.add_argument('--timing', action='store_true',
+                        help="Mesure la durée de chaque étape (aussi activé par GLIOMA_TIMING=1)")
+    parser.add_argument('--profile-dir', default=None,
+                        help="Profile chaque étape (cProfile, tracemalloc) et écrit les rapports dans ce dossier "
+                             "(aussi activé par GLIOMA_PROFILE_DIR)")
+    args = parser.parse_args()
+    if args.timing:
+        stage_timing.enable()
+    if args.profile_dir:
+        stage_profiler.configure(args.profile_dir)
+    
     print("🧠 Démarrage de l'analyse des gliomes...")
     
     # Charger les données
-    df = load_and_preprocess_data()
+    with stage_profiler.stage('chargement_donnees'):
+        df = load_and_preprocess_data()
     if df is None:
         return
     
     # Préparer les features
-    df_processed, feature_columns, target_columns = prepare_features(df)
+    with stage_profiler.stage('preparation'):
+        df_processed, feature_columns, target_columns = prepare_features(df)
     
     # Entraîner les modèles
-    models, scalers, encoders = train_models(df_processed, feature_columns, target_columns)
+    with stage_profiler.stage('entrainement'):
+        models, scalers, feature_encoders, target_encoders = train_models(df_processed, feature_columns, target_columns, args.jobs)
     
-    # Sauvegarder les modèles
-    joblib.dump(models, 'glioma_models.pkl')
-    joblib.dump(scalers, 'glioma_scalers.pkl')
-    joblib.dump(encoders, 'glioma_encoders.pkl')
-    joblib.dump(feature_columns, 'glioma_features.pkl')
+    # Sauvegarder les modèles (21 features : fichiers distincts de ceux des
+    # applications, entraînées par glioma_analysis_simple.py sur 12 features)
+    with stage_profiler.stage('sauvegarde'):
+        joblib.dump(models, 'glioma_prediction_models.pkl')
+        joblib.dump(scalers, 'glioma_prediction_scalers.pkl')
+        joblib.dump({'features': feature_encoders, 'targets': target_encoders}, 'glioma_prediction_encoders.pkl')
+        joblib.dump(feature_columns, 'glioma_prediction_features.pkl')
     
     print("✅ Modèles entraînés et sauvegardés!")
     
+    # Durée des étapes (ligne de log, fichier Prometheus si GLIOMA_TIMING_FILE est défini)
+    if stage_timing.is_enabled():
+        print(f"⏱️ {stage_timing.log_line()}")
+        stage_timing.flush()
+    if stage_profiler.is_enabled():
+        print(f"🔬 Rapports de profilage: {stage_profiler.report_dir()}/")
+    
     # Créer l'application Streamlit
-    create_prediction_app(models, scalers, encoders, feature_columns)
+    create_prediction_app(models, scalers, feature_encoders, target_encoders, feature_columns)
 
 if __name__ == "__main__":
     main()
@@ -1,23 +1,111 @@
+import time
+
 import streamlit as st
-import joblib
-import numpy as np
-import openpyxl
 
-def load_models():
+import stage_timing
+from glioma_inference import predict_patient, prediction_cache, score_frame, top_contributions
+from model_bundle import BACKEND_LABELS, BACKENDS, get_model_bundle, load_metrics, model_version
+from patient_neighbors import add_neighbor_columns, get_neighbor_index
+
+def load_models(backend):
     """
-    Charge les modèles entraînés
+    Charge les modèles entraînés (une seule fois par processus serveur)
     """
     try:
-        models = joblib.load('glioma_models.pkl')
-        scalers = joblib.load('glioma_scalers.pkl')
-        feature_encoders = joblib.load('glioma_feature_encoders.pkl')
-        target_encoders = joblib.load('glioma_target_encoders.pkl')
-        feature_names = joblib.load('glioma_feature_names.pkl')
-        return models, scalers, feature_encoders, target_encoders, feature_names
+        return get_model_bundle(backend=backend)
     except:
         st.error("❌ Impossible de charger les modèles. Veuillez d'abord exécuter l'entraînement.")
         return None, None, None, None, None
 
+def show_model_load_metrics():
+    """
+    Affiche le coût de chargement des modèles (à froid / à chaud) dans la sidebar
+    """
+    metrics = load_metrics()
+    if not metrics['cold_loads']:
+        return
+    
+    st.sidebar.markdown("---")
+    st.sidebar.markdown("### ⏱️ Chargement des modèles")
+    st.sidebar.caption(f"À froid: {metrics['last_cold_load_seconds'] * 1000:.0f} ms "
+                       f"({metrics['cold_loads']} chargement(s))")
+    if metrics['last_warm_lookup_seconds'] is not None:
+        st.sidebar.caption(f"À chaud: {metrics['last_warm_lookup_seconds'] * 1e6:.0f} µs "
+                           f"({metrics['warm_hits']} réutilisation(s))")
+
+def show_prediction_cache_metrics():
+    """
+    Affiche les compteurs du cache de prédictions (partagé par les sessions)
+    """
+    stats = prediction_cache.stats()
+    if stats['hits'] + stats['misses'] == 0:
+        return
+    
+    st.sidebar.markdown("---")
+    st.sidebar.markdown("### 🗃️ Cache de prédictions")
+    st.sidebar.caption(f"Succès: {stats['hits']} ({stats['hit_rate']:.0%}) - Échecs: {stats['misses']} - "
+                       f"Évictions: {stats['evictions']}")
+    st.sidebar.caption(f"Entrées: {stats['size']}/{stats['max_size']}")
+
+def read_uploaded_table(uploaded_file):
+    """
+    Lit un fichier CSV ou XLSX téléversé dans un DataFrame
+    """
+    # Importés ici : le mode patient unique n'en a pas besoin au démarrage
+    import pandas as pd
+    from clinical_data_loader import load_rows
+    
+    if uploaded_file.name.lower().endswith(('.xlsx', '.xlsm')):
+        data, headers = load_rows(uploaded_file)
+        return pd.DataFrame(data, columns=headers).dropna(how='all')
+    return pd.read_csv(uploaded_file)
+
+def show_batch_scoring(bundle):
+    """
+    Prédiction pour une liste de patients (fichier CSV/XLSX)
+    """
+    st.header('📋 Prédiction par Lot')
+    st.markdown("""
+    Téléversez une liste de patients (CSV ou XLSX) dont les colonnes portent
+    les mêmes noms que le fichier clinique (ex. `Sex at Birth`, `IDH1 mutation`).
+    Les colonnes absentes et les cellules vides sont traitées comme des valeurs inconnues.
+    """)
+    
+    uploaded_file = st.file_uploader("Liste de patients", type=['csv', 'xlsx'])
+    if uploaded_file is None:
+        return
+    
+    df = read_uploaded_table(uploaded_file)
+    missing = [name for name in bundle.feature_names if name not in df.columns]
+    st.write(f"**{len(df)} patients** chargés")
+    if missing:
+        st.warning(f"⚠️ Colonnes absentes (valeur inconnue): {', '.join(missing)}")
+    
+    if not st.button("🔮 Prédire pour tous les patients", use_container_width=True):
+        return
+    
+    progress_bar = st.progress(0.0, text="Prédiction en cours...")
+    start = time.perf_counter()
+    scored = score_frame(df, bundle, progress=lambda fraction: progress_bar.progress(fraction))
+    # Cas similaires de la cohorte (requêtes groupées sur l'index des voisins)
+    index = get_neighbor_index()
+    if index is not None:
+        with stage_timing.span('voisins'):
+            scored = add_neighbor_columns(scored, index)
+    elapsed = time.perf_counter() - start
+    progress_bar.progress(1.0, text="Prédiction terminée")
+    
+    st.success(f"✅ {len(scored)} patients traités en {elapsed:.2f} s "
+               f"({len(scored) / max(elapsed, 1e-9):,.0f} patients/s)")
+    st.dataframe(scored, use_container_width=True)
+    st.download_button(
+        "⬇️ Télécharger les résultats (CSV)",
+        scored.to_csv(index=False).encode('utf-8'),
+        file_name='predictions_gliomes.csv',
+        mime='text/csv',
+        use_container_width=True
+    )
+
 def main():
     st.set_page_config(
         page_title="Prédiction des Gliomes",
@@ -51,13 +139,23 @@ def main():
     Les prédictions ne remplacent pas l'avis médical professionnel.
     """)
     
-    # Charger les modèles
-    models, scalers, feature_encoders, target_encoders, feature_names = load_models()
+    # Charger les modèles avec le moteur de prédiction choisi
+    backend = st.sidebar.selectbox("⚙️ Moteur de prédiction", BACKENDS,
+                                   format_func=lambda name: BACKEND_LABELS[name])
+    bundle = load_models(backend)
+    models, scalers, feature_encoders, target_encoders, feature_names = bundle
+    show_model_load_metrics()
     
     if models is None:
         st.warning("⚠️ Modèles non disponibles. Veuillez d'abord exécuter l'entraînement.")
         return
     
+    # Mode de prédiction
+    mode = st.sidebar.radio("Mode de prédiction", ["👤 Patient unique", "📋 Lot de patients"])
+    if mode == "📋 Lot de patients":
+        show_batch_scoring(bundle)
+        return
+    
     # Interface principale
     st.header('📋 Saisie des Données Patient')
     
@@ -116,79 +214,59 @@ def main():
             'Radiation Therapy': radiation
         }
         
-        # Faire les prédictions pour chaque modèle
-        for target_name, model in models.items():
-            if target_name in scalers and target_name in target_encoders:
-                st.subheader(f'📊 Prédiction: {target_name}')
-                
-                # Préparer les données d'entrée
-                input_features = []
-                for feature_name in feature_names:
-                    if feature_name in input_data:
-                        value = input_data[feature_name]
+        # Toutes les cibles en un seul parcours des forêts (ou depuis le cache),
+        # avec la contribution de chaque feature
+        predictions = predict_patient(input_data, bundle, prediction_cache, model_version(backend=backend),
+                                      explain=True)
+        
+        # Afficher les prédictions pour chaque modèle
+        # Affichage des résultats (mesuré comme étape de rendu)
+        with stage_timing.span('rendu'):
+            for target_name, result in predictions.items():
+                if target_name in target_encoders:
+                    st.subheader(f'📊 Prédiction: {target_name}')
+                    prediction = result.value
+                    
+                    # Afficher les résultats
+                    col_result1, col_result2 = st.columns(2)
+                    
+                    with col_result1:
+                        if target_name == 'Progression':
+                            if prediction == 1:
+                                st.error("⚠️ Risque de progression détecté")
+                            else:
+                                st.success("✅ Faible risque de progression")
                         
-                        # Encoder si nécessaire
-                        if feature_name in feature_encoders:
-                            encoder = feature_encoders[feature_name]
-                            if hasattr(encoder, 'transform'):
-                                try:
-                                    encoded_value = encoder.transform([str(value)])[0]
-                                except:
-                                    encoded_value = 0
+                        elif target_name == 'Overall Survival (Death)':
+                            if prediction == 1:
+                                st.error("💀 Risque de mortalité élevé")
                             else:
-                                # C'est un dictionnaire de mapping
-                                encoded_value = encoder.get(str(value), 0)
-                        else:
-                            encoded_value = value if isinstance(value, (int, float)) else 0
+                                st.success("✅ Bon pronostic de survie")
                         
-                        input_features.append(encoded_value)
-                    else:
-                        input_features.append(0)
-                
-                # Standardiser et prédire
-                input_scaled = scalers[target_name].transform([input_features])
-                prediction = model.predict(input_scaled)[0]
-                probabilities = model.predict_proba(input_scaled)[0]
-                
-                # Afficher les résultats
-                col_result1, col_result2 = st.columns(2)
-                
-                with col_result1:
-                    if target_name == 'Progression':
-                        if prediction == 1:
-                            st.error("⚠️ Risque de progression détecté")
-                        else:
-                            st.success("✅ Faible risque de progression")
-                    
-                    elif target_name == 'Overall Survival (Death)':
-                        if prediction == 1:
-                            st.error("💀 Risque de mortalité élevé")
-                        else:
-                            st.success("✅ Bon pronostic de survie")
+                        elif target_name == 'Grade of Primary Brain Tumor':
+                            grade_labels = ['Grade I', 'Grade II', 'Grade III', 'Grade IV']
+                            if prediction < len(grade_labels):
+                                predicted_grade = grade_labels[prediction]
+                                st.info(f"📋 Grade prédit: {predicted_grade}")
                     
-                    elif target_name == 'Grade of Primary Brain Tumor':
-                        grade_labels = ['Grade I', 'Grade II', 'Grade III', 'Grade IV']
-                        if prediction < len(grade_labels):
-                            predicted_grade = grade_labels[prediction]
-                            st.info(f"📋 Grade prédit: {predicted_grade}")
-                
-                with col_result2:
-                    # Afficher la confiance
-                    max_prob = max(probabilities)
-                    st.metric("Confiance du modèle", f"{max_prob:.1%}")
-                    
-                    # Afficher les probabilités pour chaque classe
-                    if target_name in target_encoders:
-                        encoder = target_encoders[target_name]
-                        if hasattr(encoder, 'classes_'):
-                            classes = encoder.classes_
-                        else:
-                            # C'est un dictionnaire, utiliser les clés
-                            classes = list(encoder.keys())
+                    with col_result2:
+                        # Afficher la confiance
+                        st.metric("Confiance du modèle", f"{result.confidence:.1%}")
                         
+                        # Afficher les probabilités pour chaque classe
                         st.write("**Probabilités par classe:**")
-                        for i, (prob, class_name) in enumerate(zip(probabilities, classes)):
+                        for prob, class_name in zip(result.probabilities, result.class_labels):
                             st.write(f"- {class_name}: {prob:.1%}")
+                    
+                    # Pourquoi ce résultat : contributions tirées des chemins de décision
+                    baseline, contributions = top_contributions(result)
+                    if contributions:
+                        st.write(f"**Facteurs de la prédiction « {result.label} »:**")
+                        for feature_name, contribution in contributions:
+                            icon = "🔺" if contribution > 0 else "🔻"
+                            st.write(f"- {icon} {feature_name}: {contribution * 100:+.1f} points")
+                        st.caption(f"Probabilité de base (moyenne des arbres): {baseline:.1%} - "
+                                   f"base + contributions = {result.probabilities.max():.1%}")
         
         # Recommandations générales
         st.header('💡 Recommandations')
@@ -209,6 +287,11 @@ def main():
         - Chaque patient est unique et peut répondre différemment
         - Les avancées thérapeutiques peuvent modifier les pronostics
         """)
+    
+    show_prediction_cache_metrics()
+    
+    # Histogrammes des étapes (fichier Prometheus si GLIOMA_TIMING_FILE est défini)
+    stage_timing.flush()
 
 if __name__ == "__main__":
     main()
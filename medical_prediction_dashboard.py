@@ -1,20 +1,20 @@
+import time
+
 import streamlit as st
-import joblib
-import numpy as np
-import pandas as pd
-from pathlib import Path
+
+import stage_timing
+from glioma_inference import predict_patient, prediction_cache
+from model_bundle import BACKEND_LABELS, BACKENDS, DEFAULT_BACKEND, get_model_bundle, load_metrics, model_version
+from patient_neighbors import DEFAULT_K, get_neighbor_index
 
 def load_glioma_models():
     """
-    Charge les modèles de prédiction des gliomes
+    Charge les modèles de prédiction des gliomes (une seule fois par processus serveur)
+    
+    Le moteur de prédiction est celui choisi dans la sidebar.
     """
     try:
-        models = joblib.load('glioma_models.pkl')
-        scalers = joblib.load('glioma_scalers.pkl')
-        feature_encoders = joblib.load('glioma_feature_encoders.pkl')
-        target_encoders = joblib.load('glioma_target_encoders.pkl')
-        feature_names = joblib.load('glioma_feature_names.pkl')
-        return models, scalers, feature_encoders, target_encoders, feature_names
+        return get_model_bundle(backend=st.session_state.get('backend', DEFAULT_BACKEND))
     except:
         return None, None, None, None, None
 
@@ -32,8 +32,10 @@ def main():
     st.sidebar.title('🧭 Navigation')
     app_mode = st.sidebar.selectbox(
         "Choisissez l'application:",
-        ["🏠 Accueil", "🧠 Gliomes"]
+        ["🏠 Accueil", "🧠 Gliomes", "📈 Survie", "🧊 Cohorte"]
     )
+    st.sidebar.selectbox("⚙️ Moteur de prédiction", BACKENDS, key='backend',
+                         format_func=lambda name: BACKEND_LABELS[name])
     
     # Sidebar avec informations générales
     st.sidebar.markdown("---")
@@ -53,6 +55,26 @@ def main():
         show_home_page()
     elif app_mode == "🧠 Gliomes":
         show_glioma_page()
+    elif app_mode == "📈 Survie":
+        show_survival_page()
+    elif app_mode == "🧊 Cohorte":
+        show_cohort_page()
+    
+    # Coût de chargement des modèles (à froid / à chaud)
+    metrics = load_metrics()
+    if metrics['cold_loads']:
+        st.sidebar.markdown("---")
+        st.sidebar.caption(f"⏱️ Modèles chargés à froid en {metrics['last_cold_load_seconds'] * 1000:.0f} ms, "
+                           f"{metrics['warm_hits']} réutilisation(s) du cache")
+    
+    # Cache de prédictions partagé par les sessions
+    cache_stats = prediction_cache.stats()
+    if cache_stats['hits'] + cache_stats['misses']:
+        st.sidebar.caption(f"🗃️ Cache de prédictions: {cache_stats['hits']} succès ({cache_stats['hit_rate']:.0%}), "
+                           f"{cache_stats['misses']} échecs, {cache_stats['evictions']} évictions")
+    
+    # Histogrammes des étapes (fichier Prometheus si GLIOMA_TIMING_FILE est défini)
+    stage_timing.flush()
 
 def show_home_page():
     """
@@ -103,7 +125,8 @@ def show_glioma_page():
     st.header('🧠 Prédiction des Gliomes')
     
     # Charger les modèles
-    models, scalers, feature_encoders, target_encoders, feature_names = load_glioma_models()
+    bundle = load_glioma_models()
+    models, scalers, feature_encoders, target_encoders, feature_names = bundle
     
     if models is None:
         st.error("❌ Modèles non disponibles. Veuillez d'abord exécuter l'entraînement.")
@@ -150,58 +173,171 @@ def show_glioma_page():
             'Radiation Therapy': radiation
         }
         
-        # Faire les prédictions
-        for target_name, model in models.items():
-            if target_name in scalers and target_name in target_encoders:
-                st.subheader(f'📊 {target_name}')
-                
-                # Préparer les features
-                input_features = []
-                for feature_name in feature_names:
-                    if feature_name in input_data:
-                        value = input_data[feature_name]
-                        
-                        # Encoder
-                        if feature_name in feature_encoders:
-                            encoder = feature_encoders[feature_name]
-                            if hasattr(encoder, 'transform'):
-                                try:
-                                    encoded_value = encoder.transform([str(value)])[0]
-                                except:
-                                    encoded_value = 0
+        # Faire les prédictions (toutes les cibles en un seul parcours des forêts)
+        backend = st.session_state.get('backend', DEFAULT_BACKEND)
+        predictions = predict_patient(input_data, bundle, prediction_cache, model_version(backend=backend))
+        
+        # Affichage des résultats (mesuré comme étape de rendu)
+        with stage_timing.span('rendu'):
+            for target_name, result in predictions.items():
+                if target_name in target_encoders:
+                    st.subheader(f'📊 {target_name}')
+                    prediction = result.value
+                    
+                    # Afficher les résultats
+                    col_result1, col_result2 = st.columns(2)
+                    
+                    with col_result1:
+                        if target_name == 'Progression':
+                            if prediction == 1:
+                                st.error("⚠️ Risque de progression")
                             else:
-                                encoded_value = encoder.get(str(value), 0)
-                        else:
-                            encoded_value = value if isinstance(value, (int, float)) else 0
+                                st.success("✅ Faible risque de progression")
                         
-                        input_features.append(encoded_value)
-                    else:
-                        input_features.append(0)
-                
-                # Prédire
-                input_scaled = scalers[target_name].transform([input_features])
-                prediction = model.predict(input_scaled)[0]
-                probabilities = model.predict_proba(input_scaled)[0]
-                
-                # Afficher les résultats
-                col_result1, col_result2 = st.columns(2)
-                
-                with col_result1:
-                    if target_name == 'Progression':
-                        if prediction == 1:
-                            st.error("⚠️ Risque de progression")
-                        else:
-                            st.success("✅ Faible risque de progression")
+                        elif target_name == 'Overall Survival (Death)':
+                            if prediction == 1:
+                                st.error("💀 Risque de mortalité élevé")
+                            else:
+                                st.success("✅ Bon pronostic")
                     
-                    elif target_name == 'Overall Survival (Death)':
-                        if prediction == 1:
-                            st.error("💀 Risque de mortalité élevé")
-                        else:
-                            st.success("✅ Bon pronostic")
-                
-                with col_result2:
-                    max_prob = max(probabilities)
-                    st.metric("Confiance", f"{max_prob:.1%}")
+                    with col_result2:
+                        st.metric("Confiance", f"{result.confidence:.1%}")
+        
+        # Cas les plus proches de la cohorte et leur évolution observée
+        index = get_neighbor_index()
+        if index is not None:
+            st.subheader('👥 Patients similaires')
+            with stage_timing.span('voisins'):
+                indices, distances = index.search_records(input_data, DEFAULT_K)
+            st.dataframe(index.neighbors_frame(indices[0], distances[0], list(input_data)),
+                         use_container_width=True, hide_index=True)
+            st.caption("Similarité de Gower : part des caractéristiques identiques, "
+                       "l'âge comptant selon l'écart relatif.")
+
+def show_survival_page():
+    """
+    Courbes de Kaplan-Meier et test du log-rank par sous-groupes de la cohorte
+    """
+    # Importés ici : les autres pages n'en ont pas besoin
+    import altair as alt
+    import pandas as pd
+    from survival_analysis import ENDPOINTS, SURVIVAL_COVARIATES, get_survival_engine
+    
+    st.header('📈 Analyse de Survie')
+    
+    try:
+        engine = get_survival_engine()
+    except:
+        st.error("❌ Données cliniques non disponibles.")
+        return
+    
+    covariates = [name for name in SURVIVAL_COVARIATES if name in engine.covariates]
+    col1, col2 = st.columns(2)
+    with col1:
+        endpoint = st.selectbox('Critère', list(ENDPOINTS), format_func=lambda key: ENDPOINTS[key][0])
+    with col2:
+        by = st.multiselect('Comparer selon', covariates, default=['IDH1 mutation', 'MGMT methylation'])
+    
+    # Sous-groupe de la cohorte (les variables comparées ne sont pas filtrées)
+    filters = {}
+    with st.expander('🔎 Filtrer la cohorte'):
+        filter_columns = st.columns(3)
+        for i, name in enumerate(name for name in covariates if name not in by):
+            with filter_columns[i % 3]:
+                value = st.selectbox(name, ['Tous'] + engine.categories(name), key=f'survival_{name}')
+                if value != 'Tous':
+                    filters[name] = value
+    
+    start = time.perf_counter()
+    with stage_timing.span('survie'):
+        result = engine.compare(endpoint, by, filters)
+    elapsed = time.perf_counter() - start
+    
+    if not result.curves:
+        st.warning("⚠️ Aucun patient ne correspond à ces filtres.")
+        return
+    
+    # Courbes en escalier, à partir de S(0) = 1
+    points = []
+    for label, curve in zip(result.groups, result.curves):
+        group = ' × '.join(label) if label else 'Cohorte'
+        points.append(pd.DataFrame({'Jours': [0.0], 'Survie': [1.0], 'Groupe': [group]}))
+        points.append(pd.DataFrame({'Jours': curve.time, 'Survie': curve.survival, 'Groupe': group}))
+    chart = alt.Chart(pd.concat(points, ignore_index=True)).mark_line(interpolate='step-after').encode(
+        x=alt.X('Jours:Q', title='Jours depuis le diagnostic'),
+        y=alt.Y('Survie:Q', title='Probabilité de survie', scale=alt.Scale(domain=[0, 1])),
+        color=alt.Color('Groupe:N', title=' × '.join(by) if by else None),
+    )
+    st.altair_chart(chart, use_container_width=True)
+    
+    st.dataframe(pd.DataFrame({
+        'Groupe': [' × '.join(label) if label else 'Cohorte' for label in result.groups],
+        'Patients': [curve.n for curve in result.curves],
+        'Événements': [curve.n_events for curve in result.curves],
+        'Attendus': [round(float(expected), 1) for expected in result.expected],
+        'Médiane (jours)': [curve.median for curve in result.curves],
+    }), hide_index=True)
+    
+    if result.dof:
+        col_test1, col_test2 = st.columns(2)
+        with col_test1:
+            st.metric('Log-rank (chi²)', f"{result.statistic:.2f}", help=f"{result.dof} degré(s) de liberté")
+        with col_test2:
+            st.metric('p-valeur', f"{result.p_value:.4f}")
+    st.caption(f"Patients sans événement censurés au dernier jour documenté - calculé en {elapsed * 1000:.1f} ms "
+               f"({engine.memo_hits} résultat(s) réutilisé(s))")
+
+def show_cohort_page():
+    """
+    Exploration de la cohorte : effectifs et taux d'événements par groupe,
+    lus dans le cube d'agrégats précalculé
+    """
+    from cohort_cube import CUBE_DIMENSIONS, get_cohort_cube
+    
+    st.header('🧊 Exploration de la Cohorte')
+    
+    try:
+        cube = get_cohort_cube()
+    except:
+        st.error("❌ Données cliniques non disponibles.")
+        return
+    
+    group_by = st.multiselect('Regrouper par', list(CUBE_DIMENSIONS), default=['Primary Diagnosis'])
+    
+    # Sous-groupe de la cohorte (les dimensions regroupées ne sont pas filtrées)
+    filters = {}
+    with st.expander('🔎 Filtrer la cohorte'):
+        filter_columns = st.columns(3)
+        for i, name in enumerate(name for name in CUBE_DIMENSIONS if name not in group_by):
+            with filter_columns[i % 3]:
+                value = st.selectbox(name, ['Tous'] + cube.categories[name], key=f'cube_{name}')
+                if value != 'Tous':
+                    filters[name] = value
+    
+    # Totaux du sous-groupe (une ligne), puis le regroupement demandé
+    totals = cube.query((), filters)
+    if totals.empty:
+        st.warning("⚠️ Aucun patient ne correspond à ces filtres.")
+        return
+    
+    start = time.perf_counter()
+    with stage_timing.span('cube'):
+        table = cube.query(group_by, filters)
+    elapsed = time.perf_counter() - start
+    
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        st.metric('Patients', int(totals['Patients'][0]))
+    with col2:
+        st.metric('Progression', f"{totals['Progression (%)'][0]:.1f}%")
+    with col3:
+        st.metric('Décès', f"{totals['Décès (%)'][0]:.1f}%")
+    
+    if group_by:
+        labels = table[group_by].astype(str).agg(' × '.join, axis=1)
+        st.bar_chart(table.set_index(labels)[['Progression (%)', 'Décès (%)']])
+    st.dataframe(table, hide_index=True, use_container_width=True)
+    st.caption(f"{len(cube.cells)} cellules pour {cube.n_patients} patients - requête en {elapsed * 1000:.1f} ms")
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,589 @@
+#!/usr/bin/env python3
+"""
+Artefact unique et versionné des modèles de prédiction des gliomes
+
+Un artefact regroupe, dans un même dossier versionné :
+- `manifest.json` : version du format, noms des features, encodeurs,
+  classes des cibles et description de chaque forêt ;
+- un fichier `.npy` par tableau numérique (nœuds des arbres aplatis),
+  ouvert en mémoire partagée (`mmap_mode='r'`) ;
+- `glioma_neighbors.npz` : index des patients similaires
+  (`patient_neighbors.py`), construit sur les mêmes données et encodeurs.
+
+La standardisation est intégrée aux forêts à l'export : une forêt compare
+`float32((x - moyenne) / écart-type) <= seuil`, une fonction croissante de
+x, donc chaque seuil est réécrit en le plus grand x (float64) qui vérifie
+la condition. Les forêts de l'artefact consomment directement le vecteur
+encodé, avec exactement les mêmes décisions (vérifié nœud par nœud à
+l'export) ; les artefacts du format 1 (paramètres des scalers) restent
+lisibles.
+
+Plusieurs processus qui chargent le même artefact partagent donc les
+tableaux des forêts via le cache de pages du système, et le démarrage ne
+désérialise aucun graphe d'objets Python pour les nœuds des arbres.
+
+Disposition sur disque :
+    glioma_artifact/
+        CURRENT              # nom de la version active
+        v-<empreinte>/       # une version complète et immuable
+            manifest.json
+            t0_feature.npy, t0_threshold.npy, ...
+            glioma_neighbors.npz
+
+La version active est publiée en remplaçant atomiquement `CURRENT` : un
+lecteur voit toujours un ensemble cohérent de fichiers.
+
+Usage (conversion des fichiers .pkl existants) :
+    python model_artifact.py [--output glioma_artifact]
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+import weakref
+
+import numpy as np
+
+ARTIFACT_DIR = 'glioma_artifact'
+ARTIFACT_FORMAT_VERSION = 2
+SUPPORTED_FORMAT_VERSIONS = (1, 2)
+
+_CURRENT_FILE = 'CURRENT'
+_MANIFEST_FILE = 'manifest.json'
+NEIGHBORS_FILE = 'glioma_neighbors.npz'
+
+# Forêts compilées des modèles scikit-learn, pour l'attribution des prédictions
+_explainable_forests = weakref.WeakKeyDictionary()
+_explainable_lock = threading.Lock()
+
+
+class LabelEncoding:
+    """
+    Équivalent léger de `LabelEncoder` reconstruit à partir de ses classes
+    """
+
+    def __init__(self, classes):
+        self.classes_ = np.asarray(classes)
+
+    def transform(self, values):
+        values = np.asarray(values)
+        codes = np.searchsorted(self.classes_, values)
+        codes = np.minimum(codes, len(self.classes_) - 1)
+        if len(self.classes_) == 0 or np.any(self.classes_[codes] != values):
+            raise ValueError(f"Valeurs inconnues: {set(values.tolist()) - set(self.classes_.tolist())}")
+        return codes
+
+    def inverse_transform(self, codes):
+        return self.classes_[np.asarray(codes)]
+
+
+class StandardScaling:
+    """
+    Équivalent léger de `StandardScaler.transform` (moyenne et écart-type)
+    """
+
+    def __init__(self, mean, scale):
+        self.mean_ = mean
+        self.scale_ = scale
+
+    def transform(self, X):
+        X = np.array(X, dtype=np.float64)
+        X -= self.mean_
+        X /= self.scale_
+        return X
+
+
+class IdentityScaling:
+    """
+    Standardisation neutre des forêts dont les seuils sont déjà exprimés
+    sur les features encodées
+    """
+
+    def transform(self, X):
+        return np.asarray(X, dtype=np.float64)
+
+
+class ArrayForest:
+    """
+    Forêt aléatoire représentée par des tableaux de nœuds aplatis
+
+    Tous les arbres sont concaténés : `roots[t]` est l'indice du nœud racine
+    de l'arbre t, `left`/`right` sont des indices globaux (-1 pour une
+    feuille), `value` contient les probabilités normalisées de chaque nœud.
+    Les calculs reproduisent ceux de scikit-learn (entrées converties en
+    float32, somme des arbres dans l'ordre puis division par leur nombre).
+    Les forêts aux seuils repliés (`fold_scaler`) comparent les entrées en
+    float64 (`input_dtype`).
+    """
+
+    def __init__(self, classes, roots, feature, threshold, left, right, value, input_dtype=np.float32):
+        self.classes_ = np.asarray(classes)
+        self.n_classes_ = len(self.classes_)
+        self.n_estimators = len(roots)
+        self.roots = roots
+        self.feature = feature
+        self.threshold = threshold
+        self.left = left
+        self.right = right
+        self.value = value
+        self.input_dtype = input_dtype
+        self._parent = None   # parent de chaque nœud, calculé à la première explication
+
+    def apply(self, X):
+        """
+        Indices des feuilles atteintes, de forme (n_lignes, n_arbres)
+
+        Tous les arbres sont parcourus ensemble : chaque itération descend
+        d'un niveau pour toutes les paires (ligne, arbre) encore sur un nœud
+        interne, le nombre d'itérations est donc la profondeur maximale.
+        """
+        X = np.asarray(X, dtype=self.input_dtype)
+        n_rows, n_features = X.shape
+        X_flat = X.ravel()
+        node = np.tile(np.asarray(self.roots, dtype=np.intp), n_rows)
+        row_offset = np.repeat(np.arange(n_rows, dtype=np.intp) * n_features, self.n_estimators)
+        active = np.arange(node.shape[0])
+        while active.size:
+            current = node[active]
+            left = self.left[current]
+            # Les paires arrivées sur une feuille sortent de la boucle
+            internal = left >= 0
+            active, current, left = active[internal], current[internal], left[internal]
+            go_left = X_flat[row_offset[active] + self.feature[current]] <= self.threshold[current]
+            node[active] = np.where(go_left, left, self.right[current])
+        return node.reshape(n_rows, self.n_estimators)
+
+    def predict_proba(self, X):
+        return self.leaf_proba(self.apply(X))
+
+    def leaf_proba(self, leaves):
+        """
+        Probabilités à partir des feuilles atteintes (sortie de `apply`)
+        """
+        # Somme cumulée séquentielle sur les arbres : même ordre d'addition
+        # que scikit-learn (pas de sommation par paires), donc bit à bit identique
+        proba = self.value[leaves].cumsum(axis=1)[:, -1]
+        proba /= self.n_estimators
+        return proba
+
+    def predict(self, X):
+        return self.classes_.take(np.argmax(self.predict_proba(X), axis=1), axis=0)
+
+    def contributions(self, X):
+        """
+        Contribution de chaque feature aux probabilités (chemins de décision)
+
+        Voir `leaf_contributions` ; retourne (base, contributions).
+        """
+        X = np.asarray(X)
+        return self.leaf_contributions(self.apply(X), X.shape[1])
+
+    def leaf_contributions(self, leaves, n_features):
+        """
+        Contributions des features à partir des feuilles atteintes (sortie
+        de `apply`), sans réévaluer les séparations
+
+        Chaque nœud du chemin attribue à sa feature de séparation la
+        variation des probabilités entre ce nœud et l'enfant suivi : les
+        chemins sont remontés depuis les feuilles (parents précalculés),
+        pour toutes les paires (ligne, arbre) à la fois, puis les
+        contributions sont moyennées sur les arbres.
+        Retourne (base, contributions) de formes (n_classes,) et
+        (n_lignes, n_features, n_classes) : base + somme des contributions
+        = `leaf_proba(leaves)` (aux arrondis près).
+        """
+        if self._parent is None:
+            internal = np.flatnonzero(np.asarray(self.left) >= 0)
+            parent = np.full(len(self.left), -1, dtype=np.intp)
+            parent[np.asarray(self.left)[internal]] = internal
+            parent[np.asarray(self.right)[internal]] = internal
+            self._parent = parent
+
+        n_rows = leaves.shape[0]
+        node = leaves.ravel().astype(np.intp)
+        row_offset = np.repeat(np.arange(n_rows, dtype=np.intp) * n_features, self.n_estimators)
+        contributions = np.zeros((n_rows * n_features, self.n_classes_), dtype=np.float64)
+        while node.size:
+            parent = self._parent[node]
+            inner = parent >= 0
+            node, parent, row_offset = node[inner], parent[inner], row_offset[inner]
+            np.add.at(contributions, row_offset + self.feature[parent], self.value[node] - self.value[parent])
+            node = parent
+        baseline = self.value[np.asarray(self.roots)].mean(axis=0)
+        contributions /= self.n_estimators
+        return baseline, contributions.reshape(n_rows, n_features, self.n_classes_)
+
+
+def explainable_forest(model):
+    """
+    `ArrayForest` d'un modèle pour l'attribution de ses prédictions
+
+    Un modèle scikit-learn est compilé une seule fois (seuils inchangés :
+    la forêt compilée prend les mêmes entrées standardisées que lui).
+    """
+    if isinstance(model, ArrayForest):
+        return model
+    with _explainable_lock:
+        forest = _explainable_forests.get(model)
+        if forest is None:
+            forest = _explainable_forests[model] = compile_forest(model)
+        return forest
+
+
+def _flatten_forest(model):
+    """
+    Aplatis les arbres d'une `RandomForestClassifier` en tableaux concaténés
+    """
+    roots, features, thresholds, lefts, rights, values = [], [], [], [], [], []
+    offset = 0
+    for estimator in model.estimators_:
+        tree = estimator.tree_
+        is_leaf = tree.children_left < 0
+        roots.append(offset)
+        features.append(np.where(is_leaf, 0, tree.feature))
+        thresholds.append(tree.threshold)
+        lefts.append(np.where(is_leaf, -1, tree.children_left + offset))
+        rights.append(np.where(is_leaf, -1, tree.children_right + offset))
+
+        # Même normalisation que DecisionTreeClassifier.predict_proba
+        value = tree.value[:, 0, :model.n_classes_].astype(np.float64)
+        normalizer = value.sum(axis=1)[:, np.newaxis]
+        normalizer[normalizer == 0.0] = 1.0
+        values.append(value / normalizer)
+        offset += tree.node_count
+
+    return {
+        'roots': np.array(roots, dtype=np.int32),
+        'feature': np.concatenate(features).astype(np.int32),
+        'threshold': np.concatenate(thresholds).astype(np.float64),
+        'left': np.concatenate(lefts).astype(np.int32),
+        'right': np.concatenate(rights).astype(np.int32),
+        'value': np.concatenate(values),
+    }
+
+
+def _float_keys(values):
+    """
+    Entiers dans le même ordre que les flottants float64 (et réciproquement)
+    """
+    bits = values.view(np.int64)
+    return bits ^ ((bits >> 63) & np.int64(0x7FFFFFFFFFFFFFFF))
+
+
+def _key_floats(keys):
+    return _float_keys(keys).view(np.float64)
+
+
+def _goes_left(x, mean, scale, threshold):
+    # Condition de scikit-learn : entrée standardisée, convertie en float32
+    with np.errstate(over='ignore', invalid='ignore'):
+        return ((x - mean) / scale).astype(np.float32) <= threshold
+
+
+def _scaler_parameters(scaler, n_features):
+    mean = getattr(scaler, 'mean_', None)
+    scale = getattr(scaler, 'scale_', None)
+    return (np.asarray(mean if mean is not None else np.zeros(n_features), dtype=np.float64),
+            np.asarray(scale if scale is not None else np.ones(n_features), dtype=np.float64))
+
+
+def fold_scaler(arrays, mean, scale):
+    """
+    Réécrit les seuils d'une forêt aplatie sur les features encodées
+
+    Pour chaque nœud, le nouveau seuil T est le plus grand float64 x tel que
+    float32((x - mean) / scale) <= seuil (recherche dichotomique sur l'ordre
+    des float64, 64 itérations vectorisées) : x <= T donne la même décision
+    pour toute entrée. Retourne une copie des tableaux avec les seuils repliés.
+    """
+    internal = arrays['left'] >= 0
+    feature = arrays['feature'][internal]
+    node_mean, node_scale = mean[feature], scale[feature]
+    threshold = arrays['threshold'][internal]
+
+    largest = np.finfo(np.float64).max
+    low = np.full(len(threshold), _float_keys(np.array([-largest]))[0])
+    high = np.full(len(threshold), _float_keys(np.array([largest]))[0])
+    always_left = _goes_left(largest, node_mean, node_scale, threshold)
+    never_left = ~_goes_left(-largest, node_mean, node_scale, threshold)
+
+    # Invariant : `low` va à gauche, `high` non (sauf nœuds aux seuils infinis)
+    for _ in range(64):
+        middle = (low >> 1) + (high >> 1) + (low & high & 1)
+        left = _goes_left(_key_floats(middle), node_mean, node_scale, threshold)
+        low = np.where(left, middle, low)
+        high = np.where(left, high, middle)
+
+    raw = _key_floats(low)
+    raw[always_left] = np.inf
+    raw[never_left] = -np.inf
+
+    # Même décision de part et d'autre du nouveau seuil, nœud par nœud
+    finite = np.isfinite(raw)
+    above = np.nextafter(raw[finite], np.inf)
+    if not (_goes_left(raw[finite], node_mean[finite], node_scale[finite], threshold[finite]).all()
+            and not _goes_left(above, node_mean[finite], node_scale[finite], threshold[finite]).any()):
+        raise ValueError("Seuils repliés non équivalents")
+
+    folded = dict(arrays)
+    folded['threshold'] = arrays['threshold'].copy()
+    folded['threshold'][internal] = raw
+    return folded
+
+
+def compile_forest(model, scaler=None):
+    """
+    Convertit une `RandomForestClassifier` entraînée en `ArrayForest` (en mémoire)
+
+    Avec `scaler`, la standardisation est repliée dans les seuils : la forêt
+    prend directement les features encodées.
+    """
+    arrays = _flatten_forest(model)
+    input_dtype = np.float32
+    if scaler is not None:
+        arrays = fold_scaler(arrays, *_scaler_parameters(scaler, model.n_features_in_))
+        input_dtype = np.float64
+    return ArrayForest(model.classes_, arrays['roots'], arrays['feature'], arrays['threshold'],
+                       arrays['left'], arrays['right'], arrays['value'], input_dtype)
+
+
+def _describe_encoder(encoder):
+    if hasattr(encoder, 'classes_'):
+        return {'type': 'label', 'classes': [str(c) for c in encoder.classes_]}
+    return {'type': 'mapping', 'mapping': {str(k): int(v) for k, v in encoder.items()}}
+
+
+def _restore_encoder(description):
+    if description['type'] == 'label':
+        return LabelEncoding(np.array(description['classes'], dtype=str))
+    return dict(description['mapping'])
+
+
+def export_artifact(models, scalers, feature_encoders, target_encoders, feature_names,
+                    artifact_dir=ARTIFACT_DIR, keep_versions=1, neighbor_index=None):
+    """
+    Écrit une nouvelle version de l'artefact et la rend active
+
+    `neighbor_index` (`patient_neighbors.NeighborIndex`) est enregistré dans
+    la version ; son empreinte entre dans celle de la version.
+
+    Retourne le chemin du dossier de la version publiée.
+    """
+    arrays = {}
+    targets = []
+    for t, (target_name, model) in enumerate(models.items()):
+        prefix = f"t{t}_"
+        # Standardisation repliée dans les seuils : pas de scaler dans l'artefact
+        mean, scale = _scaler_parameters(scalers[target_name], model.n_features_in_)
+        for name, array in fold_scaler(_flatten_forest(model), mean, scale).items():
+            arrays[prefix + name] = array
+        targets.append({
+            'name': target_name,
+            'prefix': prefix,
+            'classes': model.classes_.tolist(),
+            'n_estimators': len(model.estimators_),
+            'n_nodes': int(arrays[prefix + 'left'].shape[0]),
+            'target_encoder': _describe_encoder(target_encoders[target_name])
+            if target_name in target_encoders else None,
+        })
+
+    manifest = {
+        'format_version': ARTIFACT_FORMAT_VERSION,
+        'created_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'feature_names': list(feature_names),
+        'feature_encoders': {name: _describe_encoder(encoder) for name, encoder in feature_encoders.items()},
+        'targets': targets,
+        'arrays': {},
+    }
+    if neighbor_index is not None:
+        manifest['neighbors'] = {'file': NEIGHBORS_FILE, 'sha256': neighbor_index.fingerprint()}
+
+    # Empreinte de chaque tableau, et de l'ensemble pour nommer la version
+    digest = hashlib.sha256()
+    for name, array in arrays.items():
+        array_digest = hashlib.sha256(np.ascontiguousarray(array).tobytes()).hexdigest()
+        manifest['arrays'][name] = {'file': name + '.npy', 'sha256': array_digest}
+        digest.update(name.encode('utf-8'))
+        digest.update(array_digest.encode('utf-8'))
+    digest.update(json.dumps({k: v for k, v in manifest.items() if k != 'created_at'}, sort_keys=True).encode('utf-8'))
+    version = f"v-{digest.hexdigest()[:16]}"
+
+    os.makedirs(artifact_dir, exist_ok=True)
+    version_dir = os.path.join(artifact_dir, version)
+    if not os.path.exists(os.path.join(version_dir, _MANIFEST_FILE)):
+        tmp_dir = f"{version_dir}.{os.getpid()}.tmp"
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        os.makedirs(tmp_dir)
+        for name, array in arrays.items():
+            np.save(os.path.join(tmp_dir, name + '.npy'), np.ascontiguousarray(array))
+        if neighbor_index is not None:
+            neighbor_index.save(os.path.join(tmp_dir, NEIGHBORS_FILE))
+        with open(os.path.join(tmp_dir, _MANIFEST_FILE), 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, indent=2)
+        shutil.rmtree(version_dir, ignore_errors=True)
+        os.replace(tmp_dir, version_dir)
+
+    # Publier la version (remplacement atomique du pointeur)
+    tmp_current = os.path.join(artifact_dir, f"{_CURRENT_FILE}.{os.getpid()}.tmp")
+    with open(tmp_current, 'w', encoding='utf-8') as f:
+        f.write(version + '\n')
+    os.replace(tmp_current, os.path.join(artifact_dir, _CURRENT_FILE))
+
+    _prune_versions(artifact_dir, version, keep_versions)
+    return version_dir
+
+
+def _prune_versions(artifact_dir, current, keep_versions):
+    """
+    Supprime les anciennes versions (les processus qui les ont ouvertes en
+    mémoire partagée continuent à fonctionner jusqu'à leur rechargement)
+    """
+    versions = [name for name in os.listdir(artifact_dir)
+                if name.startswith('v-') and not name.endswith('.tmp') and name != current]
+    versions.sort(key=lambda name: os.path.getmtime(os.path.join(artifact_dir, name)), reverse=True)
+    for name in versions[max(keep_versions - 1, 0):]:
+        shutil.rmtree(os.path.join(artifact_dir, name), ignore_errors=True)
+
+
+def current_version_dir(artifact_dir=ARTIFACT_DIR):
+    """
+    Dossier de la version active, ou None si aucun artefact n'est publié
+    """
+    try:
+        with open(os.path.join(artifact_dir, _CURRENT_FILE), encoding='utf-8') as f:
+            version = f.read().strip()
+    except FileNotFoundError:
+        return None
+    return os.path.join(artifact_dir, version)
+
+
+def artifact_exists(artifact_dir=ARTIFACT_DIR):
+    version_dir = current_version_dir(artifact_dir)
+    return version_dir is not None and os.path.exists(os.path.join(version_dir, _MANIFEST_FILE))
+
+
+def load_artifact(artifact_dir=ARTIFACT_DIR, mmap_mode='r'):
+    """
+    Charge la version active de l'artefact
+
+    Retourne (models, scalers, feature_encoders, target_encoders,
+    feature_names), avec des forêts `ArrayForest` dont les tableaux sont
+    ouverts en mémoire partagée.
+    """
+    version_dir = current_version_dir(artifact_dir)
+    if version_dir is None:
+        raise FileNotFoundError(f"Aucun artefact publié dans {artifact_dir}")
+    with open(os.path.join(version_dir, _MANIFEST_FILE), encoding='utf-8') as f:
+        manifest = json.load(f)
+    if manifest['format_version'] not in SUPPORTED_FORMAT_VERSIONS:
+        raise ValueError(f"Version d'artefact non supportée: {manifest['format_version']}")
+
+    def array(name):
+        return np.load(os.path.join(version_dir, manifest['arrays'][name]['file']), mmap_mode=mmap_mode)
+
+    models, scalers, target_encoders = {}, {}, {}
+    for target in manifest['targets']:
+        prefix = target['prefix']
+        # Format 1 : seuils standardisés et paramètres des scalers
+        folded = manifest['format_version'] >= 2
+        models[target['name']] = ArrayForest(
+            target['classes'],
+            array(prefix + 'roots'), array(prefix + 'feature'), array(prefix + 'threshold'),
+            array(prefix + 'left'), array(prefix + 'right'), array(prefix + 'value'),
+            np.float64 if folded else np.float32,
+        )
+        scalers[target['name']] = (IdentityScaling() if folded else
+                                   StandardScaling(array(prefix + 'scaler_mean'), array(prefix + 'scaler_scale')))
+        if target['target_encoder'] is not None:
+            target_encoders[target['name']] = _restore_encoder(target['target_encoder'])
+
+    feature_encoders = {name: _restore_encoder(description)
+                        for name, description in manifest['feature_encoders'].items()}
+    return models, scalers, feature_encoders, target_encoders, manifest['feature_names']
+
+
+def verify_artifact(artifact_dir=ARTIFACT_DIR):
+    """
+    Vérifie les empreintes des tableaux (et de l'index des voisins) de la
+    version active
+    """
+    version_dir = current_version_dir(artifact_dir)
+    with open(os.path.join(version_dir, _MANIFEST_FILE), encoding='utf-8') as f:
+        manifest = json.load(f)
+    for name, spec in manifest['arrays'].items():
+        data = np.ascontiguousarray(np.load(os.path.join(version_dir, spec['file']))).tobytes()
+        if hashlib.sha256(data).hexdigest() != spec['sha256']:
+            raise ValueError(f"Tableau corrompu: {name}")
+    if 'neighbors' in manifest:
+        from patient_neighbors import NeighborIndex
+
+        index = NeighborIndex.load(os.path.join(version_dir, manifest['neighbors']['file']))
+        if index.fingerprint() != manifest['neighbors']['sha256']:
+            raise ValueError(f"Index des voisins corrompu: {manifest['neighbors']['file']}")
+    return True
+
+
+def check_folded_equivalence(models, scalers, folded_models, X):
+    """
+    Compare, cible par cible, `predict_proba` des forêts aux seuils repliés
+    sur X (features encodées) à `scaler.transform` + `predict_proba` des
+    modèles d'origine ; lève ValueError à la première différence
+
+    Retourne le nombre de lignes comparées.
+    """
+    X = np.asarray(X, dtype=np.float64)
+    for target, model in models.items():
+        expected = model.predict_proba(scalers[target].transform(X))
+        folded = folded_models[target].predict_proba(X)
+        if not np.array_equal(expected, folded):
+            mismatches = int(np.any(expected != folded, axis=1).sum())
+            raise ValueError(f"Seuils repliés non équivalents pour {target}: {mismatches} ligne(s) différente(s)")
+    return len(X)
+
+
+def main():
+    """
+    Convertit les fichiers .pkl existants en artefact unique
+    """
+    import joblib
+
+    from clinical_cache import load_cached_dataframe
+    from glioma_inference import encode_feature_frame
+    from patient_neighbors import build_cohort_index
+
+    parser = argparse.ArgumentParser(description="Export des modèles en artefact unique")
+    parser.add_argument('--output', default=ARTIFACT_DIR)
+    args = parser.parse_args()
+
+    models = joblib.load('glioma_models.pkl')
+    scalers = joblib.load('glioma_scalers.pkl')
+    feature_encoders = joblib.load('glioma_feature_encoders.pkl')
+    target_encoders = joblib.load('glioma_target_encoders.pkl')
+    feature_names = joblib.load('glioma_feature_names.pkl')
+
+    # Index des voisins reconstruit depuis le classeur, si ses encodeurs
+    # sont bien ceux des .pkl
+    neighbor_index, cohort_encoders = build_cohort_index()
+    if any(list(map(str, cohort_encoders[name].classes_)) != list(map(str, feature_encoders[name].classes_))
+           for name in neighbor_index.categorical_features):
+        print("⚠️ Encodeurs du classeur différents de ceux des .pkl : artefact publié sans index des voisins")
+        neighbor_index = None
+
+    version_dir = export_artifact(models, scalers, feature_encoders, target_encoders,
+                                  feature_names, args.output, neighbor_index=neighbor_index)
+    verify_artifact(args.output)
+
+    # Équivalence avec scaler + scikit-learn sur toute la cohorte
+    folded_models, _, _, _, _ = load_artifact(args.output)
+    X = encode_feature_frame(load_cached_dataframe().dropna(how='all'), feature_names, feature_encoders)
+    n_rows = check_folded_equivalence(models, scalers, folded_models, X)
+    print(f"✅ Seuils repliés identiques à scaler + predict_proba sur {n_rows} patients")
+    print(f"✅ Artefact publié: {version_dir}")
+
+
+if __name__ == "__main__":
+    main()
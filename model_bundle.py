@@ -0,0 +1,164 @@
+"""
+Cache des modèles de prédiction des gliomes partagé par tout le processus
+
+Streamlit ré-exécute le script de l'application à chaque interaction, mais
+les modules importés restent en mémoire : les artefacts sont donc chargés
+une seule fois par processus serveur, pour toutes les sessions. Le cache est
+invalidé automatiquement dès qu'un des fichiers change (taille ou date de
+modification).
+
+Deux moteurs de prédiction sont disponibles :
+- 'compiled' (défaut) : forêts aplaties en tableaux NumPy (`ArrayForest`),
+  parcourues de façon vectorisée. Si un artefact unique (`model_artifact.py`)
+  a été publié, ses tableaux sont ouverts en mémoire partagée ; sinon les
+  forêts des fichiers `.pkl` sont converties au chargement ;
+- 'sklearn' : les objets scikit-learn des fichiers `.pkl`.
+Les probabilités sont identiques bit à bit d'un moteur à l'autre.
+"""
+
+import hashlib
+import os
+import threading
+import time
+from collections import namedtuple
+
+import stage_timing
+from model_artifact import (ARTIFACT_DIR, IdentityScaling, artifact_exists, compile_forest, current_version_dir,
+                            load_artifact)
+
+ARTIFACT_FILES = {
+    'models': 'glioma_models.pkl',
+    'scalers': 'glioma_scalers.pkl',
+    'feature_encoders': 'glioma_feature_encoders.pkl',
+    'target_encoders': 'glioma_target_encoders.pkl',
+    'feature_names': 'glioma_feature_names.pkl',
+}
+
+ModelBundle = namedtuple('ModelBundle', list(ARTIFACT_FILES))
+
+BACKENDS = ('compiled', 'sklearn')
+DEFAULT_BACKEND = 'compiled'
+BACKEND_LABELS = {
+    'compiled': 'Compilé (tableaux NumPy)',
+    'sklearn': 'scikit-learn',
+}
+
+_lock = threading.Lock()
+_bundles = {}   # (dossier, moteur) -> (signature, bundle)
+_metrics = {
+    'cold_loads': 0,
+    'warm_hits': 0,
+    'last_cold_load_seconds': None,
+    'total_cold_load_seconds': 0.0,
+    'last_warm_lookup_seconds': None,
+    'loaded_at': None,
+    'source': None,
+    'backend': None,
+}
+
+
+def artifact_signature(base_dir='.', backend=DEFAULT_BACKEND):
+    """
+    Signature (nom, taille, date de modification) des fichiers d'artefacts
+
+    Pour l'artefact unique, la version active suffit (chaque version est
+    immuable). Lève FileNotFoundError si un fichier est absent.
+    """
+    artifact_dir = os.path.join(base_dir, ARTIFACT_DIR)
+    if backend == 'compiled' and artifact_exists(artifact_dir):
+        return (('artifact', current_version_dir(artifact_dir)),)
+
+    signature = []
+    for file_name in ARTIFACT_FILES.values():
+        stat = os.stat(os.path.join(base_dir, file_name))
+        signature.append((file_name, stat.st_size, stat.st_mtime_ns))
+    return tuple(signature)
+
+
+def model_version(base_dir='.', backend=DEFAULT_BACKEND):
+    """
+    Identifiant court des modèles servis : nom de la version de l'artefact,
+    ou empreinte de la signature des fichiers .pkl
+    """
+    signature = artifact_signature(base_dir, backend)
+    if signature[0][0] == 'artifact':
+        return os.path.basename(signature[0][1])
+    return 'pkl-' + hashlib.sha1(repr(signature).encode('utf-8')).hexdigest()[:16]
+
+
+def _load_bundle(base_dir, backend):
+    artifact_dir = os.path.join(base_dir, ARTIFACT_DIR)
+    if backend == 'compiled' and artifact_exists(artifact_dir):
+        return ModelBundle(*load_artifact(artifact_dir))
+    # joblib (et scikit-learn au dépickling) ne sont chargés que sans artefact
+    import joblib
+
+    bundle = ModelBundle(**{
+        key: joblib.load(os.path.join(base_dir, file_name))
+        for key, file_name in ARTIFACT_FILES.items()
+    })
+    if backend == 'compiled':
+        # Standardisation repliée dans les seuils des forêts compilées
+        bundle = bundle._replace(
+            models={target: compile_forest(model, bundle.scalers.get(target)) for target, model in bundle.models.items()},
+            scalers={target: IdentityScaling() for target in bundle.scalers},
+        )
+    return bundle
+
+
+def get_model_bundle(base_dir='.', backend=DEFAULT_BACKEND):
+    """
+    Retourne les artefacts entraînés, chargés une seule fois par processus
+
+    `backend` choisit le moteur de prédiction ('compiled' ou 'sklearn').
+    Le chargement est protégé par un verrou : plusieurs sessions qui
+    demandent les modèles en même temps déclenchent un seul chargement.
+    """
+    if backend not in BACKENDS:
+        raise ValueError(f"Moteur de prédiction inconnu: {backend} (choix: {', '.join(BACKENDS)})")
+    start = time.perf_counter()
+    key = (os.path.abspath(base_dir), backend)
+    signature = artifact_signature(base_dir, backend)
+
+    cached = _bundles.get(key)
+    if cached is not None and cached[0] == signature:
+        with _lock:
+            _metrics['warm_hits'] += 1
+            _metrics['last_warm_lookup_seconds'] = time.perf_counter() - start
+        return cached[1]
+
+    with _lock:
+        # Un autre thread a pu charger les modèles pendant l'attente du verrou
+        cached = _bundles.get(key)
+        if cached is not None and cached[0] == signature:
+            _metrics['warm_hits'] += 1
+            _metrics['last_warm_lookup_seconds'] = time.perf_counter() - start
+            return cached[1]
+
+        bundle = _load_bundle(base_dir, backend)
+        elapsed = time.perf_counter() - start
+        _bundles[key] = (signature, bundle)
+        _metrics['cold_loads'] += 1
+        _metrics['last_cold_load_seconds'] = elapsed
+        _metrics['total_cold_load_seconds'] += elapsed
+        _metrics['loaded_at'] = time.time()
+        _metrics['source'] = 'artifact' if signature[0][0] == 'artifact' else 'pickle'
+        _metrics['backend'] = backend
+        stage_timing.observe('chargement_modeles', elapsed)
+        return bundle
+
+
+def clear_model_cache():
+    """
+    Vide le cache (le prochain appel rechargera les artefacts)
+    """
+    with _lock:
+        _bundles.clear()
+
+
+def load_metrics():
+    """
+    Retourne une copie des métriques de chargement (froid / chaud)
+    """
+    with _lock:
+        return dict(_metrics)
@@ -0,0 +1,359 @@
+#!/usr/bin/env python3
+"""
+Recherche des patients les plus proches dans la cohorte d'entraînement
+
+L'index est construit sur la matrice encodée de l'entraînement
+(`glioma_analysis_simple.encode_categorical_data`) et publié dans la
+version de l'artefact des modèles (`glioma_artifact/v-<empreinte>/`,
+fichier `glioma_neighbors.npz`) : il ne peut pas diverger des modèles et
+des encodeurs avec lesquels il a été construit. La distance est celle de
+Gower :
+- features catégorielles : 0 si les catégories sont égales, 1 sinon ;
+- âge : écart absolu divisé par l'étendue des âges de la cohorte ;
+moyennée, pour chaque paire (requête, patient), sur les seules features
+renseignées des deux côtés. Une valeur manquante ('Unknown' à
+l'entraînement), une catégorie inconnue de l'index ou une colonne absente
+de la requête est codée -1 et ne compte ni au numérateur ni au
+dénominateur.
+
+Les catégories sont stockées en one-hot (float32) : le nombre de
+catégories communes et le nombre de features renseignées des deux côtés,
+entre un bloc de requêtes et toute la cohorte, sont deux produits
+matriciels. Les k plus proches sont extraits avec `np.argpartition`.
+
+Usage (voisins d'un patient de la cohorte, depuis l'artefact publié) :
+    python patient_neighbors.py [--patient PatientID_0003] [--k 5]
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import threading
+
+import numpy as np
+
+from cohort_schema import label_text
+from model_artifact import ARTIFACT_DIR, NEIGHBORS_FILE, LabelEncoding, current_version_dir
+
+NEIGHBORS_FORMAT_VERSION = 1
+
+# Features comparées par écart numérique (les autres sont catégorielles)
+NUMERIC_FEATURES = ('Age at diagnosis',)
+
+# Libellé des valeurs manquantes à l'entraînement
+MISSING_LABEL = label_text(None)
+
+DEFAULT_K = 5
+
+# Distances calculées par bloc de requêtes (requêtes x patients, ~32 Mo en float64)
+QUERY_BLOCK_CELLS = 4000000
+
+_lock = threading.Lock()
+_indexes = {}   # chemin -> index (chaque version de l'artefact est immuable)
+
+
+def _numeric_column(values):
+    import pandas as pd
+
+    return pd.to_numeric(pd.Series(np.asarray(values, dtype=object)), errors='coerce').to_numpy(dtype=np.float64)
+
+
+class NeighborIndex:
+    """
+    Index des plus proches voisins (distance de Gower) de la cohorte
+
+    `codes` : codes des features catégorielles (n_patients, n_catégorielles),
+    -1 si la valeur manque ; `numeric` : valeurs des features numériques
+    (NaN si manquantes) ; `categories` : libellés des classes de chaque
+    feature catégorielle ; `outcomes` : {cible: issue observée par patient}.
+    """
+
+    def __init__(self, feature_names, categories, codes, numeric, case_ids, outcomes):
+        self.feature_names = list(feature_names)
+        self.numeric_features = [name for name in self.feature_names if name in NUMERIC_FEATURES]
+        self.categorical_features = [name for name in self.feature_names if name not in NUMERIC_FEATURES]
+        self.categories = {name: list(categories[name]) for name in self.categorical_features}
+        self.numeric = np.asarray(numeric, dtype=np.float64).reshape(-1, len(self.numeric_features))
+        self.case_ids = np.asarray(case_ids).astype(str)
+        self.outcomes = {target: np.asarray(labels).astype(str) for target, labels in outcomes.items()}
+
+        # La classe 'Unknown' de l'entraînement est une valeur manquante
+        codes = np.asarray(codes, dtype=np.int32).reshape(-1, len(self.categorical_features))
+        missing = np.array([self.categories[name].index(MISSING_LABEL) if MISSING_LABEL in self.categories[name]
+                            else -1 for name in self.categorical_features], dtype=np.int32)
+        self.codes = np.where((codes == missing) | (codes < 0), -1, codes).astype(np.int32)
+        self._encoders = {name: LabelEncoding(np.array(self.categories[name], dtype=str))
+                          for name in self.categorical_features}
+
+        # Étendue de chaque feature numérique (1 si constante)
+        with np.errstate(invalid='ignore'):
+            spans = np.nanmax(self.numeric, axis=0) - np.nanmin(self.numeric, axis=0) if len(self.numeric) else []
+        self.spans = np.where(np.isfinite(spans) & (np.asarray(spans) > 0), spans, 1.0)
+
+        sizes = [len(self.categories[name]) for name in self.categorical_features]
+        self.offsets = np.concatenate([[0], np.cumsum(sizes)[:-1]]).astype(np.intp) if sizes else np.zeros(0, np.intp)
+        self.sizes = np.asarray(sizes, dtype=np.intp)
+        self.one_hot = self._one_hot(self.codes)
+        self.present = (self.codes >= 0).astype(np.float32)
+        self._complete = bool(self.present.all() and not np.isnan(self.numeric).any())
+
+    def __len__(self):
+        return len(self.case_ids)
+
+    def _one_hot(self, codes):
+        """
+        Matrice one-hot (float32) ; un code manquant (-1) ne correspond à
+        aucune catégorie
+        """
+        one_hot = np.zeros((len(codes), int(self.sizes.sum())), dtype=np.float32)
+        rows, features = np.nonzero((codes >= 0) & (codes < self.sizes))
+        one_hot[rows, self.offsets[features] + codes[rows, features]] = 1.0
+        return one_hot
+
+    @classmethod
+    def build(cls, X_data, X_encoded, feature_names, feature_encoders, y_encoded, target_encoders, case_ids):
+        """
+        Construit l'index à partir des données d'entraînement : valeurs
+        brutes (X_data, pour les features numériques), matrice encodée,
+        encodeurs et cibles encodées
+        """
+        feature_names = list(feature_names)
+        categorical = [j for j, name in enumerate(feature_names) if name not in NUMERIC_FEATURES]
+        numeric = [j for j, name in enumerate(feature_names) if name in NUMERIC_FEATURES]
+        X_data = np.asarray(X_data, dtype=object)
+        categories = {feature_names[j]: [str(label) for label in feature_encoders[feature_names[j]].classes_]
+                      for j in categorical}
+        outcomes = {target: np.asarray(target_encoders[target].classes_)[codes]
+                    for target, codes in y_encoded.items()}
+        numeric_values = (np.column_stack([_numeric_column(X_data[:, j]) for j in numeric]) if numeric
+                          else np.empty((len(X_data), 0)))
+        return cls(feature_names, categories, np.asarray(X_encoded)[:, categorical], numeric_values,
+                   case_ids, outcomes)
+
+    def encode_records(self, df):
+        """
+        Codes et valeurs numériques d'une table de patients, sur les
+        catégories de l'index : colonne absente, valeur manquante ou
+        catégorie inconnue -> -1 (feature ignorée pour cette requête)
+        """
+        import pandas as pd
+        from glioma_inference import encode_column
+
+        codes = np.full((len(df), len(self.categorical_features)), -1, dtype=np.int32)
+        for j, name in enumerate(self.categorical_features):
+            if name not in df.columns:
+                continue
+            values = df[name] if isinstance(df[name].dtype, pd.CategoricalDtype) else df[name].to_numpy(dtype=object)
+            codes[:, j] = encode_column(values, self._encoders[name], unknown=-1)
+            if MISSING_LABEL in self.categories[name]:
+                codes[codes[:, j] == self.categories[name].index(MISSING_LABEL), j] = -1
+        numeric = np.column_stack([
+            _numeric_column(df[name]) if name in df.columns else np.full(len(df), np.nan)
+            for name in self.numeric_features
+        ]) if self.numeric_features else np.empty((len(df), 0))
+        return codes, numeric
+
+    def distances(self, codes, numeric):
+        """
+        Distances de Gower entre des requêtes et tous les patients de l'index
+        (1 si aucune feature n'est renseignée des deux côtés)
+        """
+        codes = np.asarray(codes, dtype=np.int32).reshape(-1, len(self.categorical_features))
+        numeric = np.asarray(numeric, dtype=np.float64).reshape(-1, len(self.numeric_features))
+        common = self._one_hot(codes) @ self.one_hot.T
+        gap = np.empty(common.shape, dtype=np.float64)
+
+        # Cas courant (aucune valeur manquante) : même poids partout, calcul en place
+        if self._complete and (codes >= 0).all() and not np.isnan(numeric).any():
+            total = np.subtract(len(self.categorical_features), common, dtype=np.float64)
+            for j in range(len(self.numeric_features)):
+                np.subtract(numeric[:, j, None], self.numeric[None, :, j], out=gap)
+                np.abs(gap, out=gap)
+                gap /= self.spans[j]
+                total += gap
+            total /= max(len(self.feature_names), 1)
+            return total
+
+        # Catégories différentes = features renseignées des deux côtés - catégories communes
+        weights = ((codes >= 0).astype(np.float32) @ self.present.T).astype(np.float64)
+        total = weights - common
+        for j in range(len(self.numeric_features)):
+            np.subtract(numeric[:, j, None], self.numeric[None, :, j], out=gap)
+            np.abs(gap, out=gap)
+            gap /= self.spans[j]
+            present = ~np.isnan(gap)
+            total += np.where(present, gap, 0.0)
+            weights += present
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return np.where(weights > 0, total / weights, 1.0)
+
+    def search(self, codes, numeric, k=DEFAULT_K, chunk_size=None):
+        """
+        k plus proches patients de chaque requête
+
+        Retourne (indices, distances), de forme (n_requêtes, k), triés par
+        distance croissante.
+        """
+        codes = np.asarray(codes, dtype=np.int32).reshape(-1, len(self.categorical_features))
+        numeric = np.asarray(numeric, dtype=np.float64).reshape(-1, len(self.numeric_features))
+        k = min(k, len(self))
+        chunk_size = chunk_size or max(1, QUERY_BLOCK_CELLS // max(len(self), 1))
+        indices = np.empty((len(codes), k), dtype=np.intp)
+        distances = np.empty((len(codes), k), dtype=np.float64)
+        for start in range(0, len(codes), chunk_size):
+            block = self.distances(codes[start:start + chunk_size], numeric[start:start + chunk_size])
+            nearest = np.argpartition(block, k - 1, axis=1)[:, :k] if k < len(self) else np.tile(
+                np.arange(len(self)), (len(block), 1))
+            nearest_distances = np.take_along_axis(block, nearest, axis=1)
+            order = np.lexsort((nearest, nearest_distances), axis=1)
+            indices[start:start + chunk_size] = np.take_along_axis(nearest, order, axis=1)
+            distances[start:start + chunk_size] = np.take_along_axis(nearest_distances, order, axis=1)
+        return indices, distances
+
+    def search_records(self, df, k=DEFAULT_K):
+        """
+        k plus proches patients de chaque ligne d'une table (ou d'un
+        dictionnaire de saisie)
+        """
+        import pandas as pd
+
+        if isinstance(df, dict):
+            df = pd.DataFrame([df])
+        return self.search(*self.encode_records(df), k=k)
+
+    def neighbors_frame(self, indices, distances, features=None):
+        """
+        Table des voisins d'une requête : identifiant, similarité (1 -
+        distance), features choisies et issues observées
+        """
+        import pandas as pd
+
+        table = {'Patient': self.case_ids[indices], 'Similarité': np.round(1.0 - distances, 3)}
+        for name in features or self.feature_names:
+            if name in self.categories:
+                # Le code -1 (valeur manquante) désigne la dernière entrée
+                labels = np.array(self.categories[name] + [MISSING_LABEL], dtype=object)
+                table[name] = labels[self.codes[indices, self.categorical_features.index(name)]]
+            elif name in self.numeric_features:
+                table[name] = self.numeric[indices, self.numeric_features.index(name)]
+        for target, labels in self.outcomes.items():
+            # Une cible peut aussi être une feature (grade) : colonne distincte
+            table[f'{target} (observé)' if target in table else target] = labels[indices]
+        return pd.DataFrame(table)
+
+    def _arrays(self):
+        meta = {
+            'version': NEIGHBORS_FORMAT_VERSION,
+            'feature_names': self.feature_names,
+            'categories': self.categories,
+            'targets': list(self.outcomes),
+        }
+        arrays = {'meta': np.array(json.dumps(meta, sort_keys=True)), 'codes': self.codes,
+                  'numeric': self.numeric, 'case_ids': self.case_ids}
+        arrays.update({f"outcome_{t}": labels for t, labels in enumerate(self.outcomes.values())})
+        return arrays
+
+    def fingerprint(self):
+        """
+        Empreinte SHA-256 du contenu de l'index (indépendante du fichier)
+        """
+        digest = hashlib.sha256()
+        for name, array in self._arrays().items():
+            digest.update(name.encode('utf-8'))
+            digest.update(np.ascontiguousarray(array).tobytes())
+        return digest.hexdigest()
+
+    def save(self, path):
+        """
+        Enregistre l'index (remplacement atomique)
+        """
+        tmp_path = f"{path}.{os.getpid()}.tmp.npz"
+        np.savez(tmp_path, **self._arrays())
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            meta = json.loads(str(data['meta']))
+            if meta['version'] != NEIGHBORS_FORMAT_VERSION:
+                raise ValueError(f"Version d'index non supportée: {meta['version']}")
+            outcomes = {target: data[f"outcome_{t}"] for t, target in enumerate(meta['targets'])}
+            return cls(meta['feature_names'], meta['categories'], data['codes'], data['numeric'],
+                       data['case_ids'], outcomes)
+
+
+def build_cohort_index():
+    """
+    Construit l'index depuis le classeur, avec les mêmes lignes et les mêmes
+    encodeurs que l'entraînement (`glioma_analysis_simple`)
+
+    Retourne (index, feature_encoders).
+    """
+    from glioma_analysis_simple import encode_categorical_data, load_data, prepare_features
+
+    data, headers = load_data()
+    X_data, y_data, feature_names, target_names, patient_ids = prepare_features(data, headers, return_ids=True)
+    X_encoded, y_encoded, feature_encoders, target_encoders = encode_categorical_data(
+        X_data, y_data, feature_names, target_names
+    )
+    index = NeighborIndex.build(X_data, X_encoded, feature_names, feature_encoders, y_encoded, target_encoders,
+                                patient_ids)
+    return index, feature_encoders
+
+
+def get_neighbor_index(base_dir='.'):
+    """
+    Index des voisins de la version active de l'artefact, chargé une seule
+    fois par version ; None si l'artefact ne contient pas d'index
+    """
+    version_dir = current_version_dir(os.path.join(base_dir, ARTIFACT_DIR))
+    if version_dir is None:
+        return None
+    path = os.path.abspath(os.path.join(version_dir, NEIGHBORS_FILE))
+    index = _indexes.get(path)
+    if index is not None:
+        return index
+    with _lock:
+        if path not in _indexes:
+            if not os.path.exists(path):
+                return None
+            _indexes[path] = NeighborIndex.load(path)
+        return _indexes[path]
+
+
+def add_neighbor_columns(df, index, k=3):
+    """
+    Copie d'une table de patients avec, pour chaque ligne, les identifiants
+    des k patients les plus proches de la cohorte et leur similarité
+    """
+    indices, distances = index.search_records(df, k)
+    result = df.copy()
+    result['Patients similaires'] = [', '.join(ids) for ids in index.case_ids[indices]]
+    result['Similarité (plus proche)'] = np.round(1.0 - distances[:, 0], 3)
+    for target, labels in index.outcomes.items():
+        result[f'{target} - cas similaires'] = [', '.join(row) for row in labels[indices]]
+    return result
+
+
+def main():
+    """
+    Affiche les voisins d'un patient de la cohorte (index de l'artefact publié)
+    """
+    parser = argparse.ArgumentParser(description="Patients similaires de la cohorte")
+    parser.add_argument('--patient', default=None, help="Identifiant du patient (défaut: le premier)")
+    parser.add_argument('--k', type=int, default=DEFAULT_K)
+    args = parser.parse_args()
+
+    index = get_neighbor_index()
+    if index is None:
+        print("❌ Aucun index dans l'artefact publié : lancez python model_artifact.py")
+        return
+    row = 0 if args.patient is None else int(np.flatnonzero(index.case_ids == args.patient)[0])
+    indices, distances = index.search(index.codes[row], index.numeric[row], args.k)
+    print(f"👥 Patients les plus proches de {index.case_ids[row]} ({len(index)} patients indexés):")
+    print(index.neighbors_frame(indices[0], distances[0]).to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,341 @@
+#!/usr/bin/env python3
+"""
+Service HTTP/JSON de prédiction des gliomes (bibliothèque standard, asyncio)
+
+Le service charge les mêmes artefacts que les applications
+(`model_bundle.get_model_bundle`) et encode les patients dans l'ordre de
+`glioma_feature_names.pkl`. Les requêtes concurrentes sont regroupées en
+petits lots : le premier patient reçu ouvre une fenêtre de
+`batch_window_ms` millisecondes, pendant laquelle les patients suivants
+rejoignent le lot (au plus `max_batch_size`), puis les forêts sont
+évaluées une seule fois pour tout le lot, dans un thread, sans bloquer la
+réception des requêtes. Les patients arrivés pendant l'évaluation d'un lot
+forment le lot suivant : avec la fenêtre par défaut (0 ms), la taille des
+lots s'adapte donc seule à la charge ; une fenêtre positive échange de la
+latence contre des lots plus grands.
+
+Points d'accès :
+    POST /predict   {"Sex at Birth": "Male", ...}  ou  {"patients": [{...}, ...]}
+    GET  /health    état, version des modèles, ordre des features
+    GET  /metrics   latence p50 / p99, taille des lots, cache de prédictions
+
+Usage:
+    python prediction_service.py [--port 8600] [--batch-window-ms 0] [--max-batch-size 64] [--cache-size 4096]
+"""
+
+import argparse
+import asyncio
+import json
+import time
+from collections import deque
+
+import numpy as np
+
+from glioma_inference import DEFAULT_CACHE_SIZE, PredictionCache, encode_features, predict_matrix, predictions_from_results
+from model_bundle import BACKENDS, DEFAULT_BACKEND, get_model_bundle, model_version
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8600
+DEFAULT_BATCH_WINDOW_MS = 0.0
+DEFAULT_MAX_BATCH_SIZE = 64
+
+# Taille maximale d'un corps de requête et nombre de mesures conservées
+MAX_BODY_BYTES = 1 << 20
+STATS_WINDOW = 10000
+
+_REASONS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed',
+            413: 'Payload Too Large', 500: 'Internal Server Error'}
+
+
+def prediction_to_json(predictions):
+    """
+    Convertit {cible: Prediction} en dictionnaire sérialisable en JSON
+    """
+    return {
+        target: {
+            'value': prediction.value.item() if hasattr(prediction.value, 'item') else prediction.value,
+            'label': prediction.label,
+            'confidence': float(prediction.confidence),
+            'probabilities': {label: float(p) for label, p in zip(prediction.class_labels,
+                                                                   prediction.probabilities)},
+        }
+        for target, prediction in predictions.items()
+    }
+
+
+class MicroBatcher:
+    """
+    Regroupe les vecteurs de features reçus pendant une fenêtre de temps et
+    les prédit en un seul appel à `predict_matrix`
+    """
+
+    def __init__(self, bundle, batch_window=DEFAULT_BATCH_WINDOW_MS / 1000, max_batch_size=DEFAULT_MAX_BATCH_SIZE):
+        self.bundle = bundle
+        self.batch_window = batch_window
+        self.max_batch_size = max_batch_size
+        self.batch_sizes = deque(maxlen=STATS_WINDOW)
+        self.n_batches = 0
+        self._queue = asyncio.Queue()
+        self._task = None
+
+    def start(self):
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    async def predict(self, features):
+        """
+        Prédit un patient (vecteur encodé) ; retourne {cible: Prediction}
+        """
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((features, future))
+        return await future
+
+    async def _collect(self):
+        batch = [await self._queue.get()]
+        deadline = time.perf_counter() + self.batch_window
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                # Prendre sans attendre ce qui est déjà arrivé
+                while len(batch) < self.max_batch_size and not self._queue.empty():
+                    batch.append(self._queue.get_nowait())
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        models, scalers, _, target_encoders, _ = self.bundle
+        while True:
+            batch = await self._collect()
+            X = np.array([features for features, _ in batch], dtype=np.float64)
+            try:
+                results = await loop.run_in_executor(None, predict_matrix, models, scalers, X, None, len(batch))
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            self.n_batches += 1
+            self.batch_sizes.append(len(batch))
+            for row, (_, future) in enumerate(batch):
+                if not future.done():
+                    future.set_result(predictions_from_results(results, models, target_encoders, row))
+
+
+class PredictionService:
+    """
+    Serveur HTTP/1.1 minimal (connexions persistantes) devant un MicroBatcher
+    """
+
+    def __init__(self, bundle, version, batch_window=DEFAULT_BATCH_WINDOW_MS / 1000,
+                 max_batch_size=DEFAULT_MAX_BATCH_SIZE, cache=None):
+        self.bundle = bundle
+        self.version = version
+        self.batcher = MicroBatcher(bundle, batch_window, max_batch_size)
+        self.cache = cache
+        self.latencies = deque(maxlen=STATS_WINDOW)
+        self.n_requests = 0
+        self.n_errors = 0
+        self.started_at = time.time()
+
+    async def predict_patients(self, patients):
+        """
+        Encode et prédit une liste de patients (dictionnaires de saisie)
+        """
+        _, _, feature_encoders, _, feature_names = self.bundle
+        vectors = [encode_features(patient, feature_names, feature_encoders) for patient in patients]
+        predictions = await asyncio.gather(*(self._predict_vector(vector) for vector in vectors))
+        return [prediction_to_json(prediction) for prediction in predictions]
+
+    async def _predict_vector(self, vector):
+        # Les vecteurs déjà vus ne passent pas par les lots
+        if self.cache is None:
+            return await self.batcher.predict(vector)
+        key = self.cache.key(self.version, vector)
+        prediction = self.cache.get(key)
+        if prediction is None:
+            prediction = await self.batcher.predict(vector)
+            self.cache.put(key, prediction)
+        return prediction
+
+    def metrics(self):
+        """
+        Statistiques du service (latences en millisecondes)
+        """
+        latencies = np.array(self.latencies, dtype=np.float64) * 1000
+        batch_sizes = np.array(self.batcher.batch_sizes, dtype=np.float64)
+        return {
+            'model_version': self.version,
+            'requests': self.n_requests,
+            'errors': self.n_errors,
+            'uptime_seconds': time.time() - self.started_at,
+            'latency_ms': {
+                'p50': float(np.percentile(latencies, 50)) if len(latencies) else None,
+                'p99': float(np.percentile(latencies, 99)) if len(latencies) else None,
+                'max': float(latencies.max()) if len(latencies) else None,
+            },
+            'batches': self.batcher.n_batches,
+            'batch_size': {
+                'mean': float(batch_sizes.mean()) if len(batch_sizes) else None,
+                'p50': float(np.percentile(batch_sizes, 50)) if len(batch_sizes) else None,
+                'max': int(batch_sizes.max()) if len(batch_sizes) else None,
+            },
+            'batch_window_ms': self.batcher.batch_window * 1000,
+            'max_batch_size': self.batcher.max_batch_size,
+            'cache': self.cache.stats() if self.cache is not None else None,
+        }
+
+    async def route(self, method, path, body):
+        """
+        Retourne (code HTTP, réponse JSON) pour une requête
+        """
+        path = path.split('?', 1)[0]
+        if path == '/health':
+            if method != 'GET':
+                return 405, {'error': "Méthode non autorisée"}
+            return 200, {'status': 'ok', 'model_version': self.version,
+                         'feature_names': list(self.bundle.feature_names)}
+        if path == '/metrics':
+            if method != 'GET':
+                return 405, {'error': "Méthode non autorisée"}
+            return 200, self.metrics()
+        if path != '/predict':
+            return 404, {'error': f"Chemin inconnu: {path}"}
+        if method != 'POST':
+            return 405, {'error': "Méthode non autorisée"}
+
+        try:
+            payload = json.loads(body or b'null')
+        except ValueError as e:
+            return 400, {'error': f"JSON invalide: {e}"}
+        if isinstance(payload, dict) and 'patients' in payload:
+            patients = payload['patients']
+            if not isinstance(patients, list) or not all(isinstance(p, dict) for p in patients):
+                return 400, {'error': "'patients' doit être une liste d'objets"}
+            return 200, {'model_version': self.version, 'predictions': await self.predict_patients(patients)}
+        if not isinstance(payload, dict):
+            return 400, {'error': "Le corps doit être un objet JSON (un patient) ou {\"patients\": [...]}"}
+        predictions = await self.predict_patients([payload])
+        return 200, {'model_version': self.version, 'prediction': predictions[0]}
+
+    async def handle(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                start = time.perf_counter()
+                try:
+                    method, path, version = request_line.decode('latin-1').split()
+                except ValueError:
+                    method, path, version = None, '', None
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+
+                try:
+                    length = int(headers.get('content-length', 0))
+                except ValueError:
+                    length = -1
+                keep_alive = version == 'HTTP/1.1' and headers.get('connection', '').lower() != 'close'
+                if method is None or length < 0:
+                    # Ligne de requête ou longueur invalide : réponse, puis fermeture
+                    status, payload, keep_alive = 400, {'error': "Requête HTTP invalide"}, False
+                elif length > MAX_BODY_BYTES:
+                    status, payload, keep_alive = 413, {'error': "Corps de requête trop volumineux"}, False
+                else:
+                    body = await reader.readexactly(length) if length else b''
+                    try:
+                        status, payload = await self.route(method, path, body)
+                    except Exception as e:
+                        status, payload = 500, {'error': str(e)}
+
+                data = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+                writer.write((f"HTTP/1.1 {status} {_REASONS[status]}\r\n"
+                              f"Content-Type: application/json; charset=utf-8\r\n"
+                              f"Content-Length: {len(data)}\r\n"
+                              f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n").encode('latin-1') + data)
+                await writer.drain()
+
+                if path.startswith('/predict'):
+                    self.n_requests += 1
+                    if status == 200:
+                        self.latencies.append(time.perf_counter() - start)
+                    else:
+                        self.n_errors += 1
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, host=DEFAULT_HOST, port=DEFAULT_PORT, ready=None):
+        """
+        Démarre le serveur ; `ready(port)` est appelé une fois qu'il écoute
+        """
+        self.batcher.start()
+        server = await asyncio.start_server(self.handle, host, port)
+        try:
+            if ready is not None:
+                ready(server.sockets[0].getsockname()[1])
+            async with server:
+                await server.serve_forever()
+        finally:
+            await self.batcher.stop()
+
+
+def create_service(model_dir='.', backend=DEFAULT_BACKEND, batch_window_ms=DEFAULT_BATCH_WINDOW_MS,
+                   max_batch_size=DEFAULT_MAX_BATCH_SIZE, cache_size=DEFAULT_CACHE_SIZE):
+    """
+    Crée le service à partir des artefacts entraînés de model_dir
+    (cache_size=0 : sans cache de prédictions)
+    """
+    bundle = get_model_bundle(model_dir, backend)
+    cache = PredictionCache(cache_size) if cache_size > 0 else None
+    return PredictionService(bundle, model_version(model_dir, backend), batch_window_ms / 1000, max_batch_size,
+                             cache)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Service HTTP/JSON de prédiction des gliomes")
+    parser.add_argument('--host', default=DEFAULT_HOST, help=f"Adresse d'écoute (défaut: {DEFAULT_HOST})")
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT, help=f"Port (défaut: {DEFAULT_PORT})")
+    parser.add_argument('--model-dir', default='.',
+                        help="Dossier des modèles entraînés (défaut: dossier courant)")
+    parser.add_argument('--backend', choices=BACKENDS, default=DEFAULT_BACKEND,
+                        help=f"Moteur de prédiction (défaut: {DEFAULT_BACKEND})")
+    parser.add_argument('--batch-window-ms', type=float, default=DEFAULT_BATCH_WINDOW_MS,
+                        help=f"Fenêtre de regroupement des requêtes en ms (défaut: {DEFAULT_BATCH_WINDOW_MS})")
+    parser.add_argument('--max-batch-size', type=int, default=DEFAULT_MAX_BATCH_SIZE,
+                        help=f"Patients par lot au maximum (défaut: {DEFAULT_MAX_BATCH_SIZE})")
+    parser.add_argument('--cache-size', type=int, default=DEFAULT_CACHE_SIZE,
+                        help=f"Vecteurs gardés par le cache de prédictions, 0 = sans cache (défaut: {DEFAULT_CACHE_SIZE})")
+    args = parser.parse_args()
+
+    service = create_service(args.model_dir, args.backend, args.batch_window_ms, args.max_batch_size,
+                             args.cache_size)
+    ready = lambda port: print(f"🚀 Service de prédiction (modèles {service.version}) sur http://{args.host}:{port}")
+    try:
+        asyncio.run(service.serve(args.host, args.port, ready))
+    except KeyboardInterrupt:
+        print("\n🛑 Service arrêté")
+
+
+if __name__ == "__main__":
+    main()
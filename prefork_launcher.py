@@ -0,0 +1,316 @@
+#!/usr/bin/env python3
+"""
+Lancement de plusieurs processus Streamlit qui partagent les modèles
+
+Le processus parent importe Streamlit et l'application, charge les modèles
+(`model_bundle.get_model_bundle`), puis crée N workers par `fork`, chacun
+servant l'application sur son propre port (port, port + 1, ...). Les
+workers héritent des modules importés et des modèles déjà chargés : ces
+pages mémoire sont partagées en copie sur écriture au lieu d'être
+dupliquées par chaque processus. `gc.freeze()` évite que le ramasse-miettes
+des workers ne réécrive les objets hérités (et ne copie leurs pages).
+Un worker qui s'arrête après avoir servi est recréé par le parent.
+
+Le cache de prédictions (`prediction_cache`) reste propre à chaque worker.
+Streamlit garde une session par connexion websocket : devant un répartiteur
+de charge local, activer l'affinité de session (ex. `ip_hash` avec nginx).
+
+`report` compare la mémoire résidente (RSS) et proportionnelle (PSS, pages
+partagées divisées entre les processus) de N processus indépendants, comme
+aujourd'hui, et de N workers pré-forkés (Linux : /proc/<pid>/smaps_rollup).
+
+Usage:
+    python prefork_launcher.py serve [--workers 4] [--port 8501] [--app glioma_prediction_app.py]
+    python prefork_launcher.py report [--workers 4] [--port 8601]
+"""
+
+import argparse
+import gc
+import os
+import signal
+import subprocess
+import sys
+import time
+import urllib.request
+
+DEFAULT_APP = 'glioma_prediction_app.py'
+DEFAULT_WORKERS = 4
+DEFAULT_PORT = 8501
+READY_TIMEOUT_SECONDS = 120.0
+
+# Un worker arrêté plus tôt (ex. port déjà pris) n'est pas recréé
+MIN_UPTIME_SECONDS = 5.0
+
+_MEMORY_FIELDS = ('Rss', 'Pss', 'Shared_Clean', 'Shared_Dirty', 'Private_Clean', 'Private_Dirty')
+
+
+def preload(app_file, backend=None, model_dir='.'):
+    """
+    Importe Streamlit et le module de l'application, puis charge les modèles
+    (backend=None : moteur par défaut de model_bundle)
+    """
+    import importlib
+
+    from streamlit.web import bootstrap  # noqa: F401 (importé avant le fork)
+    from model_bundle import DEFAULT_BACKEND, get_model_bundle
+
+    sys.path.insert(0, os.path.dirname(os.path.abspath(app_file)))
+    importlib.import_module(os.path.splitext(os.path.basename(app_file))[0])
+    get_model_bundle(model_dir, backend or DEFAULT_BACKEND)
+
+
+def serve_app(app_file, port):
+    """
+    Sert l'application Streamlit sur `port` (bloquant)
+    """
+    from streamlit.web import bootstrap
+
+    flag_options = {'server_port': port, 'server_headless': True}
+    bootstrap.load_config_options(flag_options=flag_options)
+    bootstrap.run(os.path.abspath(app_file), False, [], flag_options)
+
+
+def _fork_worker(app_file, port):
+    pid = os.fork()
+    if pid:
+        return pid
+    # Worker : signaux par défaut (Streamlit installe ensuite les siens)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.default_int_handler)
+    code = 0
+    try:
+        serve_app(app_file, port)
+    except BaseException:
+        code = 1
+    finally:
+        os._exit(code)
+
+
+def _stop(signum, frame):
+    raise SystemExit(0)
+
+
+def stop_workers(workers):
+    """
+    Arrête les workers {pid: port} et attend leur fin
+    """
+    for pid in workers:
+        try:
+            os.kill(pid, signal.SIGTERM)
+        except ProcessLookupError:
+            pass
+    for pid in workers:
+        try:
+            os.waitpid(pid, 0)
+        except ChildProcessError:
+            pass
+
+
+def run_prefork(app_file=DEFAULT_APP, n_workers=DEFAULT_WORKERS, port=DEFAULT_PORT, backend=None, model_dir='.'):
+    """
+    Charge les modèles une fois, crée les workers et les supervise
+    jusqu'à Ctrl+C (ou SIGTERM)
+    """
+    start = time.perf_counter()
+    preload(app_file, backend, model_dir)
+    print(f"📦 Modèles et modules chargés en {time.perf_counter() - start:.2f} s (processus parent {os.getpid()})")
+
+    # Les objets hérités ne sont plus parcourus par le ramasse-miettes
+    gc.collect()
+    gc.freeze()
+
+    signal.signal(signal.SIGTERM, _stop)
+    workers = {}
+    started = {}
+    try:
+        for i in range(n_workers):
+            pid = _fork_worker(app_file, port + i)
+            workers[pid] = port + i
+            started[pid] = time.monotonic()
+            print(f"🚀 Worker {pid} : http://localhost:{port + i}")
+        print("🛑 Appuyez sur Ctrl+C pour arrêter")
+
+        while workers:
+            pid, status = os.wait()
+            worker_port = workers.pop(pid, None)
+            if worker_port is None:
+                continue
+            uptime = time.monotonic() - started.pop(pid)
+            print(f"⚠️ Worker {pid} (port {worker_port}) arrêté (code {os.waitstatus_to_exitcode(status)})")
+            if uptime >= MIN_UPTIME_SECONDS:
+                pid = _fork_worker(app_file, worker_port)
+                workers[pid] = worker_port
+                started[pid] = time.monotonic()
+                print(f"🔄 Worker {pid} recréé : http://localhost:{worker_port}")
+    except (KeyboardInterrupt, SystemExit):
+        print("\n🛑 Arrêt des workers...")
+    finally:
+        stop_workers(workers)
+
+
+def memory_usage(pid):
+    """
+    Mémoire d'un processus en octets : Rss, Pss, pages partagées et privées
+    """
+    usage = dict.fromkeys(_MEMORY_FIELDS, 0)
+    try:
+        with open(f'/proc/{pid}/smaps_rollup') as f:
+            for line in f:
+                field, _, value = line.partition(':')
+                if field in usage:
+                    usage[field] = int(value.split()[0]) * 1024
+    except FileNotFoundError:
+        # Noyau sans smaps_rollup : seule la mémoire résidente est connue
+        with open(f'/proc/{pid}/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    usage['Rss'] = usage['Pss'] = int(line.split()[1]) * 1024
+    return usage
+
+
+def child_pids(pid):
+    """
+    Processus enfants directs de `pid`
+    """
+    children = []
+    for entry in os.listdir('/proc'):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f'/proc/{entry}/stat') as f:
+                stat = f.read()
+        except OSError:
+            continue
+        # Le nom du processus (entre parenthèses) peut contenir des espaces
+        if int(stat.rpartition(')')[2].split()[1]) == pid:
+            children.append(int(entry))
+    return sorted(children)
+
+
+def wait_ready(ports, timeout=READY_TIMEOUT_SECONDS):
+    """
+    Attend que chaque port réponde au contrôle de santé de Streamlit
+    """
+    deadline = time.monotonic() + timeout
+    for port in ports:
+        while True:
+            try:
+                with urllib.request.urlopen(f'http://127.0.0.1:{port}/_stcore/health', timeout=1) as response:
+                    if response.status == 200:
+                        break
+            except OSError:
+                pass
+            if time.monotonic() > deadline:
+                raise TimeoutError(f"Le port {port} ne répond pas après {timeout:.0f} s")
+            time.sleep(0.2)
+
+
+def _measure(command, ports, find_workers):
+    """
+    Lance une configuration, attend les ports, puis relève la mémoire
+    """
+    processes = [subprocess.Popen(args, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                                  start_new_session=True) for args in command]
+    try:
+        wait_ready(ports)
+        time.sleep(1.0)
+        return {pid: memory_usage(pid) for pid in find_workers(processes)}
+    finally:
+        for process in processes:
+            process.send_signal(signal.SIGTERM)
+        for process in processes:
+            try:
+                process.wait(timeout=30)
+            except subprocess.TimeoutExpired:
+                os.killpg(process.pid, signal.SIGKILL)
+                process.wait()
+
+
+def memory_report(app_file=DEFAULT_APP, n_workers=DEFAULT_WORKERS, port=8601, backend=None, model_dir='.'):
+    """
+    Mémoire de N processus indépendants vs N workers pré-forkés
+
+    Chaque processus indépendant charge lui-même modules et modèles, comme
+    après la première visite d'une instance lancée par `streamlit run`.
+    Retourne {configuration: {pid: mémoire}}.
+    """
+    ports = [port + i for i in range(n_workers)]
+    options = ['--app', app_file, '--model-dir', model_dir] + (['--backend', backend] if backend else [])
+    script = os.path.abspath(__file__)
+
+    independent = [[sys.executable, '-W', 'ignore', script, 'worker', '--port', str(p)] + options for p in ports]
+    prefork = [[sys.executable, '-W', 'ignore', script, 'serve', '--workers', str(n_workers),
+                '--port', str(port)] + options]
+
+    report = {
+        'indépendants': _measure(independent, ports, lambda processes: [p.pid for p in processes]),
+        'pré-forkés': _measure(prefork, ports,
+                               lambda processes: [processes[0].pid] + child_pids(processes[0].pid)),
+    }
+    print_memory_report(report)
+    return report
+
+
+def print_memory_report(report):
+    """
+    Affiche RSS / PSS par processus et les totaux de chaque configuration
+    """
+    totals = {}
+    for name, usages in report.items():
+        print(f"\n🧮 {name}")
+        print(f"  {'PID':>8} {'RSS':>10} {'PSS':>10} {'Partagée':>10} {'Privée':>10}")
+        for pid, usage in usages.items():
+            shared = usage['Shared_Clean'] + usage['Shared_Dirty']
+            private = usage['Private_Clean'] + usage['Private_Dirty']
+            print(f"  {pid:>8} {usage['Rss'] / 2**20:>8.1f}Mo {usage['Pss'] / 2**20:>8.1f}Mo "
+                  f"{shared / 2**20:>8.1f}Mo {private / 2**20:>8.1f}Mo")
+        totals[name] = sum(usage['Pss'] for usage in usages.values())
+        print(f"  Total PSS ({len(usages)} processus) : {totals[name] / 2**20:.1f} Mo")
+
+    if len(totals) == 2:
+        before, after = totals.values()
+        print(f"\n📉 Mémoire totale : {before / 2**20:.1f} Mo -> {after / 2**20:.1f} Mo "
+              f"({(1 - after / before) * 100:.0f}% de moins)")
+
+
+def main():
+    from model_bundle import BACKENDS
+
+    parser = argparse.ArgumentParser(description="Workers Streamlit pré-forkés partageant les modèles")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    def add_app_options(subparser, default_port):
+        subparser.add_argument('--app', default=DEFAULT_APP,
+                               help=f"Script Streamlit (défaut: {DEFAULT_APP})")
+        subparser.add_argument('--port', type=int, default=default_port,
+                               help=f"Port du premier worker (défaut: {default_port})")
+        subparser.add_argument('--backend', choices=BACKENDS, default=None,
+                               help="Moteur de prédiction préchargé (défaut: celui de model_bundle)")
+        subparser.add_argument('--model-dir', default='.',
+                               help="Dossier des modèles entraînés (défaut: dossier courant)")
+
+    serve_parser = subparsers.add_parser('serve', help="Lance N workers pré-forkés")
+    serve_parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS)
+    add_app_options(serve_parser, DEFAULT_PORT)
+
+    report_parser = subparsers.add_parser('report', help="Mémoire : processus indépendants vs pré-forkés")
+    report_parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS)
+    add_app_options(report_parser, 8601)
+
+    # Un processus indépendant (référence du rapport)
+    worker_parser = subparsers.add_parser('worker', help="Un processus unique, modèles préchargés")
+    add_app_options(worker_parser, DEFAULT_PORT)
+
+    args = parser.parse_args()
+
+    if args.command == 'serve':
+        run_prefork(args.app, args.workers, args.port, args.backend, args.model_dir)
+    elif args.command == 'report':
+        memory_report(args.app, args.workers, args.port, args.backend, args.model_dir)
+    elif args.command == 'worker':
+        preload(args.app, args.backend, args.model_dir)
+        serve_app(args.app, args.port)
+
+
+if __name__ == "__main__":
+    main()
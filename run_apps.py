@@ -8,6 +8,8 @@ import sys
 import os
 from pathlib import Path
 
+from startup_report import measure_startup, print_startup_report, probe_dependencies
+
 def print_banner():
     """Affiche la bannière du projet"""
     print("=" * 60)
@@ -27,11 +29,11 @@ def check_dependencies():
     
     missing_packages = []
     
-    for package in required_packages:
-        try:
-            __import__(package)
+    # Recherche des paquets sans les importer (démarrage rapide)
+    for package, available in probe_dependencies(required_packages).items():
+        if available:
             print(f"✅ {package}")
-        except ImportError:
+        else:
             print(f"❌ {package} - Manquant")
             missing_packages.append(package)
     
@@ -84,6 +86,11 @@ def check_models():
     else:
         print("❌ Modèles de gliomes manquants")
     
+    # Sans artefact publié, chaque démarrage reconvertit les forêts des .pkl
+    if glioma_available and not Path('glioma_artifact/CURRENT').exists():
+        print("⚠️ Artefact des modèles non publié (démarrage plus lent)")
+        print("Publiez-le avec l'option 2 puis 2, ou : python model_artifact.py")
+    
     return glioma_available
 
 def show_menu():
@@ -92,7 +99,9 @@ def show_menu():
     print("1. 🧠 Gliomes")
     print("2. 🔧 Entraîner les modèles")
     print("3. 📊 Analyse exploratoire")
-    print("4. ❌ Quitter")
+    print("4. ⏱️ Rapport de démarrage")
+    print("5. 🧩 Gliomes multi-processus (pré-fork)")
+    print("6. ❌ Quitter")
     print()
 
 def run_streamlit_app(app_file, port=8501):
@@ -117,9 +126,10 @@ def train_models():
     """Entraîne les modèles"""
     print("\n🔧 ENTRAÎNEMENT DES MODÈLES")
     print("1. 🧠 Gliomes")
-    print("2. 🔙 Retour")
+    print("2. 📦 Publier l'artefact des modèles (sans réentraîner)")
+    print("3. 🔙 Retour")
     
-    choice = input("\nChoisissez une option (1-2) : ").strip()
+    choice = input("\nChoisissez une option (1-3) : ").strip()
     
     if choice == "1":
         print("\n🏃‍♂️ Entraînement des modèles de gliomes...")
@@ -130,6 +140,13 @@ def train_models():
             print(f"❌ Erreur : {e}")
     
     elif choice == "2":
+        print("\n📦 Publication de l'artefact des modèles...")
+        try:
+            subprocess.run([sys.executable, "model_artifact.py"])
+        except Exception as e:
+            print(f"❌ Erreur : {e}")
+    
+    elif choice == "3":
         return
     
     else:
@@ -156,6 +173,42 @@ def run_analysis():
     else:
         print("❌ Option invalide")
 
+def show_startup_report():
+    """Mesure le démarrage à froid de l'application de prédiction"""
+    print("\n⏱️ RAPPORT DE DÉMARRAGE")
+    print("🔍 Mesure dans un nouvel interpréteur...")
+    try:
+        print_startup_report(measure_startup())
+    except Exception as e:
+        print(f"❌ Erreur : {e}")
+
+def run_prefork_apps():
+    """Lance plusieurs workers qui partagent les modèles chargés une seule fois"""
+    print("\n🧩 GLIOMES MULTI-PROCESSUS")
+    print("1. 🚀 Lancer les workers pré-forkés")
+    print("2. 🧮 Rapport mémoire (processus indépendants vs pré-forkés)")
+    print("3. 🔙 Retour")
+    
+    choice = input("\nChoisissez une option (1-3) : ").strip()
+    if choice == "3":
+        return
+    if choice not in ("1", "2"):
+        print("❌ Option invalide")
+        return
+    
+    workers = input("Nombre de workers (défaut : 4) : ").strip() or "4"
+    if not workers.isdigit() or int(workers) < 1:
+        print("❌ Nombre de workers invalide")
+        return
+    
+    command = "serve" if choice == "1" else "report"
+    try:
+        subprocess.run([sys.executable, "prefork_launcher.py", command, "--workers", workers])
+    except KeyboardInterrupt:
+        print("\n🛑 Workers arrêtés")
+    except Exception as e:
+        print(f"❌ Erreur : {e}")
+
 def main():
     """Fonction principale"""
     print_banner()
@@ -175,7 +228,7 @@ def main():
     while True:
         show_menu()
         
-        choice = input("Choisissez une option (1-4) : ").strip()
+        choice = input("Choisissez une option (1-6) : ").strip()
         
         if choice == "1":
             # Gliomes
@@ -194,6 +247,18 @@ def main():
             run_analysis()
         
         elif choice == "4":
+            # Démarrage à froid
+            show_startup_report()
+        
+        elif choice == "5":
+            # Workers pré-forkés
+            if glioma_available:
+                run_prefork_apps()
+            else:
+                print("❌ Modèles de gliomes non disponibles")
+                print("Entraînez d'abord les modèles (option 2)")
+        
+        elif choice == "6":
             # Quitter
             print("\n👋 Au revoir !")
             break
@@ -1,53 +1,43 @@
-import openpyxl
 import os
 
+from clinical_data_loader import CLINICAL_DATA_PATH, iter_records
+from column_profiler import ColumnProfiler, format_profile
+
 def analyze_excel_file():
     """
     Analyse simple du fichier Excel des données cliniques du cerveau
     """
     
-    file_path = 'BrainClinicalData/MU-Glioma-Post_ClinicalData-July2025.xlsx'
+    file_path = CLINICAL_DATA_PATH
     
     try:
-        # Charger le workbook
-        workbook = openpyxl.load_workbook(file_path)
-        
-        # Obtenir la première feuille
-        sheet = workbook.active
+        # Lire le classeur en flux (mode lecture seule, ligne par ligne)
+        headers, records = iter_records(file_path)
         
         print("✅ Fichier Excel chargé avec succès!")
-        print(f"📊 Nombre de lignes: {sheet.max_row}")
-        print(f"📋 Nombre de colonnes: {sheet.max_column}")
-        
-        # Lire les en-têtes (première ligne)
-        headers = []
-        for col in range(1, sheet.max_column + 1):
-            cell_value = sheet.cell(row=1, column=col).value
-            headers.append(cell_value)
         
         print(f"\n📝 Colonnes disponibles ({len(headers)}):")
         for i, header in enumerate(headers, 1):
             print(f"{i:2d}. {header}")
         
-        # Analyser quelques lignes de données
+        # Un seul parcours des lignes: aperçu et profil de toutes les colonnes
+        profiler = ColumnProfiler(headers)
+        
         print(f"\n👀 Aperçu des données (5 premières lignes):")
-        for row in range(2, min(7, sheet.max_row + 1)):
-            row_data = []
-            for col in range(1, sheet.max_column + 1):
-                cell_value = sheet.cell(row=row, column=col).value
-                row_data.append(str(cell_value) if cell_value is not None else "None")
-            print(f"Ligne {row-1}: {row_data[:5]}...")  # Afficher seulement les 5 premières colonnes
+        for row in records:
+            if profiler.n_rows < 5:
+                row_data = [str(value) if value is not None else "None" for value in row]
+                print(f"Ligne {profiler.n_rows + 1}: {row_data[:5]}...")  # Afficher seulement les 5 premières colonnes
+            profiler.add(row)
+        
+        n_rows = profiler.n_rows
+        print(f"\n📊 Nombre de lignes: {n_rows + 1}")
+        print(f"📋 Nombre de colonnes: {len(headers)}")
         
-        # Compter les valeurs non-nulles par colonne
-        print(f"\n📊 Analyse des valeurs non-nulles par colonne:")
-        for col in range(1, min(11, sheet.max_column + 1)):  # Analyser les 10 premières colonnes
-            non_null_count = 0
-            for row in range(2, sheet.max_row + 1):
-                if sheet.cell(row=row, column=col).value is not None:
-                    non_null_count += 1
-            
-            header = headers[col-1] if col <= len(headers) else f"Colonne_{col}"
-            print(f"{header}: {non_null_count}/{sheet.max_row-1} valeurs non-nulles")
+        # Profil de chaque colonne (≈ : valeur estimée, ≥ : compte minoré)
+        print(f"\n📊 Profil des colonnes:")
+        for profile in profiler.profiles():
+            print(format_profile(profile, n_rows))
         
         # Rechercher des variables cibles potentielles
         print(f"\n🎯 Recherche de variables cibles potentielles:")
@@ -70,7 +60,6 @@ def analyze_excel_file():
         else:
             print("Aucune variable cible évidente trouvée dans les noms de colonnes.")
         
-        workbook.close()
         return headers
         
     except Exception as e:
@@ -0,0 +1,215 @@
+#!/usr/bin/env python3
+"""
+Profilage des étapes de l'entraînement (CPU et mémoire), sur demande
+
+Chaque étape des scripts d'entraînement (chargement, préparation,
+encodage, entraînement, sauvegarde) est entourée de
+`with stage_profiler.stage('etape'):`. Sans profilage, `stage` retourne
+simplement le span de `stage_timing`.
+
+Avec `--profile-dir DOSSIER` (ou GLIOMA_PROFILE_DIR=DOSSIER), chaque étape
+est exécutée sous cProfile et tracemalloc, et le dossier reçoit :
+- `NN_etape.prof` : statistiques cProfile (`python -m pstats`, snakeviz) ;
+- `NN_etape.txt` : fonctions les plus coûteuses (temps cumulé) et lignes
+  qui ont le plus alloué pendant l'étape ;
+- `summary.json` : durée, temps CPU, pic mémoire et mémoire retenue par
+  étape.
+Les cibles sont entraînées dans des threads. Avant Python 3.12, un
+profileur est attaché à chaque thread créé pendant l'étape et les
+statistiques sont fusionnées. Depuis 3.12, cProfile repose sur
+`sys.monitoring` : un seul profileur peut être actif, et celui de l'étape
+reçoit déjà les appels de tous les threads (aucun profileur par thread).
+
+Comparaison de deux exécutions :
+    python stage_profiler.py compare runs/avant runs/apres
+"""
+
+import argparse
+import cProfile
+import io
+import json
+import os
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+
+import stage_timing
+
+SUMMARY_FILE = 'summary.json'
+TOP_FUNCTIONS = 40
+TOP_ALLOCATIONS = 20
+
+# Un profileur par thread de travail (impossible depuis Python 3.12)
+_PER_THREAD_PROFILES = sys.version_info < (3, 12)
+
+_report_dir = os.environ.get('GLIOMA_PROFILE_DIR') or None
+_stages = []
+
+
+def configure(report_dir):
+    """
+    Active le profilage des étapes (report_dir=None pour le désactiver)
+    """
+    global _report_dir
+    _report_dir = report_dir
+    _stages.clear()
+
+
+def is_enabled():
+    return _report_dir is not None
+
+
+def report_dir():
+    return _report_dir
+
+
+def stage(name):
+    """
+    Gestionnaire de contexte d'une étape : span de stage_timing, plus
+    cProfile et tracemalloc si le profilage est activé
+    """
+    if _report_dir is None:
+        return stage_timing.span(name)
+    return _ProfiledStage(name, _report_dir)
+
+
+class _ProfiledStage:
+    """
+    Profilage d'une étape (thread courant et threads créés pendant l'étape)
+    """
+
+    def __init__(self, name, report_dir):
+        self.name = name
+        self.report_dir = report_dir
+        self.span = stage_timing.span(name)
+        self.thread_profiles = []
+
+    def _profile_thread(self, frame, event, arg):
+        # Premier événement d'un nouveau thread : son propre profileur
+        # remplace ce hook pour le reste du thread
+        profile = cProfile.Profile()
+        self.thread_profiles.append(profile)
+        profile.enable()
+
+    def __enter__(self):
+        os.makedirs(self.report_dir, exist_ok=True)
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+        self.snapshot = tracemalloc.take_snapshot()
+        tracemalloc.reset_peak()
+        self.start_memory = tracemalloc.get_traced_memory()[0]
+
+        self.span.__enter__()
+        if _PER_THREAD_PROFILES:
+            threading.setprofile(self._profile_thread)
+        self.profile = cProfile.Profile()
+        self.start_cpu = time.process_time()
+        self.start = time.perf_counter()
+        self.profile.enable()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.profile.disable()
+        elapsed = time.perf_counter() - self.start
+        cpu_seconds = time.process_time() - self.start_cpu
+        if _PER_THREAD_PROFILES:
+            threading.setprofile(None)
+        self.span.__exit__(*exc_info)
+
+        current_memory, peak_memory = tracemalloc.get_traced_memory()
+        allocations = tracemalloc.take_snapshot().compare_to(self.snapshot, 'lineno')
+
+        stats = pstats.Stats(self.profile)
+        for profile in self.thread_profiles:
+            stats.add(profile)
+
+        prefix = os.path.join(self.report_dir, f"{len(_stages) + 1:02d}_{self.name}")
+        stats.dump_stats(f"{prefix}.prof")
+        with open(f"{prefix}.txt", 'w', encoding='utf-8') as f:
+            f.write(_format_report(self.name, stats, allocations, elapsed, cpu_seconds,
+                                   peak_memory - self.start_memory, current_memory - self.start_memory,
+                                   len(self.thread_profiles)))
+
+        _stages.append({
+            'stage': self.name,
+            'seconds': elapsed,
+            'cpu_seconds': cpu_seconds,
+            'peak_bytes': peak_memory - self.start_memory,
+            'retained_bytes': current_memory - self.start_memory,
+            'threads': len(self.thread_profiles),
+        })
+        write_summary(self.report_dir)
+        return False
+
+
+def _format_report(name, stats, allocations, elapsed, cpu_seconds, peak_bytes, retained_bytes, threads):
+    """
+    Rapport texte d'une étape : résumé, fonctions et allocations
+    """
+    output = io.StringIO()
+    output.write(f"Étape: {name}\n")
+    output.write(f"Durée: {elapsed:.3f} s - CPU: {cpu_seconds:.3f} s\n")
+    output.write(f"Pic mémoire: {peak_bytes / 1e6:.1f} Mo - Mémoire retenue: {retained_bytes / 1e6:.1f} Mo\n")
+    if threads:
+        output.write(f"Temps cumulés additionnés sur le thread principal et {threads} thread(s) de travail\n")
+    output.write("\n")
+
+    stats.stream = output
+    stats.sort_stats('cumulative').print_stats(TOP_FUNCTIONS)
+
+    output.write(f"\nAllocations (tracemalloc, {TOP_ALLOCATIONS} lignes):\n")
+    for statistic in allocations[:TOP_ALLOCATIONS]:
+        output.write(f"  {statistic}\n")
+    return output.getvalue()
+
+
+def write_summary(report_dir):
+    """
+    Écrit summary.json (réécrit après chaque étape)
+    """
+    summary = {'command': ' '.join(sys.argv), 'stages': list(_stages)}
+    with open(os.path.join(report_dir, SUMMARY_FILE), 'w', encoding='utf-8') as f:
+        json.dump(summary, f, indent=2, ensure_ascii=False)
+
+
+def load_summary(report_dir):
+    with open(os.path.join(report_dir, SUMMARY_FILE), encoding='utf-8') as f:
+        return json.load(f)
+
+
+def compare_runs(before_dir, after_dir):
+    """
+    Affiche, par étape, la durée et le pic mémoire de deux exécutions
+    """
+    before = {entry['stage']: entry for entry in load_summary(before_dir)['stages']}
+    after = {entry['stage']: entry for entry in load_summary(after_dir)['stages']}
+
+    print(f"{'Étape':<20} {'Durée avant':>12} {'après':>10} {'écart':>8}   {'Pic avant':>10} {'après':>10}")
+    for name in list(before) + [name for name in after if name not in before]:
+        old, new = before.get(name), after.get(name)
+        if old is None or new is None:
+            print(f"{name:<20} {'présente uniquement ' + ('après' if old is None else 'avant'):>43}")
+            continue
+        change = (new['seconds'] / old['seconds'] - 1) * 100 if old['seconds'] else 0.0
+        print(f"{name:<20} {old['seconds']:>11.3f}s {new['seconds']:>9.3f}s {change:>+7.1f}%   "
+              f"{old['peak_bytes'] / 1e6:>8.1f}Mo {new['peak_bytes'] / 1e6:>8.1f}Mo")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rapports de profilage des étapes de l'entraînement")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    compare_parser = subparsers.add_parser('compare', help="Compare deux dossiers de rapports")
+    compare_parser.add_argument('before')
+    compare_parser.add_argument('after')
+
+    args = parser.parse_args()
+
+    if args.command == 'compare':
+        compare_runs(args.before, args.after)
+
+
+if __name__ == "__main__":
+    main()
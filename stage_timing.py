@@ -0,0 +1,148 @@
+"""
+Mesure du temps passé dans chaque étape d'une prédiction ou d'un entraînement
+
+Les étapes (chargement des modèles, encodage, standardisation, forêts,
+rendu Streamlit, étapes de l'entraînement) sont entourées de
+`with span('etape'):`. Les durées sont agrégées par étape dans des
+histogrammes à seaux fixes, exportables au format texte de Prometheus
+(`export_prometheus`, `write_prometheus`) ou en une ligne de log
+(`log_line`).
+
+La mesure est désactivée par défaut : `span` retourne alors un gestionnaire
+de contexte vide partagé, sans horloge ni verrou. Elle est activée par la
+variable d'environnement GLIOMA_TIMING=1 (ou `enable()`) ; avec
+GLIOMA_TIMING_FILE=chemin, `flush()` écrit le fichier Prometheus.
+"""
+
+import bisect
+import contextlib
+import os
+import threading
+import time
+
+# Bornes supérieures des seaux (secondes), comme les histogrammes Prometheus
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+METRIC_NAME = 'glioma_stage_seconds'
+
+_NULL_SPAN = contextlib.nullcontext()
+
+_enabled = os.environ.get('GLIOMA_TIMING', '') not in ('', '0')
+_lock = threading.Lock()
+_histograms = {}   # étape -> [compte par seau (+Inf en dernier), somme, nombre, maximum]
+
+
+def enable(enabled=True):
+    global _enabled
+    _enabled = enabled
+
+
+def is_enabled():
+    return _enabled
+
+
+def observe(stage, seconds):
+    """
+    Ajoute une durée (déjà mesurée) à l'histogramme d'une étape
+    """
+    if not _enabled:
+        return
+    index = bisect.bisect_left(BUCKETS, seconds)
+    with _lock:
+        histogram = _histograms.get(stage)
+        if histogram is None:
+            histogram = _histograms[stage] = [[0] * (len(BUCKETS) + 1), 0.0, 0, 0.0]
+        histogram[0][index] += 1
+        histogram[1] += seconds
+        histogram[2] += 1
+        histogram[3] = max(histogram[3], seconds)
+
+
+class _Span:
+    __slots__ = ('stage', 'start')
+
+    def __init__(self, stage):
+        self.stage = stage
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        observe(self.stage, time.perf_counter() - self.start)
+        return False
+
+
+def span(stage):
+    """
+    Gestionnaire de contexte qui mesure la durée d'une étape
+    """
+    if not _enabled:
+        return _NULL_SPAN
+    return _Span(stage)
+
+
+def snapshot():
+    """
+    Copie des histogrammes : {étape: (seaux cumulés, somme, nombre, maximum)}
+    """
+    with _lock:
+        items = [(stage, list(h[0]), h[1], h[2], h[3]) for stage, h in _histograms.items()]
+    result = {}
+    for stage, counts, total, count, maximum in items:
+        cumulative, running = [], 0
+        for value in counts:
+            running += value
+            cumulative.append(running)
+        result[stage] = (cumulative, total, count, maximum)
+    return result
+
+
+def reset():
+    with _lock:
+        _histograms.clear()
+
+
+def export_prometheus():
+    """
+    Histogrammes au format texte d'exposition de Prometheus
+    """
+    lines = [f"# HELP {METRIC_NAME} Durée des étapes de prédiction et d'entraînement",
+             f"# TYPE {METRIC_NAME} histogram"]
+    for stage, (cumulative, total, count, _) in sorted(snapshot().items()):
+        for bound, value in zip(BUCKETS + ('+Inf',), cumulative):
+            le = bound if isinstance(bound, str) else repr(bound)
+            lines.append(f'{METRIC_NAME}_bucket{{stage="{stage}",le="{le}"}} {value}')
+        lines.append(f'{METRIC_NAME}_sum{{stage="{stage}"}} {total!r}')
+        lines.append(f'{METRIC_NAME}_count{{stage="{stage}"}} {count}')
+    return "\n".join(lines) + "\n"
+
+
+def write_prometheus(path):
+    """
+    Écrit les histogrammes dans un fichier (remplacement atomique, lisible
+    par le collecteur de fichiers texte de node_exporter)
+    """
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(export_prometheus())
+    os.replace(tmp_path, path)
+
+
+def log_line():
+    """
+    Résumé des étapes sur une ligne : étape=nombre×moyenne (max)
+    """
+    parts = []
+    for stage, (_, total, count, maximum) in sorted(snapshot().items()):
+        parts.append(f"{stage}={count}x{total / count * 1000:.2f}ms(max {maximum * 1000:.2f}ms)")
+    return "stage_timing " + " ".join(parts)
+
+
+def flush():
+    """
+    Écrit le fichier Prometheus si GLIOMA_TIMING_FILE est défini
+    """
+    path = os.environ.get('GLIOMA_TIMING_FILE')
+    if _enabled and path:
+        write_prometheus(path)
@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+"""
+Rapport de démarrage à froid des applications Streamlit
+
+Le démarrage est mesuré dans un interpréteur neuf (`python -X importtime`),
+comme au premier lancement d'un conteneur : import du module de
+l'application (sans exécuter `main`), puis chargement des modèles via
+`model_bundle.get_model_bundle`. Le rapport détaille le temps d'import de
+chaque module importé par l'application et le temps de chargement des
+artefacts, et les compare à un budget (code de sortie 1 si dépassé).
+Sans artefact publié, le moteur compilé convertit les forêts des `.pkl` :
+le rapport l'indique comme un état à part (« aucun artefact »), et ce
+démarrage, le plus lent, reste comparé au budget.
+
+La vérification des dépendances (`probe_dependencies`) utilise
+`importlib.util.find_spec` : les paquets sont trouvés sans être importés.
+Ce module n'importe que la bibliothèque standard, pour pouvoir vérifier
+les dépendances avant qu'elles soient installées.
+
+Usage:
+    python startup_report.py [--app glioma_prediction_app] [--backend compiled] [--budget 2.0]
+"""
+
+import argparse
+import importlib.util
+import json
+import subprocess
+import sys
+import time
+
+DEFAULT_APP = 'glioma_prediction_app'
+DEFAULT_BUDGET_SECONDS = 2.0
+
+# Script exécuté dans l'interpréteur mesuré ; les temps sont écrits en JSON
+# sur la dernière ligne de la sortie standard
+_PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import {app}
+imported = time.perf_counter()
+from model_bundle import DEFAULT_BACKEND, get_model_bundle, load_metrics
+get_model_bundle({model_dir!r}, {backend!r} or DEFAULT_BACKEND)
+loaded = time.perf_counter()
+print(json.dumps({{
+    'import_seconds': imported - start,
+    'load_seconds': loaded - imported,
+    'source': load_metrics()['source'],
+    'backend': load_metrics()['backend'],
+    'modules': sorted(name for name in ('streamlit', 'pandas', 'numpy', 'sklearn', 'joblib', 'openpyxl')
+                      if name in sys.modules),
+}}))
+"""
+
+
+def probe_dependencies(packages):
+    """
+    Indique pour chaque paquet s'il est installé, sans l'importer
+    """
+    available = {}
+    for package in packages:
+        try:
+            available[package] = importlib.util.find_spec(package) is not None
+        except (ImportError, ValueError):
+            available[package] = False
+    return available
+
+
+def parse_importtime(stderr, root):
+    """
+    Temps d'import cumulé (secondes) de chaque module importé directement
+    par `root`, d'après la sortie de `-X importtime`
+    """
+    entries = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        # Un espace après le séparateur, puis deux espaces par niveau d'import
+        depth = (len(name) - len(name.lstrip(' ')) - 1) // 2
+        entries.append((depth, name.strip(), int(self_us), int(cumulative_us)))
+
+    # -X importtime écrit les sous-modules avant le module qui les importe
+    children = {}
+    for i, (depth, name, _, _) in enumerate(entries):
+        if name != root or depth != 0:
+            continue
+        j = i - 1
+        while j >= 0 and entries[j][0] > 0:
+            if entries[j][0] == 1:
+                children[entries[j][1]] = entries[j][3] / 1e6
+            j -= 1
+        break
+    return children
+
+
+def measure_startup(app=DEFAULT_APP, backend=None, model_dir='.'):
+    """
+    Mesure le démarrage à froid de `app` dans un nouvel interpréteur
+    (backend=None : moteur par défaut de model_bundle)
+
+    Retourne un dictionnaire : import_seconds, load_seconds, total_seconds,
+    source des modèles, modules lourds chargés et temps d'import par module.
+    """
+    probe = _PROBE.format(app=app, model_dir=model_dir, backend=backend)
+    start = time.perf_counter()
+    completed = subprocess.run([sys.executable, '-X', 'importtime', '-W', 'ignore', '-c', probe],
+                               capture_output=True, text=True)
+    wall_seconds = time.perf_counter() - start
+    if completed.returncode != 0:
+        raise RuntimeError(completed.stderr.strip().splitlines()[-1] if completed.stderr.strip()
+                           else f"Échec de la mesure ({completed.returncode})")
+
+    report = json.loads(completed.stdout.strip().splitlines()[-1])
+    report['imports'] = parse_importtime(completed.stderr, app)
+    report['total_seconds'] = report['import_seconds'] + report['load_seconds']
+    report['process_seconds'] = wall_seconds
+    return report
+
+
+def print_startup_report(report, budget=DEFAULT_BUDGET_SECONDS, top=10):
+    """
+    Affiche le rapport ; retourne True si le démarrage respecte le budget
+    """
+    print("⏱️ Démarrage à froid:")
+    print(f"  - Imports: {report['import_seconds'] * 1000:.0f} ms")
+    for name, seconds in sorted(report['imports'].items(), key=lambda item: -item[1])[:top]:
+        print(f"      {name}: {seconds * 1000:.0f} ms")
+    print(f"  - Chargement des modèles ({report['source']}): {report['load_seconds'] * 1000:.0f} ms")
+    print(f"  - Total: {report['total_seconds'] * 1000:.0f} ms "
+          f"(processus complet: {report['process_seconds'] * 1000:.0f} ms)")
+    print(f"📦 Modules lourds chargés: {', '.join(report['modules']) or 'aucun'}")
+
+    if report.get('backend') == 'compiled' and report['source'] == 'pickle':
+        print("⚠️ Aucun artefact publié : forêts converties depuis les .pkl. "
+              "Publier l'artefact : python model_artifact.py")
+
+    within_budget = report['total_seconds'] <= budget
+    if within_budget:
+        print(f"✅ Budget respecté ({budget:.2f} s)")
+    else:
+        print(f"❌ Budget dépassé ({report['total_seconds']:.2f} s > {budget:.2f} s)")
+    return within_budget
+
+
+def main():
+    from model_bundle import BACKENDS, DEFAULT_BACKEND
+
+    parser = argparse.ArgumentParser(description="Rapport de démarrage à froid d'une application")
+    parser.add_argument('--app', default=DEFAULT_APP,
+                        help=f"Module de l'application (défaut: {DEFAULT_APP})")
+    parser.add_argument('--backend', choices=BACKENDS, default=DEFAULT_BACKEND,
+                        help=f"Moteur de prédiction (défaut: {DEFAULT_BACKEND})")
+    parser.add_argument('--model-dir', default='.',
+                        help="Dossier des modèles entraînés (défaut: dossier courant)")
+    parser.add_argument('--budget', type=float, default=DEFAULT_BUDGET_SECONDS,
+                        help=f"Budget de démarrage en secondes (défaut: {DEFAULT_BUDGET_SECONDS})")
+    parser.add_argument('--top', type=int, default=10,
+                        help="Nombre de modules affichés (défaut: 10)")
+    args = parser.parse_args()
+
+    report = measure_startup(args.app, args.backend, args.model_dir)
+    if not print_startup_report(report, args.budget, args.top):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,365 @@
+#!/usr/bin/env python3
+"""
+Courbes de survie de Kaplan-Meier et tests du log-rank sur la cohorte
+
+Deux critères sont disponibles :
+- survie globale : décès ('Overall Survival (Death)') au jour
+  'Number of days from Diagnosis to death (Days)' ;
+- survie sans progression : progression ('Progression') au jour
+  'Time to First Progression (Days)'.
+Un patient sans événement est censuré au dernier jour documenté depuis le
+diagnostic (IRM, traitements, progressions : le classeur n'a pas de date
+de dernières nouvelles). Les durées manquantes ou négatives sont exclues.
+
+Les durées de chaque critère sont triées une seule fois (`np.unique`,
+O(n log n)) ; chaque patient garde l'indice de sa durée parmi les durées
+distinctes. Une courbe ou un log-rank sur un sous-groupe ne demande
+ensuite que des masques et des `np.bincount` (O(n)), et les résultats sont
+mémorisés par (critère, filtres, variables de stratification) : les
+filtres interactifs du tableau de bord restent rapides même sur un
+million de patients.
+
+Usage:
+    python survival_analysis.py [--endpoint os|pfs] [--by "IDH1 mutation" "MGMT methylation"]
+"""
+
+import argparse
+import math
+import threading
+from collections import OrderedDict, namedtuple
+
+import numpy as np
+
+from cohort_schema import category_codes
+
+ENDPOINTS = {
+    'os': ('Survie globale', 'Overall Survival (Death)', 'Number of days from Diagnosis to death (Days)'),
+    'pfs': ('Survie sans progression', 'Progression', 'Time to First Progression (Days)'),
+}
+
+# Variables disponibles pour filtrer et stratifier (les features des modèles)
+SURVIVAL_COVARIATES = (
+    'Sex at Birth',
+    'Primary Diagnosis',
+    'Grade of Primary Brain Tumor',
+    'IDH1 mutation',
+    'IDH2 mutation',
+    '1p/19q',
+    'MGMT methylation',
+    'EGFR amplification',
+    'Previous Brain Tumor',
+    'Initial Chemo Therapy',
+    'Radiation Therapy',
+)
+
+# Nombre de courbes / tests gardés en mémoire par moteur
+DEFAULT_MEMO_SIZE = 1024
+
+# Quantile de la loi normale pour les intervalles de confiance à 95 %
+_Z_95 = 1.959963984540054
+
+# Courbe d'un groupe : durées où survient un événement ou une censure,
+# survie juste après chaque durée, intervalle de confiance (Greenwood,
+# transformation log(-log)), effectifs et médiane (None si non atteinte)
+SurvivalCurve = namedtuple('SurvivalCurve', ['time', 'survival', 'lower', 'upper', 'at_risk', 'events',
+                                             'n', 'n_events', 'median'])
+
+# Comparaison de groupes : libellés, courbes, événements observés /
+# attendus et statistique du log-rank (chi², degrés de liberté, p-valeur)
+LogRankResult = namedtuple('LogRankResult', ['groups', 'curves', 'observed', 'expected',
+                                             'statistic', 'dof', 'p_value'])
+
+
+def chi2_sf(statistic, dof):
+    """
+    P(X >= statistic) pour une loi du chi² à `dof` degrés de liberté
+    (formes fermées pour un nombre entier de degrés de liberté)
+    """
+    if dof <= 0 or not np.isfinite(statistic):
+        return float('nan')
+    x = max(float(statistic), 0.0)
+    half = x / 2.0
+    if dof % 2 == 0:
+        term, total = 1.0, 1.0
+        for i in range(1, dof // 2):
+            term *= half / i
+            total += term
+        return min(math.exp(-half) * total, 1.0)
+    root = math.sqrt(x)
+    term, total = root, 0.0
+    for i in range(1, (dof - 1) // 2 + 1):
+        total += term
+        term *= x / (2 * i + 1)
+    density = math.exp(-half) / math.sqrt(2.0 * math.pi)
+    return min(math.erfc(root / math.sqrt(2.0)) + 2.0 * density * total, 1.0)
+
+
+def kaplan_meier(events_by_time, counts_by_time, time_values):
+    """
+    Courbe de Kaplan-Meier à partir des événements et effectifs par durée
+    distincte (tableaux alignés sur `time_values`, triées)
+    """
+    present = counts_by_time > 0
+    time = time_values[present]
+    events = events_by_time[present]
+    counts = counts_by_time[present]
+    # Patients encore à risque juste avant chaque durée
+    at_risk = counts[::-1].cumsum()[::-1]
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        survival = np.cumprod(1.0 - events / at_risk)
+        greenwood = np.cumsum(events / (at_risk * (at_risk - events)))
+        log_survival = np.log(survival)
+        spread = _Z_95 * np.sqrt(greenwood) / np.abs(log_survival)
+        lower = survival ** np.exp(spread)
+        upper = survival ** np.exp(-spread)
+    undefined = ~np.isfinite(spread) | (survival <= 0)
+    lower[undefined] = survival[undefined]
+    upper[undefined] = survival[undefined]
+
+    below = np.flatnonzero(survival <= 0.5)
+    median = float(time[below[0]]) if below.size else None
+    return SurvivalCurve(time, survival, lower, upper, at_risk, events,
+                         int(counts.sum()), int(events.sum()), median)
+
+
+class SurvivalEngine:
+    """
+    Courbes de survie et log-rank d'une cohorte, avec mémorisation
+
+    `endpoints` : {critère: (durées, événements 0/1)} ; `covariates` :
+    {variable: (catégories, codes)} avec -1 pour une valeur manquante.
+    """
+
+    def __init__(self, endpoints, covariates, memo_size=DEFAULT_MEMO_SIZE):
+        self.n_patients = len(next(iter(covariates.values()))[1]) if covariates else 0
+        self.covariates = {name: (list(categories), np.asarray(codes))
+                           for name, (categories, codes) in covariates.items()}
+        self.endpoints = {}
+        for endpoint, (time, event) in endpoints.items():
+            time = np.asarray(time, dtype=np.float64)
+            valid = np.isfinite(time) & (time >= 0)
+            # Tri unique des durées ; -1 pour les patients exclus
+            time_values, inverse = np.unique(time[valid], return_inverse=True)
+            time_index = np.full(len(time), -1, dtype=np.intp)
+            time_index[valid] = inverse
+            self.endpoints[endpoint] = (time_values, time_index, (np.asarray(event) == 1) & valid)
+        self.memo_size = memo_size
+        self._memo = OrderedDict()
+        self._lock = threading.Lock()
+        self.memo_hits = 0
+        self.memo_misses = 0
+
+    def categories(self, name):
+        return self.covariates[name][0]
+
+    def _memoized(self, key, compute):
+        with self._lock:
+            value = self._memo.get(key)
+            if value is not None:
+                self._memo.move_to_end(key)
+                self.memo_hits += 1
+                return value
+            self.memo_misses += 1
+        value = compute()
+        with self._lock:
+            self._memo[key] = value
+            while len(self._memo) > self.memo_size:
+                self._memo.popitem(last=False)
+        return value
+
+    def clear_memo(self):
+        with self._lock:
+            self._memo.clear()
+
+    def _mask(self, endpoint, filters):
+        """
+        Patients retenus : durée valide et {variable: catégorie} respectés
+        """
+        mask = self.endpoints[endpoint][1] >= 0
+        for name, value in filters:
+            categories, codes = self.covariates[name]
+            mask &= codes == (categories.index(value) if value in categories else -2)
+        return mask
+
+    @staticmethod
+    def _key(filters):
+        return tuple(sorted((filters or {}).items()))
+
+    def curve(self, endpoint, filters=None):
+        """
+        Courbe de Kaplan-Meier du sous-groupe {variable: catégorie}
+        """
+        filters = self._key(filters)
+        return self._memoized(('curve', endpoint, filters), lambda: self._curve(endpoint, filters))
+
+    def _curve(self, endpoint, filters):
+        time_values, time_index, event = self.endpoints[endpoint]
+        mask = self._mask(endpoint, filters)
+        index = time_index[mask]
+        counts = np.bincount(index, minlength=len(time_values))
+        events = np.bincount(index, weights=event[mask], minlength=len(time_values))
+        return kaplan_meier(events, counts, time_values)
+
+    def compare(self, endpoint, by, filters=None):
+        """
+        Courbes et test du log-rank des groupes formés par les variables `by`
+        (ex. IDH1 × MGMT), dans le sous-groupe `filters`
+        """
+        filters = self._key(filters)
+        by = tuple(by)
+        return self._memoized(('compare', endpoint, by, filters), lambda: self._compare(endpoint, by, filters))
+
+    def _compare(self, endpoint, by, filters):
+        time_values, time_index, event = self.endpoints[endpoint]
+        mask = self._mask(endpoint, filters)
+        # Groupe de chaque patient : combinaison des codes des variables `by`
+        group = np.zeros(self.n_patients, dtype=np.intp)
+        n_combinations = 1
+        for name in by:
+            categories, codes = self.covariates[name]
+            mask &= codes >= 0
+            group = group * len(categories) + codes
+            n_combinations *= len(categories)
+
+        # Combinaisons présentes, numérotées sans tri (comptage)
+        group = group[mask]
+        present = np.flatnonzero(np.bincount(group, minlength=n_combinations))
+        renumber = np.zeros(n_combinations, dtype=np.intp)
+        renumber[present] = np.arange(len(present))
+        group = renumber[group]
+        n_times = len(time_values)
+        n_groups = len(present)
+        cell = group * n_times + time_index[mask]
+        counts = np.bincount(cell, minlength=n_groups * n_times).reshape(n_groups, n_times)
+        events = np.bincount(cell, weights=event[mask], minlength=n_groups * n_times).reshape(n_groups, n_times)
+
+        labels, curves = [], []
+        for g, combined in enumerate(present):
+            values = []
+            for name in reversed(by):
+                categories = self.covariates[name][0]
+                combined, code = divmod(int(combined), len(categories))
+                values.append(categories[code])
+            group_filters = dict(filters)
+            group_filters.update(zip(by, reversed(values)))
+            labels.append(tuple(reversed(values)))
+            curves.append(self._memoized(('curve', endpoint, self._key(group_filters)),
+                                         lambda g=g: kaplan_meier(events[g], counts[g], time_values)))
+
+        statistic, dof, observed, expected = log_rank(events, counts)
+        return LogRankResult(labels, curves, observed, expected, statistic, dof, chi2_sf(statistic, dof))
+
+
+def log_rank(events, counts):
+    """
+    Test du log-rank pour k groupes à partir des événements et effectifs
+    par (groupe, durée distincte)
+
+    Retourne (chi², degrés de liberté, observés, attendus).
+    """
+    at_risk = counts[:, ::-1].cumsum(axis=1)[:, ::-1]
+    total_at_risk = at_risk.sum(axis=0)
+    total_events = events.sum(axis=0)
+    observed = events.sum(axis=1)
+    used = total_at_risk > 0
+    share = np.zeros_like(at_risk, dtype=np.float64)
+    share[:, used] = at_risk[:, used] / total_at_risk[used]
+    expected = (share * total_events).sum(axis=1)
+
+    n_groups = len(observed)
+    if n_groups < 2:
+        return float('nan'), 0, observed, expected
+    # Variance hypergéométrique (durées avec au moins deux patients à risque)
+    ties = np.zeros_like(total_events, dtype=np.float64)
+    several = total_at_risk > 1
+    ties[several] = (total_events[several] * (total_at_risk[several] - total_events[several])
+                     / (total_at_risk[several] - 1))
+    covariance = -(share * ties) @ share.T
+    covariance[np.diag_indices(n_groups)] += (share * ties).sum(axis=1)
+
+    difference = (observed - expected)[:-1]
+    reduced = covariance[:-1, :-1]
+    try:
+        statistic = float(difference @ np.linalg.solve(reduced, difference))
+    except np.linalg.LinAlgError:
+        statistic = float(difference @ np.linalg.pinv(reduced) @ difference)
+    return statistic, n_groups - 1, observed, expected
+
+
+def _days(values):
+    """
+    Jours depuis le diagnostic (texte comme 'NA' -> NaN)
+    """
+    import pandas as pd
+
+    return pd.to_numeric(pd.Series(np.asarray(values, dtype=object)), errors='coerce').to_numpy(dtype=np.float64)
+
+
+def engine_from_frame(df):
+    """
+    Moteur de survie d'un DataFrame de la cohorte (colonnes du classeur)
+    """
+    # Dernier jour documenté depuis le diagnostic (date de censure)
+    follow_up_columns = [name for name in df.columns
+                         if isinstance(name, str) and ('from diagnosis to' in name.lower()
+                                                       or 'from dagnosis to' in name.lower()
+                                                       or name.startswith('Time to'))]
+    follow_up = np.full(len(df), np.nan)
+    for name in follow_up_columns:
+        follow_up = np.fmax(follow_up, _days(df[name]))
+
+    endpoints = {}
+    for endpoint, (_, event_column, time_column) in ENDPOINTS.items():
+        event = _days(df[event_column]) == 1
+        time = np.where(event, _days(df[time_column]), follow_up)
+        endpoints[endpoint] = (time, event)
+
+    covariates = {name: category_codes(df[name]) for name in SURVIVAL_COVARIATES if name in df.columns}
+    return SurvivalEngine(endpoints, covariates)
+
+
+_engine = None
+_engine_lock = threading.Lock()
+
+
+def get_survival_engine():
+    """
+    Moteur de survie de la cohorte (chargé une seule fois par processus)
+    """
+    global _engine
+    with _engine_lock:
+        if _engine is None:
+            from clinical_cache import load_cached_dataframe
+
+            _engine = engine_from_frame(load_cached_dataframe().dropna(how='all'))
+        return _engine
+
+
+def format_comparison(result, title):
+    """
+    Tableau texte d'une comparaison : effectifs, médianes et log-rank
+    """
+    lines = [f"📈 {title}"]
+    for label, curve, observed, expected in zip(result.groups, result.curves, result.observed, result.expected):
+        median = f"{curve.median:.0f} j" if curve.median is not None else "non atteinte"
+        lines.append(f"  {' × '.join(label) or 'Tous'}: n={curve.n}, événements={curve.n_events} "
+                     f"(attendus {expected:.1f}), médiane {median}")
+    lines.append(f"  Log-rank: chi²={result.statistic:.2f}, ddl={result.dof}, p={result.p_value:.4g}")
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Courbes de Kaplan-Meier et log-rank de la cohorte")
+    parser.add_argument('--endpoint', choices=sorted(ENDPOINTS), default='os')
+    parser.add_argument('--by', nargs='*', default=['IDH1 mutation', 'MGMT methylation'],
+                        help="Variables de stratification")
+    args = parser.parse_args()
+
+    engine = get_survival_engine()
+    result = engine.compare(args.endpoint, args.by)
+    print(format_comparison(result, f"{ENDPOINTS[args.endpoint][0]} par {' × '.join(args.by)}"))
+
+
+if __name__ == "__main__":
+    main()
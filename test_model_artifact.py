@@ -0,0 +1,53 @@
+"""
+Tests du repliement de la standardisation dans les seuils (`fold_scaler`)
+"""
+
+import numpy as np
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.preprocessing import StandardScaler
+
+from model_artifact import compile_forest
+
+
+def _fitted_forest():
+    # Features encodées (codes entiers) et un âge continu, comme à l'entraînement
+    rng = np.random.default_rng(0)
+    X = np.column_stack([rng.integers(0, 4, 300), rng.integers(0, 2, 300), rng.normal(55, 14, 300).round(1)])
+    y = (X[:, 0] + (X[:, 2] > 60) + rng.integers(0, 2, 300)) % 3
+    scaler = StandardScaler().fit(X)
+    model = RandomForestClassifier(n_estimators=15, max_depth=6, random_state=0).fit(scaler.transform(X), y)
+    return X, scaler, model
+
+
+def _threshold_rows(X, scaler, forest, folded):
+    """
+    Lignes dont une feature vaut exactement un seuil (standardisé ramené sur
+    l'échelle d'origine, ou replié) ou le flottant suivant
+    """
+    internal = folded.left >= 0
+    values = []
+    for feature, threshold, raw in zip(folded.feature[internal], forest.threshold[internal],
+                                       folded.threshold[internal]):
+        original = threshold * scaler.scale_[feature] + scaler.mean_[feature]
+        values += [(feature, raw), (feature, np.nextafter(raw, np.inf)), (feature, original)]
+    rows = X[np.arange(len(values)) % len(X)].copy()
+    for i, (feature, value) in enumerate(values):
+        rows[i, feature] = value
+    return rows
+
+
+def test_folded_thresholds_match_scaled_forest():
+    """
+    Forêt aux seuils repliés et scaler + forêt : mêmes feuilles, mêmes
+    probabilités et même classe, sur l'entraînement et sur les seuils
+    """
+    X, scaler, model = _fitted_forest()
+    forest = compile_forest(model)
+    folded = compile_forest(model, scaler)
+
+    for rows in (X, _threshold_rows(X, scaler, forest, folded)):
+        scaled = scaler.transform(rows)
+        np.testing.assert_array_equal(folded.apply(rows), forest.apply(scaled))
+        np.testing.assert_array_equal(folded.predict_proba(rows), forest.predict_proba(scaled))
+        np.testing.assert_array_equal(folded.predict(rows), forest.predict(scaled))
+        np.testing.assert_allclose(folded.predict_proba(rows), model.predict_proba(scaled), rtol=1e-12)
@@ -0,0 +1,69 @@
+"""
+Tests de la distance de Gower de `patient_neighbors` (index synthétique)
+"""
+
+import numpy as np
+import pandas as pd
+
+from patient_neighbors import NeighborIndex
+
+
+def _index():
+    categories = {
+        'IDH1 mutation': ['Negative', 'Positive', 'Unknown'],
+        'MGMT status': ['Methylated', 'Unknown', 'Unmethylated'],
+    }
+    codes = [[0, 0], [1, 1], [2, 0], [1, 2]]
+    numeric = [[40.0], [60.0], [np.nan], [80.0]]
+    outcomes = {'Progression': np.array(['No', 'Yes', 'No', 'Yes'])}
+    return NeighborIndex(['IDH1 mutation', 'MGMT status', 'Age at diagnosis'], categories, codes, numeric,
+                         ['P1', 'P2', 'P3', 'P4'], outcomes)
+
+
+def test_unknown_label_is_ignored():
+    """
+    Une catégorie inconnue de l'index ne compte ni au numérateur ni au
+    dénominateur (comme un âge manquant)
+    """
+    index = _index()
+    query = pd.DataFrame({'IDH1 mutation': ['Positive'], 'MGMT status': ['Partially methylated'],
+                          'Age at diagnosis': [60]})
+    codes, numeric = index.encode_records(query)
+    assert codes.tolist() == [[1, -1]]
+
+    distances = index.distances(codes, numeric)[0]
+    # P1 : IDH1 différent, âge 20/40 ; P3 : IDH1 manquant, âge manquant
+    np.testing.assert_allclose(distances, [(1 + 0.5) / 2, 0.0, 1.0, (0 + 0.5) / 2])
+
+
+def test_absent_column_and_missing_value_are_ignored():
+    """
+    Colonne absente de la requête et valeur 'Unknown' de la cohorte ignorées
+    """
+    index = _index()
+    assert index.codes[2, 0] == -1 and index.codes[1, 1] == -1
+
+    codes, numeric = index.encode_records(pd.DataFrame({'IDH1 mutation': ['Negative']}))
+    assert codes.tolist() == [[0, -1]] and np.isnan(numeric).all()
+    np.testing.assert_allclose(index.distances(codes, numeric)[0], [0.0, 1.0, 1.0, 1.0])
+
+
+def test_search_matches_brute_force():
+    """
+    La recherche par produits matriciels donne les distances du calcul direct
+    """
+    index = _index()
+    query = pd.DataFrame({'IDH1 mutation': ['Positive', 'Unknown', 'Negative'],
+                          'MGMT status': ['Methylated', 'Unmethylated', None],
+                          'Age at diagnosis': [55, None, 41]})
+    codes, numeric = index.encode_records(query)
+    indices, distances = index.search(codes, numeric, k=4)
+
+    for q in range(len(query)):
+        present = (index.codes >= 0) & (codes[q] >= 0)
+        total = (present & (index.codes != codes[q])).sum(axis=1).astype(float)
+        gap = np.abs(index.numeric[:, 0] - numeric[q, 0]) / index.spans[0]
+        weights = present.sum(axis=1) + ~np.isnan(gap)
+        expected = np.where(weights > 0, (total + np.nan_to_num(gap)) / np.maximum(weights, 1), 1.0)
+        np.testing.assert_allclose(distances[q], np.sort(expected))
+        np.testing.assert_allclose(expected[indices[q]], distances[q])
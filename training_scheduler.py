@@ -0,0 +1,66 @@
+"""
+Entraînement des modèles de plusieurs cibles en parallèle
+
+Les cibles (Progression, Survie globale, Grade) sont indépendantes : elles
+sont entraînées simultanément dans des threads (la construction des arbres
+de scikit-learn libère le GIL), et les cœurs restants sont répartis entre
+les forêts via `n_jobs`. Chaque forêt garde son `random_state` : les
+modèles obtenus sont identiques quel que soit le nombre de cœurs.
+"""
+
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+
+def resolve_jobs(jobs):
+    """
+    Nombre de cœurs à utiliser (-1 ou None = tous, comme scikit-learn)
+    """
+    n_cpus = os.cpu_count() or 1
+    if jobs is None or jobs == -1:
+        return n_cpus
+    if jobs < -1:
+        return max(n_cpus + 1 + jobs, 1)
+    return max(jobs, 1)
+
+
+def plan_jobs(n_targets, jobs):
+    """
+    Répartit les cœurs : (cibles en parallèle, n_jobs de chaque forêt)
+    """
+    jobs = resolve_jobs(jobs)
+    concurrent_targets = max(min(jobs, n_targets), 1)
+    return concurrent_targets, max(jobs // concurrent_targets, 1)
+
+
+def train_targets(fit_target, target_names, jobs=1):
+    """
+    Appelle fit_target(target_name, n_jobs) pour chaque cible
+
+    Retourne {cible: (résultat, secondes)} dans l'ordre de target_names ;
+    les secondes sont le temps réel d'entraînement de la cible.
+    """
+    concurrent_targets, forest_jobs = plan_jobs(len(target_names), jobs)
+
+    def timed_fit(target_name):
+        start = time.perf_counter()
+        result = fit_target(target_name, forest_jobs)
+        return result, time.perf_counter() - start
+
+    if concurrent_targets == 1:
+        return {target_name: timed_fit(target_name) for target_name in target_names}
+
+    with ThreadPoolExecutor(max_workers=concurrent_targets) as executor:
+        futures = {target_name: executor.submit(timed_fit, target_name) for target_name in target_names}
+        return {target_name: future.result() for target_name, future in futures.items()}
+
+
+def print_training_times(timings, elapsed):
+    """
+    Affiche le temps réel d'entraînement de chaque cible et le total
+    """
+    print("\n⏱️ Temps d'entraînement:")
+    for target_name, seconds in timings.items():
+        print(f"  - {target_name}: {seconds:.2f} s")
+    print(f"  - Total: {elapsed:.2f} s")